@@ -0,0 +1,30 @@
+"""Benchmarks for xWRF, run with ``asv run`` (or ``asv continuous``) from the asv_bench directory.
+
+All benchmarks run offline, on synthetic WRF datasets generated in memory (or lazily with dask).
+"""
+
+import xwrf
+
+# Horizontal sizes (of the unstaggered grid) to benchmark
+domain_sizes = [100, 500, 1500]
+# Largest horizontal size for which NumPy-backed datasets (50 levels, 24 times) fit in memory
+max_numpy_size = 100
+
+
+def requires_dask():
+    try:
+        import dask  # noqa: F401
+    except ImportError:
+        raise NotImplementedError()
+
+
+def synthetic_wrfout(n, nz=50, nt=24, backend='numpy'):
+    """Generate a wrfout dataset on a n by n Lambert conformal grid."""
+    if backend == 'dask':
+        requires_dask()
+        chunks = {'Time': 1}
+    elif n > max_numpy_size:
+        raise NotImplementedError()
+    else:
+        chunks = None
+    return xwrf.tutorial.synthetic_dataset(nx=n, ny=n, nz=nz, nt=nt, dx=3000.0, chunks=chunks)
@@ -0,0 +1,39 @@
+from . import domain_sizes, synthetic_wrfout
+
+
+class Destagger:
+    params = [['numpy', 'dask'], domain_sizes]
+    param_names = ['backend', 'n']
+
+    def setup(self, backend, n):
+        self.ds = synthetic_wrfout(n, backend=backend)[
+            ['U', 'V', 'PH', 'PHB', 'T', 'XLAT', 'XLONG']
+        ]
+
+    def time_dataarray_destagger(self, backend, n):
+        self.ds['U'].xwrf.destagger()
+
+    def peakmem_dataarray_destagger(self, backend, n):
+        self.ds['U'].xwrf.destagger()
+
+    def time_dataset_destagger(self, backend, n):
+        self.ds.xwrf.destagger()
+
+    def peakmem_dataset_destagger(self, backend, n):
+        self.ds.xwrf.destagger()
+
+
+class DestaggerCompute:
+    """Destaggering including the computation of dask-backed results."""
+
+    params = [domain_sizes[:2]]
+    param_names = ['n']
+
+    def setup(self, n):
+        self.ds = synthetic_wrfout(n, backend='dask')[['U', 'V', 'PH']]
+
+    def time_dataset_destagger_compute(self, n):
+        self.ds.xwrf.destagger().compute()
+
+    def peakmem_dataset_destagger_compute(self, n):
+        self.ds.xwrf.destagger().compute()
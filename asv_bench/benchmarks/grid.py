@@ -0,0 +1,18 @@
+from xwrf.grid import _wrf_grid_from_dataset, clear_grid_cache
+
+from . import domain_sizes, synthetic_wrfout
+
+
+class WRFGrid:
+    params = [domain_sizes]
+    param_names = ['n']
+
+    def setup(self, n):
+        self.ds = synthetic_wrfout(n, nz=1, nt=1, backend='dask')
+
+    def time_wrf_grid_from_dataset(self, n):
+        clear_grid_cache()
+        _wrf_grid_from_dataset(self.ds)
+
+    def time_wrf_grid_from_dataset_cached(self, n):
+        _wrf_grid_from_dataset(self.ds)
@@ -0,0 +1,10 @@
+class Import:
+    """Import time of xwrf in a fresh interpreter (see also tests/test_import.py for its budget)."""
+
+    def timeraw_import_xwrf(self):
+        # xarray (and with it NumPy and pandas) is imported in the setup, as xwrf cannot do
+        # without it, so that only the cost of xwrf itself is measured
+        return 'import xwrf', 'import xarray'
+
+    def timeraw_import_xwrf_and_config(self):
+        return 'import xwrf; xwrf.config.get("rename_dim_map")', 'import xarray'
@@ -0,0 +1,20 @@
+from . import domain_sizes, synthetic_wrfout
+
+# Typical isobaric levels (in Pa)
+pressure_levels = [100000.0 - 5000.0 * i for i in range(19)] + [5000.0]
+
+
+class InterpLevel:
+    """Interpolation of postprocessed fields to 20 pressure levels."""
+
+    params = [['numpy', 'dask'], domain_sizes[:2]]
+    param_names = ['backend', 'n']
+
+    def setup(self, backend, n):
+        self.ds = synthetic_wrfout(n, nt=6, backend=backend).xwrf.postprocess()
+
+    def time_interp_level(self, backend, n):
+        self.ds.xwrf.interp_level(None, levels=pressure_levels).compute()
+
+    def peakmem_interp_level(self, backend, n):
+        self.ds.xwrf.interp_level(None, levels=pressure_levels).compute()
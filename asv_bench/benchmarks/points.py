@@ -0,0 +1,22 @@
+import numpy as np
+
+from . import domain_sizes, synthetic_wrfout
+
+
+class SelPoints:
+    """Extraction of 2 m temperature and winds at 20,000 stations."""
+
+    params = [['nearest', 'bilinear'], domain_sizes[:2]]
+    param_names = ['method', 'n']
+
+    def setup(self, method, n):
+        self.ds = synthetic_wrfout(n, nt=6).xwrf.postprocess()
+        rng = np.random.default_rng(0)
+        # Stations within (and a few outside) the domain, centered at 38N 98W
+        self.lat = rng.uniform(36.0, 40.0, 20000)
+        self.lon = rng.uniform(-100.0, -96.0, 20000)
+
+    def time_sel_points(self, method, n):
+        self.ds.xwrf.sel_points(
+            self.lat, self.lon, method=method, variables=['T2', 'wind_east', 'wind_north']
+        ).compute()
@@ -0,0 +1,23 @@
+import xwrf
+
+from . import domain_sizes, synthetic_wrfout
+
+
+class Postprocess:
+    params = [['numpy', 'dask'], domain_sizes]
+    param_names = ['backend', 'n']
+
+    def setup(self, backend, n):
+        self.ds = synthetic_wrfout(n, backend=backend)
+
+    def time_postprocess(self, backend, n):
+        self.ds.copy().xwrf.postprocess()
+
+    def peakmem_postprocess(self, backend, n):
+        self.ds.copy().xwrf.postprocess()
+
+    def time_postprocess_plan(self, backend, n):
+        xwrf.PostprocessPlan.from_dataset(self.ds).apply(self.ds)
+
+    def peakmem_postprocess_plan(self, backend, n):
+        xwrf.PostprocessPlan.from_dataset(self.ds).apply(self.ds)
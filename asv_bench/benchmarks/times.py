@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from xwrf.postprocess import _decode_times
+
+
+class DecodeTimes:
+    params = [['numpy', 'dask'], [24, 24 * 365, 24 * 365 * 10]]
+    param_names = ['backend', 'nt']
+
+    def setup(self, backend, nt):
+        times = pd.date_range('2099-10-01', periods=nt, freq='h').strftime('%Y-%m-%d_%H:%M:%S')
+        self.ds = xr.Dataset({'Times': ('Time', np.array(times, dtype='S19'))})
+        if backend == 'dask':
+            self.ds = self.ds.chunk({'Time': 24})
+
+    def time_decode_times(self, backend, nt):
+        _decode_times(self.ds)
+
+    def peakmem_decode_times(self, backend, nt):
+        _decode_times(self.ds)
@@ -44,7 +44,7 @@ setup(
     install_requires=install_requires,
     license='Apache 2.0',
     zip_safe=False,
-    entry_points={},
+    entry_points={'xarray.backends': ['xwrf = xwrf.backend:WRFBackendEntrypoint']},
     keywords='wrf, xarray',
     use_scm_version={'version_scheme': 'post-release', 'local_scheme': 'dirty-tag'},
 )
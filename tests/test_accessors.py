@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import pytest
 import xarray as xr
@@ -114,6 +115,41 @@ def test_dataarray_destagger_with_postprocess(test_grid):
     assert 'c_grid_axis_shift' not in destaggered['x'].attrs
 
 
+def test_dataarray_destagger_with_dataset():
+    ds = xwrf.tutorial.synthetic_dataset(nx=8, ny=6).xwrf.postprocess()
+    destaggered = ds['U'].xwrf.destagger(dataset=ds)
+
+    # Unstaggered coordinates of the dataset are attached as they are
+    xr.testing.assert_identical(destaggered.variable, ds['U'].xwrf.destagger().variable)
+    for name in ('x', 'XLAT', 'XLONG'):
+        xr.testing.assert_identical(destaggered[name].variable, ds[name].variable)
+        assert np.shares_memory(destaggered[name].values, ds[name].values)
+    subset = ds.isel(x_stag=slice(0, 5))['U'].xwrf.destagger(dataset=ds)
+    assert subset['XLAT'].shape == (6, 4)
+
+    # Staggered coordinates without unstaggered counterpart are destaggered once per grid
+    xwrf.grid.clear_grid_cache()
+    static = ds.drop_vars(['XLAT', 'XLONG'])
+    first = static['U'].xwrf.destagger(dataset=static)
+    other = static.copy()
+    second = other['U'].xwrf.destagger(dataset=other)
+    xr.testing.assert_identical(first['XLAT'], static['U'].xwrf.destagger()['XLAT'])
+    assert np.shares_memory(first['XLAT'].values, second['XLAT'].values)
+    assert not first['XLAT'].values.flags.writeable
+
+
+def test_dataarray_destagger_with_dataset_subsets():
+    ds = xwrf.tutorial.synthetic_dataset(nx=20, ny=6).xwrf.postprocess()
+    static = ds.drop_vars(['XLAT', 'XLONG'])
+    xwrf.grid.clear_grid_cache()
+    # Subsets of the same shape at other positions of the grid are destaggered on their own
+    for start in (0, 10, 0):
+        subset = static.isel(x=slice(start, start + 8), x_stag=slice(start, start + 9))
+        destaggered = subset['U'].xwrf.destagger(dataset=subset)
+        xr.testing.assert_identical(destaggered['XLAT'], subset['U'].xwrf.destagger()['XLAT'])
+        xr.testing.assert_allclose(destaggered['XLAT'], ds['XLAT'].isel(x=slice(start, start + 8)))
+
+
 @pytest.mark.parametrize('test_grid', ['lambert_conformal', 'mercator'], indirect=True)
 def test_dataset_destagger(test_grid):
     destaggered = (
@@ -139,3 +175,34 @@ def test_dataset_destagger(test_grid):
 
     # Check that attrs are preserved
     assert destaggered.attrs == test_grid.attrs
+
+
+def test_dataset_destagger_variables():
+    ds = xwrf.tutorial.synthetic_dataset()
+    destaggered = ds.xwrf.destagger(variables=['U', 'PH'])
+
+    assert destaggered['U'].dims == ('Time', 'bottom_top', 'south_north', 'west_east')
+    assert destaggered['PH'].dims == ('Time', 'bottom_top', 'south_north', 'west_east')
+    xr.testing.assert_identical(destaggered['V'], ds['V'])
+    xr.testing.assert_allclose(
+        destaggered['U'].variable, ds['U'].xwrf.destagger().variable, check_dim_order=False
+    )
+    assert list(destaggered.data_vars) == list(ds.data_vars)
+
+    with pytest.raises(KeyError):
+        ds.xwrf.destagger(variables=['not_a_variable'])
+
+    # A single name is not iterated over
+    xr.testing.assert_identical(
+        ds.xwrf.destagger(variables='PH'), ds.xwrf.destagger(variables=['PH'])
+    )
+
+
+def test_dataset_destagger_grouped_renaming():
+    ds = xwrf.tutorial.synthetic_dataset()
+    destaggered = ds.xwrf.destagger(
+        {'west_east_stag': 'west_east', 'south_north_stag': 'south_north'}
+    )
+    for var_name in ('U', 'V'):
+        assert destaggered[var_name].dims == ('Time', 'bottom_top', 'south_north', 'west_east')
+    assert 'bottom_top_stag' in destaggered['PH'].dims
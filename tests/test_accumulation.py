@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+import xwrf
+
+from . import importorskip
+
+
+@pytest.fixture
+def ds():
+    ds = xwrf.tutorial.synthetic_dataset(nx=8, ny=6, nt=12, freq='30min')
+    # Total precipitation of up to 140 mm, partly in emptied buckets of 100 mm
+    total = np.linspace(0, 140, 12, dtype='float32')[:, None, None] * ds['HGT'] / ds['HGT'].max()
+    ds['RAINNC'] = (ds['RAINNC'].dims, (total % 100).values, ds['RAINNC'].attrs)
+    ds['I_RAINNC'] = (ds['I_RAINNC'].dims, (total // 100).values.astype('int32'))
+    return ds.xwrf.postprocess(), total.values
+
+
+def test_deaccumulate(ds):
+    ds, total = ds
+    result = ds.xwrf.deaccumulate()
+    expected = np.diff(total, axis=0)
+    assert np.isnan(result['RAINNC'][0]).all()
+    np.testing.assert_allclose(result['RAINNC'][1:], expected, atol=1e-4)
+    assert result['RAINNC'].dtype == np.float32
+    assert result['RAINNC'].attrs['cell_methods'] == 'Time: sum'
+    np.testing.assert_allclose(
+        result['RAINC'][1:], np.diff(ds['RAINC'].values.astype('float64'), axis=0), atol=1e-5
+    )
+    xr.testing.assert_identical(result['T2'], ds['T2'])
+
+    rate = ds.xwrf.deaccumulate('RAINNC', to='rate')
+    np.testing.assert_allclose(rate['RAINNC'][1:], expected / 1800, atol=1e-7)
+    assert rate['RAINNC'].attrs['units'] == 'mm s-1'
+    assert rate['RAINNC'].attrs['standard_name'] == 'lwe_precipitation_rate'
+    xr.testing.assert_identical(rate['RAINC'], ds['RAINC'])
+
+
+def test_deaccumulate_restart(ds):
+    ds, total = ds
+    # A second run starts over from zero
+    restarted = xr.concat(
+        [ds.isel(Time=slice(0, 6)), ds.isel(Time=slice(0, 6))], 'Time', data_vars='all'
+    )
+    restarted['Time'] = ds['Time']
+    result = restarted.xwrf.deaccumulate('RAINNC')
+    np.testing.assert_allclose(result['RAINNC'][6], total[0], atol=1e-4)
+    np.testing.assert_allclose(result['RAINNC'][7:], np.diff(total[:6], axis=0), atol=1e-4)
+    assert (result['RAINNC'][1:] >= 0).all()
+
+
+def test_deaccumulate_previous(ds):
+    ds, _ = ds
+    expected = ds.xwrf.deaccumulate(to='rate')
+    result = ds.isel(Time=slice(5, None)).xwrf.deaccumulate(
+        to='rate', previous=ds.isel(Time=slice(0, 5))
+    )
+    xr.testing.assert_allclose(result['RAINNC'], expected['RAINNC'].isel(Time=slice(5, None)))
+
+
+@importorskip('dask')
+def test_deaccumulate_dask(ds):
+    ds, _ = ds
+    chunked = ds.chunk({'Time': 5})
+    result = chunked.xwrf.deaccumulate(to='rate')
+    assert result['RAINNC'].chunks == chunked['RAINNC'].chunks
+    xr.testing.assert_allclose(
+        result.compute()['RAINNC'], ds.xwrf.deaccumulate(to='rate')['RAINNC']
+    )
+
+
+def test_deaccumulate_invalid(ds):
+    ds, _ = ds
+    with pytest.raises(ValueError, match='to must be'):
+        ds.xwrf.deaccumulate(to='total')
+    with pytest.raises(KeyError):
+        ds.xwrf.deaccumulate('ACHFX')
+    with pytest.raises(ValueError, match='BUCKET_MM'):
+        ds.drop_attrs(deep=False).xwrf.deaccumulate('RAINNC')
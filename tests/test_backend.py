@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+import xwrf
+
+from . import importorskip
+
+
+@pytest.fixture
+def wrfout_path(tmp_path):
+    path = tmp_path / 'wrfout_d01_2099-10-01_00:00:00.nc'
+    xwrf.tutorial.synthetic_dataset().to_netcdf(path)
+    return path
+
+
+@importorskip('netCDF4')
+def test_engine_matches_postprocess(wrfout_path):
+    with xr.open_dataset(wrfout_path) as raw:
+        expected = raw.xwrf.postprocess().load()
+    with xr.open_dataset(wrfout_path, engine='xwrf') as ds:
+        xr.testing.assert_allclose(ds.load(), expected)
+        assert ds['air_pressure'].attrs == expected['air_pressure'].attrs
+
+
+@importorskip('netCDF4')
+def test_engine_diagnostics_are_lazy(wrfout_path):
+    with xr.open_dataset(wrfout_path, engine='xwrf') as ds:
+        for varname in ('air_potential_temperature', 'air_pressure', 'geopotential_height'):
+            assert not ds[varname].variable._in_memory
+        with xr.open_dataset(wrfout_path) as raw:
+            expected = raw['P'].isel(Time=1, bottom_top=2) + raw['PB'].isel(Time=1, bottom_top=2)
+            np.testing.assert_allclose(ds['air_pressure'].isel(Time=1, z=2).values, expected.values)
+
+
+@importorskip('netCDF4')
+@importorskip('dask')
+def test_engine_with_chunks(wrfout_path):
+    with xr.open_dataset(wrfout_path, engine='xwrf', chunks={'Time': 1}) as ds:
+        assert ds['air_pressure'].chunks is not None
+        with xr.open_dataset(wrfout_path, engine='xwrf') as unchunked:
+            xr.testing.assert_allclose(ds['geopotential'].load(), unchunked['geopotential'].load())
+
+
+@importorskip('netCDF4')
+def test_engine_options(wrfout_path):
+    with xr.open_dataset(
+        wrfout_path,
+        engine='xwrf',
+        decode_times=False,
+        calculate_diagnostic_variables=False,
+        drop_variables=['T2'],
+    ) as ds:
+        assert 'T2' not in ds
+        assert 'air_pressure' not in ds
+        assert not np.issubdtype(ds['Time'].dtype, np.datetime64)
+
+
+def test_engine_is_opt_in(wrfout_path):
+    assert not xwrf.backend.WRFBackendEntrypoint().guess_can_open(wrfout_path)
+    with pytest.raises(ValueError):
+        xwrf.backend.WRFBackendEntrypoint().open_dataset(wrfout_path, store_engine='xwrf')
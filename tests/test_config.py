@@ -10,3 +10,13 @@ def config():
 
 def test_defaults_exist(config):
     assert config.get('cf_attribute_map.T2.standard_name') is not None
+
+
+def test_config_mapping_access(config):
+    assert config['rename_dim_map']['west_east'] == 'x'
+    assert config['rename_dim_map.west_east'] == 'x'
+    assert 'horizontal_dims' in config
+    assert 'not_an_option' not in config
+    assert 'horizontal_dims' in list(config)
+    with pytest.raises(KeyError):
+        config['not_an_option']
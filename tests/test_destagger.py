@@ -6,6 +6,8 @@ import xarray as xr
 
 from xwrf.destagger import _destag_variable, _drop_attrs, _rename_staggered_coordinate
 
+from . import importorskip
+
 
 @pytest.mark.parametrize(
     'input_attrs, output_attrs',
@@ -99,3 +101,30 @@ def test_destag_variable_2d():
     staggered = xr.Variable(('x', 'y_stag'), np.arange(9).reshape(3, 3))
     expected = xr.Variable(('x', 'y'), [[0.5, 1.5], [3.5, 4.5], [6.5, 7.5]])
     xr.testing.assert_equal(_destag_variable(staggered), expected)
+
+
+def test_destag_variable_integer_dtype():
+    output = _destag_variable(xr.Variable(('x_stag',), np.array([1, 2, 4])))
+    np.testing.assert_array_equal(output.values, [1.5, 3.0])
+    assert output.dtype == np.float64
+
+
+@importorskip('dask')
+@pytest.mark.parametrize(
+    'stag_chunks, expected_chunks',
+    [
+        ((4, 4, 3), (4, 4, 2)),
+        ((4, 4, 2, 1), (4, 4, 2)),
+        ((11,), (10,)),
+    ],
+)
+def test_destag_variable_dask(stag_chunks, expected_chunks):
+    data = np.random.default_rng(0).random((3, 5, 11)).astype('float32')
+    staggered = xr.Variable(('t', 'y', 'x_stag'), data).chunk({'t': 1, 'x_stag': stag_chunks})
+    output = _destag_variable(staggered)
+
+    # Lazy, with chunks aligned to the unstaggered dimension
+    assert output.chunks[2] == expected_chunks
+    assert output.chunks[:2] == staggered.chunks[:2]
+    assert output.dtype == np.float32
+    xr.testing.assert_allclose(output.compute(), _destag_variable(staggered.compute()))
@@ -3,7 +3,13 @@ import pyproj
 import pytest
 
 import xwrf
-from xwrf.grid import _wrf_grid_from_dataset, wgs84
+from xwrf.grid import (
+    _grid_signature,
+    _wrf_grid_from_dataset,
+    clear_grid_cache,
+    grid_cache_info,
+    wgs84,
+)
 
 
 @pytest.fixture(scope='session', params=['dummy'])
@@ -98,3 +104,53 @@ def test_grid_construction_against_own_latlon(test_grid, cf_grid_mapping_name):
 def test_ideal_grid(test_grid):
     grid_params = _wrf_grid_from_dataset(test_grid)
     assert grid_params['crs'] is None
+
+
+def test_grid_cache():
+    ds = xwrf.tutorial.synthetic_dataset()
+    other = xwrf.tutorial.synthetic_dataset(seed=1)
+    clear_grid_cache()
+    first = _wrf_grid_from_dataset(ds)
+    second = _wrf_grid_from_dataset(other)
+    assert grid_cache_info().misses == 1
+    assert grid_cache_info().hits == 1
+
+    # Shared and read-only
+    assert first['crs'] is second['crs']
+    assert first['west_east'] is second['west_east']
+    assert not first['west_east'].flags.writeable
+
+    # Different grid (signature) is a separate entry
+    other = ds.isel(west_east=slice(0, 4))
+    assert _wrf_grid_from_dataset(other)['west_east'].shape == (4,)
+    assert grid_cache_info().currsize == 2
+
+    clear_grid_cache()
+    assert grid_cache_info().currsize == 0
+
+
+def test_grid_cache_attr_dtype():
+    ds = xwrf.tutorial.synthetic_dataset()
+    other = ds.copy()
+    other.attrs['DX'] = np.float64(ds.attrs['DX'])
+    assert np.float64(ds.attrs['DX']) == ds.attrs['DX']
+    assert _grid_signature(other) != _grid_signature(ds)
+    clear_grid_cache()
+    _wrf_grid_from_dataset(ds)
+    _wrf_grid_from_dataset(other)
+    assert grid_cache_info().currsize == 2
+
+
+def test_grid_signature_postprocessed():
+    ds = xwrf.tutorial.synthetic_dataset(nx=8, ny=6)
+    postprocessed = ds.xwrf.postprocess()
+    assert _grid_signature(postprocessed) == _grid_signature(ds)
+    assert _grid_signature(postprocessed)[-2:] == (8, 6)
+    assert _grid_signature(postprocessed.isel(x=slice(0, 4)))[-2:] == (4, 6)
+
+
+def test_grid_missing_attrs():
+    ds = xwrf.tutorial.synthetic_dataset()
+    del ds.attrs['DX']
+    with pytest.raises(KeyError):
+        _wrf_grid_from_dataset(ds)
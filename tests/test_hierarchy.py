@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+import xwrf
+
+from . import importorskip
+
+
+@pytest.fixture
+def domain_paths(tmp_path):
+    # Nest (ratio 3) over parent cells 10-19 along west_east and 8-15 along south_north, which
+    # shares the center of its parent (as synthetic datasets are centered on the same point)
+    parent = xwrf.tutorial.synthetic_dataset(nx=30, ny=24, dx=12000.0)
+    nest = xwrf.tutorial.synthetic_dataset(nx=30, ny=24, dx=4000.0)
+    nest.attrs.update(
+        GRID_ID=np.int32(2),
+        PARENT_ID=np.int32(1),
+        I_PARENT_START=np.int32(11),
+        J_PARENT_START=np.int32(9),
+        PARENT_GRID_RATIO=np.int32(3),
+    )
+    paths = [tmp_path / 'wrfout_d01_2099-10-01.nc', tmp_path / 'wrfout_d02_2099-10-01.nc']
+    parent.to_netcdf(paths[0])
+    nest.to_netcdf(paths[1])
+    return paths
+
+
+@importorskip('netCDF4')
+@importorskip('dask')
+def test_domain_hierarchy(domain_paths):
+    domains = xwrf.DomainHierarchy(domain_paths)
+    assert domains.parents == {1: None, 2: 1}
+    assert domains._datasets == {}
+    assert repr(domains) == '<DomainHierarchy: d01, d02 (in d01)>'
+
+    index_map = domains.index_map(2)
+    np.testing.assert_array_equal(index_map['parent_x_index'][:7], [10, 10, 10, 11, 11, 11, 12])
+    np.testing.assert_array_equal(index_map['parent_y_stag_index'][[0, 3, -1]], [8, 9, 16])
+    # Fractional positions agree with the projection coordinates of both grids
+    parent_grid, nest_grid = domains.grid(1), domains.grid(2)
+    for dim, wrf_dim in [('x', 'west_east'), ('y_stag', 'south_north_stag')]:
+        expected = np.interp(
+            nest_grid[wrf_dim], parent_grid[wrf_dim], np.arange(parent_grid[wrf_dim].size)
+        )
+        np.testing.assert_allclose(index_map[f'parent_{dim}_position'], expected, atol=1e-6)
+
+    under_nest = domains.parent_cells(2)
+    assert dict(under_nest.sizes)['x'] == 10 and dict(under_nest.sizes)['y_stag'] == 9
+    np.testing.assert_allclose(under_nest['x'], parent_grid['west_east'][10:20])
+
+    # Block averages of coordinates (and fields linear in them) are those of the parent
+    nest = domains.dataset(2)
+    nest = nest.assign(x_field=0 * nest['y'] + nest['x'], u_field=0 * nest['y'] + nest['x_stag'])
+    averaged = domains.block_average(2, nest)
+    xr.testing.assert_identical(averaged['x'], under_nest['x'])
+    np.testing.assert_allclose(averaged['x_field'], np.tile(under_nest['x'], (8, 1)))
+    np.testing.assert_allclose(averaged['u_field'], np.tile(under_nest['x_stag'], (8, 1)))
+    assert averaged['air_pressure'].sizes == under_nest['air_pressure'].sizes
+
+    with pytest.raises(ValueError, match='no parent'):
+        domains.parent_cells(1)
+    with pytest.raises(KeyError):
+        domains.index_map(3)
+
+
+@importorskip('netCDF4')
+def test_domain_hierarchy_grid_id(domain_paths):
+    renamed = [path.with_name(f'domain_{i}.nc') for i, path in enumerate(domain_paths)]
+    for path, new in zip(domain_paths, renamed):
+        path.rename(new)
+    domains = xwrf.DomainHierarchy(renamed)
+    assert domains.files == {1: [str(renamed[0])], 2: [str(renamed[1])]}
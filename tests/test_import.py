@@ -0,0 +1,88 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Import budget: most modules which importing xwrf imports (beyond xarray and its dependencies)
+max_imported_modules = 10
+# Modules which importing xwrf must not import (only when first used)
+deferred_modules = ['pyproj', 'yaml', 'donfig', 'xwrf.grid', 'xwrf.tutorial', 'xwrf.version_report']
+
+
+def run_python(code, tmp_path, **env):
+    env = {
+        **os.environ,
+        'HOME': str(tmp_path / 'home'),
+        'XDG_CACHE_HOME': str(tmp_path / 'cache'),
+        'XWRF_CONFIG': str(tmp_path / 'config'),
+        **env,
+    }
+    result = subprocess.run(
+        [sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout)
+
+
+def test_import_is_lazy(tmp_path):
+    imported = run_python(
+        'import json, sys, xwrf; '
+        f'print(json.dumps([name for name in {deferred_modules!r} if name in sys.modules]))',
+        tmp_path,
+    )
+    assert imported == []
+    # Nothing is written on import
+    assert not any(path.exists() for path in tmp_path.iterdir())
+
+
+def test_import_budget(tmp_path):
+    imported = run_python(
+        'import json, sys, xarray; before = set(sys.modules); import xwrf; '
+        'print(json.dumps(sorted(set(sys.modules) - before)))',
+        tmp_path,
+    )
+    assert len(imported) <= max_imported_modules, imported
+
+
+def test_lazy_attributes(tmp_path):
+    names = run_python(
+        'import json, xwrf; '
+        'print(json.dumps([xwrf.open_mfdataset.__name__, xwrf.tutorial.__name__, '
+        'xwrf.PostprocessPlan.__name__, xwrf.config.get("rename_dim_map.bottom_top")]))',
+        tmp_path,
+    )
+    assert names == ['open_mfdataset', 'xwrf.tutorial', 'PostprocessPlan', 'z']
+
+
+def test_config_read_only_home(tmp_path):
+    # Nothing can be created below a regular file (even with root permissions)
+    (tmp_path / 'file').touch()
+    value = run_python(
+        'import json, xwrf; print(json.dumps(xwrf.config.get("rename_dim_map.west_east")))',
+        tmp_path,
+        XDG_CACHE_HOME=str(tmp_path / 'file' / 'cache'),
+        XWRF_CONFIG=str(tmp_path / 'file' / 'config'),
+    )
+    assert value == 'x'
+
+
+def test_defaults_cache(tmp_path):
+    code = 'import json, xwrf; print(json.dumps(xwrf.config.get("profile")))'
+    cache_dir = tmp_path / 'cache' / 'xwrf' / 'defaults'
+    # The defaults are only cached on request
+    assert run_python(code, tmp_path) is False
+    assert not cache_dir.exists()
+    assert run_python(code, tmp_path, XWRF_DEFAULTS_CACHE='1') is False
+    assert len(list(cache_dir.glob('*.json'))) == 1
+    # The cached defaults are used (and give the same configuration) from then on
+    assert run_python(code, tmp_path, XWRF_DEFAULTS_CACHE='1') is False
+
+
+def test_module_getattr():
+    import xwrf
+
+    with pytest.raises(AttributeError):
+        xwrf.not_an_attribute
+    assert 'open_mfdataset' in dir(xwrf)
+    assert xwrf.grid.wgs84.to_epsg() == 4326
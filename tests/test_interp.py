@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+import xwrf
+from xwrf.interp import _interp_with_weights, _level_weights
+
+from . import importorskip
+
+
+@pytest.fixture(scope='module')
+def postprocessed():
+    return xwrf.tutorial.synthetic_dataset(nx=8, ny=6, nz=12).xwrf.postprocess()
+
+
+@pytest.mark.parametrize('log', [False, True])
+@pytest.mark.parametrize('descending', [False, True])
+def test_level_weights(log, descending):
+    rng = np.random.default_rng(0)
+    coord = np.cumsum(rng.uniform(0.1, 1.0, size=(4, 3, 9)), axis=-1) + 1
+    values = rng.standard_normal(coord.shape)
+    levels = np.array([0.5, 1.5, 3.0, 4.2, 6.0, 100.0])
+    if descending:
+        coord, values = coord[..., ::-1], values[..., ::-1]
+
+    result = _interp_with_weights(values, *_level_weights(coord, levels, log=log))
+
+    transform = np.log if log else np.asarray
+    for i, j in np.ndindex(coord.shape[:2]):
+        column, column_values = transform(coord[i, j]), values[i, j]
+        if descending:
+            column, column_values = column[::-1], column_values[::-1]
+        expected = np.interp(transform(levels), column, column_values, left=np.nan, right=np.nan)
+        np.testing.assert_allclose(result[i, j], expected)
+
+
+def test_interp_level_pressure(postprocessed):
+    levels = [70000.0, 50000.0, 20000.0]
+    result = postprocessed.xwrf.interp_level(None, levels=levels)
+
+    assert result['air_potential_temperature'].dims == ('Time', 'air_pressure', 'y', 'x')
+    np.testing.assert_array_equal(result['air_pressure'], levels)
+    assert result['air_pressure'].attrs['units'] == 'Pa'
+    # Staggered variables and the coordinate itself are not interpolated
+    assert 'U' not in result
+    assert set(result.data_vars) >= {'air_potential_temperature', 'wind_east', 'QVAPOR'}
+    assert result['XLAT'].dims == ('y', 'x')
+    assert result['air_potential_temperature'].attrs == (
+        postprocessed['air_potential_temperature'].attrs
+    )
+
+    # log-p interpolation is exact for fields linear in log-p
+    ds = postprocessed.assign(log_p=np.log(postprocessed['air_pressure']))
+    np.testing.assert_allclose(
+        ds.xwrf.interp_level('log_p', levels=levels)['log_p'].isel(Time=0),
+        np.broadcast_to(np.log(levels)[:, None, None], (3, 6, 8)),
+        rtol=1e-6,
+    )
+
+
+def test_interp_level_height(postprocessed):
+    result = postprocessed.xwrf.interp_level(
+        ['air_pressure', 'geopotential'], levels=[2000.0, 4000.0], coord='geopotential_height'
+    )
+    # Staggered and unstaggered variables, using the destaggered coordinate for the latter
+    assert result['geopotential'].dims == ('Time', 'geopotential_height', 'y', 'x')
+    np.testing.assert_allclose(
+        result['geopotential'].isel(Time=0) / 9.81,
+        np.broadcast_to(np.array([2000.0, 4000.0])[:, None, None], (2, 6, 8)),
+        rtol=1e-5,
+    )
+    assert (result['air_pressure'].diff('geopotential_height') < 0).all()
+
+
+def test_interp_level_out_of_range(postprocessed):
+    result = postprocessed.xwrf.interp_level('air_potential_temperature', levels=[110000.0])
+    assert result['air_potential_temperature'].isnull().all()
+
+
+@importorskip('dask')
+def test_interp_level_dask(postprocessed):
+    levels = [85000.0, 50000.0, 20000.0]
+    chunked = postprocessed.chunk({'Time': 1, 'y': 3, 'z': 4})
+    result = chunked.xwrf.interp_level(None, levels=levels)
+    assert result['wind_east'].chunks == ((1, 1), (3,), (3, 3), (8,))
+    xr.testing.assert_allclose(
+        result.compute(), postprocessed.xwrf.interp_level(None, levels=levels)
+    )
+
+
+def test_level_weights_two_levels():
+    index, weight = _level_weights(np.array([[1.0, 3.0]]), np.array([0.0, 2.0, 3.0]))
+    np.testing.assert_array_equal(index, [[0, 0, 0]])
+    np.testing.assert_array_equal(weight, [[np.nan, 0.5, 1.0]])
+
+
+def test_interp_level_invalid(postprocessed):
+    with pytest.raises(ValueError, match='destagger'):
+        postprocessed.xwrf.interp_level('U', levels=[50000.0])
+    with pytest.raises(KeyError):
+        postprocessed.xwrf.interp_level('not_a_variable', levels=[50000.0])
+    with pytest.raises(KeyError):
+        postprocessed.xwrf.interp_level(None, levels=[50000.0], coord='not_a_variable')
+    with pytest.raises(ValueError):
+        postprocessed.xwrf.interp_level(None, levels=[50000.0], method='cubic')
+    with pytest.raises(ValueError, match='single level'):
+        postprocessed.isel(z=slice(0, 1)).xwrf.interp_level(None, levels=[50000.0])
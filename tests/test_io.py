@@ -0,0 +1,262 @@
+import json
+import tracemalloc
+
+import numpy as np
+import pyproj
+import pytest
+import xarray as xr
+
+import xwrf
+
+from . import importorskip
+
+
+@pytest.fixture
+def wrfout_paths(tmp_path):
+    paths = []
+    for i, start in enumerate(['2099-10-01T00', '2099-10-01T02', '2099-10-01T04']):
+        path = tmp_path / f'wrfout_d01_{i}.nc'
+        xwrf.tutorial.synthetic_dataset(seed=i, start=start).to_netcdf(path)
+        paths.append(path)
+    return paths
+
+
+@importorskip('netCDF4')
+@importorskip('dask')
+@pytest.mark.parametrize('parallel', [True, False])
+def test_open_mfdataset(wrfout_paths, parallel):
+    with xwrf.open_mfdataset(wrfout_paths, parallel=parallel) as ds:
+        assert ds.sizes['Time'] == 6
+        assert np.all(np.diff(ds['Time'].values) == np.timedelta64(1, 'h'))
+        assert ds['XLAT'].dims == ('y', 'x')
+        assert ds['air_pressure'].chunks is not None
+
+        expected = xr.concat(
+            [xr.open_dataset(path).xwrf.postprocess() for path in wrfout_paths],
+            dim='Time',
+            data_vars='minimal',
+            coords='minimal',
+            compat='override',
+        )
+        xr.testing.assert_allclose(ds['air_pressure'], expected['air_pressure'])
+        xr.testing.assert_allclose(ds['x'], expected['x'])
+        assert ds['wrf_projection'].item() == expected['wrf_projection'].item()
+
+
+@importorskip('netCDF4')
+@importorskip('dask')
+def test_open_mfdataset_glob(wrfout_paths):
+    with xwrf.open_mfdataset(str(wrfout_paths[0].parent / 'wrfout_d01_*')) as ds:
+        assert ds.sizes['Time'] == 6
+
+
+@importorskip('netCDF4')
+@importorskip('dask')
+def test_open_mfdataset_grid_mismatch(wrfout_paths):
+    ds = xwrf.tutorial.synthetic_dataset(start='2099-10-01T06')
+    ds.attrs['DX'] = ds.attrs['DY'] = 30000.0
+    ds.to_netcdf(wrfout_paths[0].parent / 'wrfout_d02.nc')
+    with pytest.raises(ValueError, match='does not match the grid'):
+        xwrf.open_mfdataset(wrfout_paths + [wrfout_paths[0].parent / 'wrfout_d02.nc'])
+
+
+def test_open_mfdataset_no_files(tmp_path):
+    with pytest.raises(OSError):
+        xwrf.open_mfdataset(str(tmp_path / 'wrfout_*'))
+
+
+@pytest.mark.parametrize(
+    'access, expected',
+    [
+        ('map', {'Time': 2, 'z': 10, 'y': 100, 'x_stag': 101}),
+        ('timeseries', {'Time': 24, 'z': 10, 'y': 32, 'x_stag': 32}),
+    ],
+)
+def test_access_chunks(access, expected):
+    sizes = {'Time': 24, 'z': 10, 'y': 100, 'x_stag': 101}
+    assert xwrf.io._access_chunks(sizes, 4, 10**6, access=access) == expected
+
+
+def test_access_chunks_tiled_map():
+    sizes = {'Time': 24, 'y': 1000, 'x': 1000}
+    assert xwrf.io._access_chunks(sizes, 4, 10**6) == {'Time': 1, 'y': 500, 'x': 500}
+
+
+@importorskip('dask')
+@pytest.mark.parametrize('access', ['map', 'timeseries'])
+def test_suggest_chunks(access):
+    ds = xwrf.tutorial.synthetic_dataset(nx=40, ny=30, nt=6).xwrf.postprocess()
+    suggestion = xwrf.suggest_chunks(ds, '20kB', access=access)
+    chunked = ds.chunk(suggestion.chunks)
+
+    # Staggered dimensions are split at the same boundaries as their unstaggered counterparts
+    for dim in ['x', 'y', 'z']:
+        chunks, stag_chunks = chunked.chunks[dim], chunked.chunks[f'{dim}_stag']
+        assert stag_chunks == chunks[:-1] + (chunks[-1] + 1,)
+    destaggered = chunked.xwrf.destagger()
+    assert destaggered['U'].chunks == chunked['air_pressure'].chunks
+    assert destaggered['wind_east'].chunks == chunked['air_pressure'].chunks
+
+    assert suggestion.tasks == sum(
+        np.prod([len(c) for c in var.chunks])
+        for name, var in chunked.variables.items()
+        if var.chunks is not None
+    )
+    assert suggestion.chunk_bytes <= 20_000 * 2
+    if access == 'map':
+        assert len(chunked.chunks['x']) == 1
+    else:
+        assert len(chunked.chunks['Time']) == 1
+
+
+@importorskip('netCDF4')
+def test_suggest_chunks_native(tmp_path):
+    ds = xwrf.tutorial.synthetic_dataset(nx=40, ny=30, nz=10, nt=6)
+    encoding = {'U': {'chunksizes': (1, 10, 15, 41)}, 'T': {'chunksizes': (1, 5, 15, 20)}}
+    ds.to_netcdf(tmp_path / 'wrfout.nc', encoding=encoding)
+
+    suggestion = xwrf.suggest_chunks(tmp_path / 'wrfout.nc', '200kB', access='timeseries')
+    # Multiples of the native chunks of all variables, along unstaggered dimensions
+    assert suggestion.chunks['bottom_top'] == 10
+    assert suggestion.chunks['south_north'] == (15, 15)
+    assert suggestion.chunks['south_north_stag'] == (15, 16)
+    assert suggestion.chunks['west_east'] == 40
+
+
+@importorskip('netCDF4')
+@importorskip('dask')
+def test_open_mfdataset_auto_chunks(wrfout_paths):
+    expected = xwrf.suggest_chunks(wrfout_paths[0], '10kB', access='timeseries')
+    with xwrf.config.set({'auto_chunks.memory_target': '10kB', 'auto_chunks.access': 'timeseries'}):
+        with xwrf.open_mfdataset(wrfout_paths, chunks='xwrf-auto') as ds:
+            assert ds.chunks['Time'] == (2, 2, 2)
+            assert ds.chunks['y'] == expected.chunks['south_north']
+            assert ds.chunks['x_stag'] == expected.chunks['west_east_stag']
+
+
+@importorskip('netCDF4')
+def test_prepare_zarr_dataset(tmp_path):
+    xwrf.tutorial.synthetic_dataset(nt=4).to_netcdf(tmp_path / 'wrfout.nc')
+    with xr.open_dataset(tmp_path / 'wrfout.nc') as raw:
+        ds = raw.xwrf.postprocess().xwrf.destagger()
+        prepared = xwrf.io._prepare_zarr_dataset(ds, chunk_target='100kB')
+
+        # Serializable CRS, described by its CF attributes
+        assert prepared['wrf_projection'].dtype == np.int32
+        assert prepared['wrf_projection'].attrs == ds['wrf_projection'].attrs
+        # No stale encodings from the staggered variable
+        assert set(prepared['U'].encoding) == {'dtype', '_FillValue', 'chunks'}
+        assert prepared['U'].encoding['chunks'] == (3, 10, 25, 30)
+        assert 'dtype' not in prepared['Times'].encoding
+        xr.testing.assert_allclose(prepared['U'], ds['U'])
+
+
+@importorskip('zarr')
+@importorskip('netCDF4')
+@importorskip('dask')
+def test_to_zarr(tmp_path):
+    xwrf.tutorial.synthetic_dataset(nt=4).to_netcdf(tmp_path / 'wrfout.nc')
+    with xr.open_dataset(tmp_path / 'wrfout.nc') as raw:
+        ds = raw.xwrf.postprocess().xwrf.destagger()
+        ds.xwrf.to_zarr(tmp_path / 'wrfout.zarr', chunk_target='100kB', access='timeseries')
+        with xr.open_zarr(tmp_path / 'wrfout.zarr', consolidated=True) as written:
+            assert written['T2'].encoding['chunks'] == (4, 25, 30)
+            xr.testing.assert_allclose(written['air_pressure'], ds['air_pressure'])
+            assert (
+                pyproj.CRS.from_cf(written['wrf_projection'].attrs) == ds['wrf_projection'].item()
+            )
+
+
+def _fake_references(path, nt, units='minutes since 2099-10-01'):
+    # Zarr references of a file with a (Time, x) variable chunked by time and a static variable
+    refs = {
+        '.zgroup': json.dumps({'zarr_format': 2}),
+        '.zattrs': json.dumps({'MAP_PROJ': 1, 'DX': 12000.0}),
+        'T/.zarray': json.dumps({'shape': [nt, 4], 'chunks': [1, 4], 'dtype': '<f4'}),
+        'T/.zattrs': json.dumps({'_ARRAY_DIMENSIONS': ['Time', 'west_east'], 'units': 'K'}),
+        'XTIME/.zarray': json.dumps({'shape': [nt], 'chunks': [nt], 'dtype': '<f4'}),
+        'XTIME/.zattrs': json.dumps({'_ARRAY_DIMENSIONS': ['Time'], 'units': units}),
+        'XTIME/0': 'base64:AAAA',
+        'HGT/.zarray': json.dumps({'shape': [4], 'chunks': [4], 'dtype': '<f4'}),
+        'HGT/.zattrs': json.dumps({'_ARRAY_DIMENSIONS': ['west_east']}),
+        'HGT/0': [path, 0, 16],
+    }
+    refs.update({f'T/{i}.0': [path, 100 + 16 * i, 16] for i in range(nt)})
+    return refs
+
+
+def test_combine_references():
+    references = [_fake_references('a.nc', 2), _fake_references('b.nc', 3)]
+    combined = xwrf.io._combine_references(references, ['a.nc', 'b.nc'], drop_variables=['XTIME'])
+    refs = combined['refs']
+    assert json.loads(refs['T/.zarray'])['shape'] == [5, 4]
+    assert [refs[f'T/{i}.0'][0] for i in range(5)] == ['a.nc'] * 2 + ['b.nc'] * 3
+    assert refs['T/3.0'] == ['b.nc', 116, 16]
+    assert refs['HGT/0'] == ['a.nc', 0, 16]
+    assert json.loads(refs['.zattrs']) == {'MAP_PROJ': 1, 'DX': 12000.0}
+    assert not any(key.startswith('XTIME') for key in refs)
+
+
+def test_combine_references_invalid():
+    references = [_fake_references('a.nc', 2), _fake_references('b.nc', 2, 'hours')]
+    with pytest.raises(ValueError, match='drop_variables'):
+        xwrf.io._combine_references(references, ['a.nc', 'b.nc'])
+    # XTIME is a single chunk per file, of a different size in each file
+    references = [_fake_references('a.nc', 3), _fake_references('b.nc', 2)]
+    with pytest.raises(ValueError, match='do not line up'):
+        xwrf.io._combine_references(references, ['a.nc', 'b.nc'], drop_variables=['T'])
+    references[1]['.zattrs'] = json.dumps({'MAP_PROJ': 1, 'DX': 3000.0})
+    with pytest.raises(ValueError, match='does not match the grid'):
+        xwrf.io._combine_references(references, ['a.nc', 'b.nc'], drop_variables=['XTIME'])
+
+
+@importorskip('kerchunk')
+@importorskip('zarr')
+@importorskip('dask')
+def test_reference_index(wrfout_paths, tmp_path):
+    out = tmp_path / 'refs.json'
+    xwrf.build_reference_index(wrfout_paths, out=out, drop_variables=['XTIME'])
+    with xwrf.open_reference(out) as ds, xwrf.open_mfdataset(wrfout_paths) as expected:
+        assert ds.sizes['Time'] == 6
+        assert ds['air_pressure'].chunks is not None
+        xr.testing.assert_allclose(ds['air_pressure'], expected['air_pressure'])
+        xr.testing.assert_equal(ds['Time'], expected['Time'])
+
+
+@pytest.mark.parametrize('batch, prefetch', [(1, 2), (4, 0), (2, 1)])
+def test_iter_timesteps(batch, prefetch):
+    raw = xwrf.tutorial.synthetic_dataset(nt=5)
+    expected = raw.xwrf.postprocess().xwrf.destagger()
+    batches = list(raw.xwrf.iter_timesteps(batch=batch, prefetch=prefetch, destagger=True))
+    assert [ds.sizes['Time'] for ds in batches] == [batch] * (5 // batch) + [5 % batch] * bool(
+        5 % batch
+    )
+    xr.testing.assert_identical(xr.concat(batches, 'Time', data_vars='minimal'), expected)
+    assert list(batches[-1].variables) == list(batches[0].variables)
+    # Time-independent variables are loaded once, and shared
+    assert all(np.shares_memory(ds['XLAT'], batches[0]['XLAT']) for ds in batches)
+
+
+def test_iter_timesteps_invalid():
+    raw = xwrf.tutorial.synthetic_dataset()
+    with pytest.raises(ValueError):
+        raw.xwrf.iter_timesteps(batch=0)
+    with pytest.raises(ValueError):
+        raw.xwrf.iter_timesteps(prefetch=-1)
+
+
+@importorskip('netCDF4')
+def test_iter_timesteps_memory(tmp_path):
+    xwrf.tutorial.synthetic_dataset(nx=40, ny=30, nz=20, nt=24).to_netcdf(tmp_path / 'wrfout.nc')
+    with xr.open_dataset(tmp_path / 'wrfout.nc') as raw:
+        for _ in raw.isel(Time=slice(2)).xwrf.iter_timesteps():
+            pass
+        tracemalloc.start()
+        try:
+            for ds in raw.xwrf.iter_timesteps():
+                pass
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        # About prefetch + 2 batches in memory at once, out of 24
+        assert peak < 0.3 * ds.nbytes * raw.sizes['Time']
@@ -0,0 +1,94 @@
+import pytest
+import xarray as xr
+
+import xwrf
+
+from . import importorskip
+
+
+def _postprocess_stepwise(
+    ds,
+    decode_times=True,
+    calculate_diagnostic_variables=True,
+    drop_diagnostic_variable_components=True,
+):
+    """Postprocess with each of the individual steps in turn (modifying ds in place)."""
+    steps = xwrf.postprocess
+    ds = (
+        ds.pipe(steps._modify_attrs_to_cf)
+        .pipe(steps._make_units_pint_friendly)
+        .pipe(steps._collapse_time_dim)
+        .pipe(steps._assign_coord_to_dim_of_different_name)
+    )
+    if decode_times:
+        ds = steps._decode_times(ds)
+    if calculate_diagnostic_variables:
+        ds = steps._calc_base_diagnostics(ds, drop=drop_diagnostic_variable_components)
+    return ds.pipe(steps._include_projection_coordinates).pipe(steps._rename_dims)
+
+
+@pytest.mark.parametrize(
+    'options',
+    [
+        {},
+        {'decode_times': False},
+        {'calculate_diagnostic_variables': False},
+        {'drop_diagnostic_variable_components': False},
+    ],
+)
+def test_plan_matches_postprocess(options):
+    expected = _postprocess_stepwise(xwrf.tutorial.synthetic_dataset(), **options)
+    ds = xwrf.tutorial.synthetic_dataset()
+    raw = ds.copy(deep=True)
+    result = xwrf.PostprocessPlan.from_dataset(ds, **options).apply(ds)
+    xr.testing.assert_identical(result, expected)
+    # postprocess applies the cached plan
+    xr.testing.assert_identical(ds.xwrf.postprocess(**options), expected)
+    # Input is left untouched
+    xr.testing.assert_identical(ds, raw)
+
+
+def test_plan_cached_and_reused():
+    plan = xwrf.PostprocessPlan.from_dataset(xwrf.tutorial.synthetic_dataset())
+    other = xwrf.tutorial.synthetic_dataset(seed=1)
+    assert xwrf.PostprocessPlan.from_dataset(other) is plan
+    assert xwrf.PostprocessPlan.from_dataset(other, decode_times=False) is not plan
+    xr.testing.assert_identical(
+        plan.apply(other), xwrf.tutorial.synthetic_dataset(seed=1).xwrf.postprocess()
+    )
+
+
+def test_plan_follows_config():
+    ds = xwrf.tutorial.synthetic_dataset()
+    plan = xwrf.PostprocessPlan.from_dataset(ds)
+    with xwrf.config.set({'rename_dim_map.bottom_top': 'lev'}):
+        renamed = xwrf.PostprocessPlan.from_dataset(ds)
+        assert renamed is not plan
+        xr.testing.assert_identical(renamed.apply(ds), ds.xwrf.postprocess())
+        assert 'lev' in renamed.apply(ds).dims
+    assert xwrf.PostprocessPlan.from_dataset(ds) is plan
+
+
+def test_plan_schema_mismatch():
+    plan = xwrf.PostprocessPlan.from_dataset(xwrf.tutorial.synthetic_dataset())
+    other = xwrf.tutorial.synthetic_dataset().drop_vars('T2')
+    assert not plan.matches(other)
+    with pytest.raises(ValueError):
+        plan.apply(other)
+
+
+def test_plan_missing_projection_metadata():
+    ds = xwrf.tutorial.synthetic_dataset()
+    del ds.attrs['DX']
+    with pytest.warns(UserWarning):
+        result = xwrf.PostprocessPlan.from_dataset(ds).apply(ds)
+    assert 'wrf_projection' not in result
+
+
+@importorskip('netCDF4')
+def test_plan_keeps_lazy_data(tmp_path):
+    xwrf.tutorial.synthetic_dataset().to_netcdf(tmp_path / 'wrfout.nc')
+    with xr.open_dataset(tmp_path / 'wrfout.nc') as ds:
+        result = xwrf.PostprocessPlan.from_dataset(ds).apply(ds)
+        for varname in ('T2', 'XLAT', 'air_pressure'):
+            assert not result[varname].variable._in_memory
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+import xwrf
+
+from . import importorskip
+
+
+@pytest.fixture(scope='module')
+def ds():
+    return xwrf.tutorial.synthetic_dataset(nx=40, ny=30).xwrf.postprocess()
+
+
+@pytest.fixture(scope='module')
+def stations():
+    rng = np.random.default_rng(0)
+    return rng.uniform(36.5, 39.5, 50), rng.uniform(-99.5, -96.5, 50)
+
+
+def test_sel_points_nearest(ds, stations):
+    lat, lon = stations
+    points = ds.xwrf.sel_points(lat, lon)
+    assert points['T2'].dims == ('Time', 'points')
+    assert points['U'].dims == ('Time', 'z', 'points')
+
+    # Same points as a brute force search on the projection coordinates
+    x, y = xwrf.points._lonlat_transformer(ds['wrf_projection'].item()).transform(lon, lat)
+    for x_dim, y_dim, name in [('x', 'y', 'T2'), ('x_stag', 'y', 'U')]:
+        ix = np.abs(ds[x_dim].values - x[:, None]).argmin(axis=1)
+        iy = np.abs(ds[y_dim].values - y[:, None]).argmin(axis=1)
+        expected = ds[name].values[..., iy, ix]
+        np.testing.assert_array_equal(points[name].values, expected)
+
+
+def test_sel_points_bilinear(ds, stations):
+    lat, lon = stations
+    variables = ['XLAT_V', 'XLONG_U', 'air_pressure']
+    points = ds.xwrf.sel_points(lat, lon, method='bilinear', variables=variables)
+    np.testing.assert_allclose(points['XLAT_V'], lat, atol=1e-4)
+    np.testing.assert_allclose(points['XLONG_U'], lon, atol=1e-4)
+    assert points['air_pressure'].dtype == ds['air_pressure'].dtype
+    assert 'grid_mapping' not in points['air_pressure'].attrs
+
+
+def test_sel_points_dataarray(ds):
+    lat = xr.DataArray([37.0, 38.0, 50.0], dims='station', coords={'station': ['a', 'b', 'c']})
+    lon = xr.DataArray([-99.0, -98.0, -98.0], dims='station')
+    points = ds.xwrf.sel_points(lat, lon, variables='T2')
+    assert points['T2'].dims == ('Time', 'station')
+    assert list(points['station'].values) == ['a', 'b', 'c']
+    # The last station is outside of the domain
+    assert points['T2'].isel(station=-1).isnull().all()
+    assert points['T2'].isel(station=slice(2)).notnull().all()
+
+
+@pytest.mark.parametrize('method', ['nearest', 'bilinear'])
+def test_sel_points_scalar(ds, stations, method):
+    lat, lon = stations
+    points = ds.xwrf.sel_points(lat, lon, method=method, variables=['T2', 'U'])
+    point = ds.xwrf.sel_points(lat[3], lon[3], method=method, variables=['T2', 'U'])
+    assert point['T2'].dims == ('Time',)
+    assert point['U'].dims == ('Time', 'z')
+    xr.testing.assert_identical(point, points.isel(points=3))
+
+
+@importorskip('dask')
+def test_sel_points_dask(ds, stations):
+    lat, lon = stations
+    points = ds.chunk({'Time': 1}).xwrf.sel_points(lat, lon, method='bilinear')
+    assert points['air_pressure'].chunks is not None
+    xr.testing.assert_allclose(points.compute(), ds.xwrf.sel_points(lat, lon, method='bilinear'))
+
+
+def test_sel_points_invalid(ds):
+    with pytest.raises(ValueError, match='method'):
+        ds.xwrf.sel_points([38.0], [-98.0], method='cubic')
+    with pytest.raises(ValueError, match='postprocess'):
+        xwrf.tutorial.synthetic_dataset().xwrf.sel_points([38.0], [-98.0])
@@ -1,4 +1,7 @@
+import tracemalloc
+
 import numpy as np
+import pandas as pd
 import pyproj
 import pytest
 import xarray as xr
@@ -110,6 +113,46 @@ def test_decode_times(times):
     assert dsa['Time'].attrs['standard_name'] == 'time'
 
 
+@pytest.mark.parametrize('fmt', ['%Y-%m-%d_%H:%M:%S', '%Y-%m-%dT%H:%M:%S'])
+def test_parse_wrf_times(fmt):
+    expected = pd.date_range('1999-12-31T22:00', periods=500, freq='17min')
+    times = np.array(expected.strftime(fmt), dtype='S19')
+    np.testing.assert_array_equal(xwrf.postprocess._parse_wrf_times(times), expected.values)
+    np.testing.assert_array_equal(
+        xwrf.postprocess._parse_wrf_times(times.astype('U19')), expected.values
+    )
+
+
+@pytest.mark.parametrize(
+    'times',
+    [
+        [b'2005-08-28 12:00:00'],
+        [b'2005-08-28_12:00:00', b'2005-08-28T13:00:00'],
+        [b'2005-02-29_12:00:00'],
+        [b'2005-13-01_12:00:00'],
+        [b'2005-8-28_12:00:00'],
+        [b'2005-08-28_24:00:00'],
+        [b'2999-08-28_12:00:00'],
+    ],
+)
+def test_parse_wrf_times_unparsed(times):
+    assert xwrf.postprocess._parse_wrf_times(np.array(times)) is None
+
+
+def test_decode_times_invalid():
+    with pytest.raises(ValueError):
+        xwrf.postprocess._decode_times(xr.Dataset({'Times': ('Time', [b'2005-02-29_12:00:00'])}))
+
+
+@importorskip('dask')
+def test_decode_times_dask():
+    ds = xr.Dataset({'Times': ('Time', [b'2005-08-28_12:00:00', b'2005-08-28_13:00:00'])}).chunk()
+    dsa = xwrf.postprocess._decode_times(ds)
+    np.testing.assert_array_equal(
+        dsa['Time'].values, pd.to_datetime(['2005-08-28T12:00', '2005-08-28T13:00']).values
+    )
+
+
 @pytest.mark.parametrize(
     'sample_dataset_with_kwargs,xtime_dtype',
     [
@@ -254,3 +297,154 @@ def test_calc_base_diagnostics_coords(sample_dataset):
 def test_calc_base_diagnostics_skipping(sample_dataset):
     ds = sample_dataset.pipe(xwrf.postprocess._calc_base_diagnostics)
     xr.testing.assert_identical(sample_dataset, ds)
+
+
+@importorskip('netCDF4')
+def test_collapse_time_dim_lazy(tmp_path):
+    xwrf.tutorial.synthetic_dataset(nt=3).to_netcdf(tmp_path / 'wrfout.nc')
+    with xr.open_dataset(tmp_path / 'wrfout.nc') as raw:
+        ds = xwrf.postprocess._collapse_time_dim(raw)
+        for coord in ('XLAT', 'XLONG_U', 'ZNW'):
+            assert not ds[coord].variable._in_memory
+            assert 'Time' not in ds[coord].dims
+            assert ds[coord].attrs == raw[coord].attrs
+            np.testing.assert_array_equal(ds[coord].values, raw[coord].values[0])
+
+
+def test_collapse_time_dim_moving_domain():
+    ds = xwrf.tutorial.synthetic_dataset(nt=3)
+    assert not xwrf.postprocess._is_moving_domain(ds)
+    xr.testing.assert_identical(
+        xwrf.postprocess._collapse_time_dim(ds, check_static=True),
+        xwrf.postprocess._collapse_time_dim(ds),
+    )
+
+    ds['XLAT'] = ds['XLAT'] + xr.DataArray([0.0, 0.1, 0.2], dims='Time')
+    assert xwrf.postprocess._is_moving_domain(ds)
+    with pytest.warns(UserWarning, match='moving nest'):
+        collapsed = xwrf.postprocess._collapse_time_dim(ds, check_static=True)
+    assert collapsed['XLAT'].dims == ('Time', 'south_north', 'west_east')
+    assert collapsed['ZNU'].dims == ('bottom_top',)
+
+
+def _moving_nest(shifts, **kwargs):
+    # Nest whose latitude and longitude at each time are those of a window of a larger domain
+    # (with the same center), shifted by whole grid cells along south_north and west_east
+    ds = xwrf.tutorial.synthetic_dataset(nx=30, ny=25, nt=len(shifts), **kwargs)
+    outer = xwrf.tutorial.synthetic_dataset(nx=50, ny=45, nt=1)
+    for name in ('XLAT', 'XLONG'):
+        windows = [
+            outer[name].isel(
+                Time=0, south_north=slice(10 + dj, 35 + dj), west_east=slice(10 + di, 40 + di)
+            )
+            for dj, di in shifts
+        ]
+        ds[name] = xr.concat(windows, 'Time').assign_attrs(ds[name].attrs)
+    return ds
+
+
+def test_postprocess_moving_nest():
+    shifts = [(0, 0), (1, 2), (0, 0), (-3, 1)]
+    ds = _moving_nest(shifts)
+    static = ds.xwrf.postprocess()
+    xwrf.grid.clear_grid_cache()
+    moving = ds.xwrf.postprocess(moving_nest=True)
+
+    assert 'x' not in moving.coords and 'y' not in moving.coords
+    assert moving['XLAT'].dims == ('Time', 'y', 'x')
+    assert moving['x_nest'].dims == ('Time', 'x')
+    assert moving['y_stag_nest'].dims == ('Time', 'y_stag')
+    assert moving['x_nest'].attrs['standard_name'] == 'projection_x_coordinate'
+    for t, (dj, di) in enumerate(shifts):
+        np.testing.assert_allclose(moving['x_nest'][t], static['x'] + di * ds.DX)
+        np.testing.assert_allclose(moving['y_nest'][t], static['y'] + dj * ds.DY)
+        np.testing.assert_allclose(moving['x_stag_nest'][t], static['x_stag'] + di * ds.DX)
+    # The coordinates of each distinct nest position are computed once
+    assert xwrf.grid._shifted_grid.cache_info().currsize == 3
+    assert moving['air_pressure'].attrs['grid_mapping'] == 'wrf_projection'
+
+    # Same result with (cached) postprocessing plans
+    plan = xwrf.PostprocessPlan.from_dataset(ds, moving_nest=True)
+    xr.testing.assert_identical(plan.apply(ds), moving)
+
+    with pytest.raises(ValueError, match='moving nests'):
+        moving.xwrf.sel_points([38.0], [-98.0])
+
+
+def test_postprocess_moving_nest_without_lat_lon():
+    ds = xwrf.tutorial.synthetic_dataset(nt=2).drop_vars(['XLAT', 'XLONG'])
+    with pytest.warns(UserWarning, match='moving nest'):
+        moving = ds.xwrf.postprocess(moving_nest=True)
+    xr.testing.assert_identical(moving['x'], ds.xwrf.postprocess()['x'])
+
+
+@importorskip('netCDF4')
+@importorskip('dask')
+def test_open_mfdataset_moving_nest(tmp_path):
+    shifts = [(0, 0), (2, 1), (4, 2)]
+    ds = _moving_nest(shifts)
+    expected = ds.xwrf.postprocess(moving_nest=True)
+    paths = []
+    for t in range(len(shifts)):
+        part = ds.isel(Time=[t])
+        # The center attributes of moving nests follow the nest
+        part.attrs['CEN_LAT'] = ds.attrs['CEN_LAT'] + 0.1 * t
+        paths.append(tmp_path / f'wrfout_d02_{t}.nc')
+        part.to_netcdf(paths[-1])
+    with pytest.raises(ValueError, match='does not match the grid'):
+        xwrf.open_mfdataset(paths)
+    with xwrf.open_mfdataset(paths, moving_nest=True) as combined:
+        xr.testing.assert_allclose(combined['x_nest'], expected['x_nest'])
+        xr.testing.assert_allclose(combined['y_stag_nest'], expected['y_stag_nest'])
+
+
+@pytest.mark.parametrize(
+    'indexers',
+    [
+        {'Time': 0, 'z': 0},
+        {'x': 0},
+        {'x': [1, 5, 7], 'y': slice(2, 5)},
+        {'x': slice(None, None, 3), 'y': slice(6, 2, -2)},
+        {'y': -1, 'x': slice(4, 4)},
+    ],
+)
+@importorskip('netCDF4')
+@importorskip('dask')
+def test_calc_base_diagnostics_lazy(tmp_path, indexers):
+    raw = xwrf.tutorial.synthetic_dataset(nx=9, ny=7, nz=5, nt=3)
+    raw.to_netcdf(tmp_path / 'wrfout.nc')
+    expected = raw.chunk().xwrf.postprocess(decode_times=False)
+    with xr.open_dataset(tmp_path / 'wrfout.nc') as opened:
+        ds = opened.xwrf.postprocess(decode_times=False)
+        for varname in ('air_pressure', 'geopotential', 'wind_east', 'wind_north', 'wind_east_10'):
+            # Diagnostics of lazily indexed files compute only the accessed slice
+            assert not ds[varname].variable._in_memory
+            valid = {dim: indexer for dim, indexer in indexers.items() if dim in ds[varname].dims}
+            xr.testing.assert_allclose(
+                ds[varname].isel(valid).load(), expected[varname].isel(valid).compute()
+            )
+
+
+def test_calc_base_diagnostics_in_memory():
+    raw = xwrf.tutorial.synthetic_dataset(nx=9, ny=7, nz=5, nt=3)
+    ds = raw.xwrf.postprocess(decode_times=False)
+    expected = raw.chunk().xwrf.postprocess(decode_times=False)
+    for varname in ('air_pressure', 'geopotential', 'wind_east', 'wind_north', 'wind_east_10'):
+        # Diagnostics of in-memory datasets are computed once, rather than on every access
+        assert isinstance(ds[varname].variable._data, np.ndarray)
+        xr.testing.assert_allclose(ds[varname].load(), expected[varname].compute())
+
+
+@importorskip('netCDF4')
+def test_calc_base_diagnostics_memory(tmp_path):
+    raw = xwrf.tutorial.synthetic_dataset(nx=40, ny=30, nz=20, nt=2)
+    raw.to_netcdf(tmp_path / 'wrfout.nc')
+    with xr.open_dataset(tmp_path / 'wrfout.nc') as opened:
+        opened.xwrf.postprocess()
+        tracemalloc.start()
+        try:
+            opened.xwrf.postprocess()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    assert peak < 0.1 * raw.nbytes
@@ -0,0 +1,83 @@
+import logging
+import tracemalloc
+
+import pytest
+
+import xwrf
+
+from . import importorskip
+
+postprocess_stages = ['_restructure', '_calc_base_diagnostics', '_include_projection_coordinates']
+
+
+@pytest.fixture(scope='module')
+def raw():
+    return xwrf.tutorial.synthetic_dataset(nx=20, ny=15, nz=5)
+
+
+def test_profile_postprocess(raw):
+    stages = []
+    with xwrf.profile(callback=stages.append) as report:
+        raw.xwrf.postprocess()
+    assert [stage.stage for stage in report.stages] == postprocess_stages
+    assert stages == report.stages
+    assert all(stage.wall_time >= 0 and stage.dask_tasks == 0 for stage in report.stages)
+    assert all(stage.peak_bytes >= stage.allocated_bytes for stage in report.stages)
+    assert not tracemalloc.is_tracing()
+
+    df = report.to_dataframe()
+    assert list(df.columns) == ['stage', 'wall_time', 'allocated_bytes', 'peak_bytes', 'dask_tasks']
+    assert set(report.summary().index) == set(postprocess_stages)
+    assert '_calc_base_diagnostics' in repr(report)
+
+
+def test_profile_plan(raw):
+    plan = xwrf.PostprocessPlan.from_dataset(raw)
+    with xwrf.profile() as report:
+        plan.apply(raw)
+        raw.xwrf.postprocess()
+    summary = report.summary()
+    assert list(summary['runs']) == [2, 2, 2]
+    assert set(summary.index) == set(postprocess_stages)
+
+
+@importorskip('netCDF4')
+@importorskip('dask')
+@pytest.mark.parametrize('parallel', [True, False])
+def test_profile_open_mfdataset(tmp_path, parallel):
+    paths = [tmp_path / f'wrfout_d01_{i}.nc' for i in range(4)]
+    for i, path in enumerate(paths):
+        xwrf.tutorial.synthetic_dataset(nx=20, ny=15, nz=5, start=f'2099-10-0{i + 1}').to_netcdf(
+            path
+        )
+    with xwrf.profile() as report:
+        xwrf.open_mfdataset(paths, parallel=parallel).close()
+    assert list(report.summary()['runs']) == [4, 4, 4]
+    # Allocations are only measured for stages run in the main thread
+    measured = [stage.allocated_bytes is not None for stage in report.stages]
+    assert measured == [True] * 3 + [not parallel] * 9
+
+
+@importorskip('dask')
+def test_profile_dask_tasks(raw):
+    with xwrf.profile() as report:
+        raw.chunk({'Time': 1}).xwrf.postprocess()
+    tasks = {stage.stage: stage.dask_tasks for stage in report.stages}
+    # One task per chunk of each diagnostic (and wind pair)
+    assert tasks['_calc_base_diagnostics'] > 0
+    assert tasks['_include_projection_coordinates'] == 0
+
+
+def test_profile_inactive(raw):
+    with xwrf.profile() as report:
+        pass
+    raw.xwrf.postprocess()
+    assert report.stages == []
+    assert repr(report) == '<ProfileReport (no stages)>'
+
+
+def test_profile_config_logging(raw, caplog):
+    with caplog.at_level(logging.INFO, logger='xwrf.profiling'), xwrf.config.set(profile=True):
+        raw.xwrf.postprocess()
+    assert len(caplog.records) == len(postprocess_stages)
+    assert '_restructure' in caplog.text
@@ -0,0 +1,122 @@
+import os
+
+import numpy as np
+import pytest
+import xarray as xr
+
+import xwrf
+
+from . import importorskip
+
+target_grid = {'lat': np.arange(36.0, 40.01, 0.25), 'lon': np.arange(-102.0, -94.0, 0.25)}
+
+
+@pytest.fixture(scope='module')
+def ds():
+    ds = xwrf.tutorial.synthetic_dataset(nx=40, ny=30).xwrf.postprocess()
+    # Fields which are known on the target grid
+    return ds.assign(lat_field=ds['XLAT'].astype('f8'), lon_field=ds['XLONG_U'].astype('f8'))
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    with xwrf.config.set({'regrid_weights_cache_dir': str(tmp_path / 'weights')}):
+        yield tmp_path / 'weights'
+
+
+@pytest.mark.parametrize(
+    'method, atol', [('bilinear', 1e-4), ('nearest', 0.1), ('conservative', 0.2)]
+)
+def test_regrid(ds, cache_dir, method, atol):
+    regridded = ds.xwrf.regrid(target_grid, method=method, variables=['lat_field', 'lon_field'])
+    assert regridded['lat_field'].dims == ('lat', 'lon')
+    lat, lon = xr.broadcast(regridded['lat'], regridded['lon'])
+    # The target grid extends beyond the domain to the west
+    inside = regridded['lat_field'].notnull()
+    assert 0 < inside.sum() < inside.size
+    np.testing.assert_allclose(regridded['lat_field'].where(inside), lat.where(inside), atol=atol)
+    # Staggered variables are regridded from their own grid
+    inside = regridded['lon_field'].notnull()
+    np.testing.assert_allclose(regridded['lon_field'].where(inside), lon.where(inside), atol=atol)
+
+
+def test_regrid_conservative(ds, cache_dir):
+    # The middle target cell (spanning 20 degrees) contains the whole domain, whose cells all
+    # have the same area in the projection
+    regridded = ds.xwrf.regrid(
+        {'lat': [18.0, 38.0, 58.0], 'lon': [-118.0, -98.0, -78.0]},
+        method='conservative',
+        variables='lat_field',
+    )
+    np.testing.assert_allclose(regridded['lat_field'][1, 1], ds['lat_field'].mean())
+    assert regridded['lat_field'].count() == 1
+
+    # Four target cells splitting the domain, which all extend beyond it: the overlaps of each
+    # source cell add up to its area. Overlaps are weights relative to the largest weight, that
+    # of source cells entirely within the target cell.
+    index, weight = xwrf.regrid._regrid_weights(
+        ds['x'].values,
+        ds['y'].values,
+        ds['wrf_projection'].item(),
+        np.array([28.0, 48.0]),
+        np.array([-103.5, -96.5]),
+        method='conservative',
+    )
+    overlap = weight / weight.max(axis=-1, keepdims=True)
+    area = np.bincount(
+        index.ravel(), weights=overlap.ravel(), minlength=ds['x'].size * ds['y'].size
+    )
+    np.testing.assert_allclose(area, 1.0)
+
+
+def test_regrid_all_variables(ds, cache_dir):
+    regridded = ds.xwrf.regrid(xr.Dataset(coords=target_grid))
+    assert regridded['U'].dims == ('Time', 'z', 'lat', 'lon')
+    assert regridded['air_pressure'].attrs['units'] == 'Pa'
+    assert 'grid_mapping' not in regridded['air_pressure'].attrs
+    assert 'Time' in regridded.coords
+    assert 'wrf_projection' not in regridded and 'Times' not in regridded
+
+
+def test_regrid_cache(ds, cache_dir, monkeypatch):
+    ds.xwrf.regrid(target_grid, variables='T2')
+    assert len(os.listdir(cache_dir)) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError('Weights are recomputed')
+
+    monkeypatch.setattr(xwrf.regrid, '_regrid_weights', fail)
+    ds.xwrf.regrid(target_grid, variables='T2')
+    with pytest.raises(AssertionError):
+        ds.xwrf.regrid(target_grid, variables='T2', cache=False)
+
+
+def test_regrid_unwritable_cache(ds, tmp_path):
+    # Nothing can be created below a regular file (even with root permissions)
+    (tmp_path / 'file').touch()
+    expected = ds.xwrf.regrid(target_grid, variables='T2', cache=False)
+    with xwrf.config.set({'regrid_weights_cache_dir': str(tmp_path / 'file' / 'weights')}):
+        with pytest.warns(UserWarning, match='Unable to cache'):
+            regridded = ds.xwrf.regrid(target_grid, variables='T2')
+    xr.testing.assert_identical(regridded, expected)
+
+
+@importorskip('dask')
+def test_regrid_dask(ds, cache_dir):
+    chunked = ds.chunk({'Time': 1, 'y': 10})
+    regridded = chunked.xwrf.regrid(target_grid, variables='U')
+    assert regridded['U'].chunks[0] == (1, 1)
+    xr.testing.assert_allclose(
+        regridded['U'].compute(), ds.xwrf.regrid(target_grid, variables='U')['U']
+    )
+
+
+def test_regrid_invalid(ds, cache_dir):
+    with pytest.raises(ValueError, match='method'):
+        ds.xwrf.regrid(target_grid, method='cubic')
+    with pytest.raises(KeyError):
+        ds.xwrf.regrid({'y': [0.0], 'x': [0.0]})
+    with pytest.raises(ValueError, match='horizontal grid'):
+        ds.xwrf.regrid(target_grid, variables='P_TOP')
+    with pytest.raises(ValueError, match='postprocess'):
+        xwrf.tutorial.synthetic_dataset().xwrf.regrid(target_grid)
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+import xwrf
+from xwrf.rotation import _earth_relative
+
+from . import importorskip
+
+
+@pytest.fixture(scope='module')
+def raw():
+    return xwrf.tutorial.synthetic_dataset(nx=9, ny=7, nz=5, nt=3)
+
+
+def reference_rotation(u, v, cosalpha, sinalpha):
+    u = u.xwrf.destagger() if any(dim.endswith('_stag') for dim in u.dims) else u
+    v = v.xwrf.destagger() if any(dim.endswith('_stag') for dim in v.dims) else v
+    return u * cosalpha - v * sinalpha, v * cosalpha + u * sinalpha
+
+
+@pytest.mark.parametrize('names', [('U', 'V'), ('U10', 'V10')])
+def test_earth_relative(raw, names):
+    u, v = raw[names[0]], raw[names[1]]
+    east, north = _earth_relative(
+        u.variable, v.variable, raw['COSALPHA'].variable, raw['SINALPHA'].variable
+    )
+    expected_east, expected_north = reference_rotation(u, v, raw['COSALPHA'], raw['SINALPHA'])
+    xr.testing.assert_allclose(east, expected_east.variable.transpose(*east.dims))
+    xr.testing.assert_allclose(north, expected_north.variable.transpose(*north.dims))
+
+
+@importorskip('dask')
+@pytest.mark.parametrize(
+    'chunks',
+    [
+        {'Time': 1},
+        {'west_east_stag': 4, 'south_north': 3},
+        {'west_east_stag': 5, 'south_north_stag': 2, 'west_east': 3},
+        {'west_east_stag': (9, 1)},
+    ],
+)
+def test_earth_relative_dask(raw, chunks):
+    chunked = raw.chunk(chunks)
+    east, north = _earth_relative(
+        *(chunked[name].variable for name in ('U', 'V', 'COSALPHA', 'SINALPHA'))
+    )
+    expected_east, expected_north = reference_rotation(
+        raw['U'], raw['V'], raw['COSALPHA'], raw['SINALPHA']
+    )
+    # Both components come from the same (fused) tasks
+    assert set(east.data.dask.layers) - {east.data.name} == (
+        set(north.data.dask.layers) - {north.data.name}
+    )
+    xr.testing.assert_allclose(east.compute(), expected_east.variable)
+    xr.testing.assert_allclose(north.compute(), expected_north.variable)
+
+
+@importorskip('dask')
+@pytest.mark.parametrize('dtype', ['float32', 'float64', 'int16'])
+def test_earth_relative_dask_dtype(raw, dtype):
+    names = ('U', 'V', 'COSALPHA', 'SINALPHA')
+    variables = [raw[name].variable.astype(dtype if name in 'UV' else 'float32') for name in names]
+    east, _ = _earth_relative(*(var.chunk() for var in variables))
+    # The dtype of the dask metadata is that of the computed result
+    assert east.dtype == east.compute().dtype == _earth_relative(*variables)[0].dtype
+
+
+def test_rotate_to_earth_interpolated():
+    ds = xwrf.tutorial.synthetic_dataset(nx=9, ny=7, nz=12).xwrf.postprocess()
+    levels = ds.xwrf.destagger().xwrf.interp_level(['U', 'V'], levels=[50000.0, 30000.0])
+    east, north = ds.xwrf.rotate_to_earth(levels['U'], levels['V'])
+    expected = ds.xwrf.interp_level(['wind_east', 'wind_north'], levels=[50000.0, 30000.0])
+    assert east.dims == ('Time', 'air_pressure', 'y', 'x')
+    assert 'XLAT' in east.coords
+    xr.testing.assert_allclose(east, expected['wind_east'], check_dim_order=False, rtol=1e-5)
+    xr.testing.assert_allclose(north, expected['wind_north'], check_dim_order=False, rtol=1e-5)
+
+
+def test_rotate_to_earth_names(raw):
+    east, north = raw.xwrf.rotate_to_earth('U', 'V')
+    postprocessed = raw.xwrf.postprocess()
+    np.testing.assert_allclose(east, postprocessed['wind_east'], rtol=1e-6)
+    np.testing.assert_allclose(north, postprocessed['wind_north'], rtol=1e-6)
+    assert east.attrs == {'units': 'm s-1'}
+
+    with pytest.raises(ValueError):
+        raw.xwrf.rotate_to_earth('U', 'T2')
@@ -1,10 +1,14 @@
 import sys
 
+import numpy as np
+import pyproj
 import pytest
 import xarray as xr
 
 from xwrf import tutorial
 
+from . import importorskip
+
 
 @pytest.mark.network
 class TestLoadDataset:
@@ -36,3 +40,58 @@ class TestLoadDataset:
     def test_invalid_dataset_key(self):
         with pytest.raises(KeyError):
             tutorial.open_dataset('invalid_dataset_key')
+
+
+@pytest.mark.parametrize('kind', ['wrfout', 'geo_em', 'met_em'])
+@pytest.mark.parametrize('map_proj', [0, 1, 2, 3])
+def test_synthetic_dataset(kind, map_proj):
+    ds = tutorial.synthetic_dataset(kind, nx=8, ny=6, nz=5, nt=3, map_proj=map_proj)
+    assert ds.attrs['MAP_PROJ'] == map_proj
+    assert ds['Times'].dtype == 'S19'
+    assert ds.sizes['west_east_stag'] == ds.sizes['west_east'] + 1 == 9
+    assert ds.sizes['south_north_stag'] == ds.sizes['south_north'] + 1 == 7
+    assert ds.sizes['Time'] == (1 if kind == 'geo_em' else 3)
+
+    postprocessed = ds.xwrf.postprocess()
+    assert ('wrf_projection' in postprocessed) == (map_proj != 0)
+    if kind == 'wrfout':
+        assert postprocessed.sizes['z'] == 5
+        # Pressure decreases and potential temperature increases with height
+        assert (postprocessed['air_pressure'].diff('z') < 0).all()
+        assert (postprocessed['air_potential_temperature'].diff('z') > 0).all()
+        assert (postprocessed['RAINNC'].diff('Time') >= 0).all()
+
+
+def test_synthetic_dataset_coordinates():
+    ds = tutorial.synthetic_dataset(map_proj=1).xwrf.postprocess()
+    crs = ds['wrf_projection'].item()
+    x, y = np.meshgrid(ds['x_stag'].values, ds['y'].values)
+    lon, lat = pyproj.Transformer.from_crs(crs, 4326, always_xy=True).transform(x, y)
+    np.testing.assert_allclose(ds['XLAT_U'], lat, atol=1e-4)
+    np.testing.assert_allclose(ds['XLONG_U'], lon, atol=1e-4)
+    # Meridians converge towards the pole, so true north points west of grid north east of the
+    # standard longitude
+    np.testing.assert_allclose(np.hypot(ds['SINALPHA'], ds['COSALPHA']), 1, rtol=1e-6)
+    assert np.all(np.sign(ds['SINALPHA']) == -np.sign(ds['XLONG'] - ds.attrs['STAND_LON']))
+
+
+@importorskip('dask')
+def test_synthetic_dataset_chunks():
+    ds = tutorial.synthetic_dataset(chunks={'Time': 1})
+    assert ds['T'].chunks[0] == (1, 1)
+    xr.testing.assert_identical(ds['XLAT'].compute(), tutorial.synthetic_dataset()['XLAT'])
+
+
+@importorskip('netCDF4')
+def test_synthetic_dataset_on_disk(tmp_path):
+    expected = tutorial.synthetic_dataset()
+    with tutorial.synthetic_dataset(path=tmp_path / 'wrfout.nc') as ds:
+        xr.testing.assert_identical(ds['T'], expected['T'])
+        assert np.issubdtype(ds['XTIME'].dtype, np.datetime64)
+
+
+def test_synthetic_dataset_invalid():
+    with pytest.raises(ValueError):
+        tutorial.synthetic_dataset('wrfinput')
+    with pytest.raises(NotImplementedError):
+        tutorial.synthetic_dataset(map_proj=6)
@@ -2,14 +2,71 @@
 # flake8: noqa
 """Top-level module."""
 
-from importlib.metadata import PackageNotFoundError, version
+import importlib
 
-from . import postprocess, tutorial
+# Registers the accessors. Everything else is imported when first accessed (see __getattr__), so
+# that importing xwrf neither parses the configuration nor imports pyproj.
 from .accessors import WRFDataArrayAccessor, WRFDatasetAccessor
 from .config import config
-from .version_report import show_versions
 
-try:
-    __version__ = version(__name__)
-except PackageNotFoundError:  # pragma: no cover
-    __version__ = 'unknown'  # pragma: no cover
+_submodules = {'backend', 'grid', 'postprocess', 'tutorial'}
+# Other submodules, accessible as attributes once imported (as any submodule) or when accessed
+_other_submodules = {
+    'accumulation',
+    'destagger',
+    'hierarchy',
+    'interp',
+    'io',
+    'plan',
+    'points',
+    'profiling',
+    'regrid',
+    'rotation',
+    'version_report',
+}
+_lazy_attributes = {
+    'build_reference_index': 'io',
+    'DomainHierarchy': 'hierarchy',
+    'ChunkSuggestion': 'io',
+    'open_mfdataset': 'io',
+    'open_reference': 'io',
+    'PostprocessPlan': 'plan',
+    'ProfileReport': 'profiling',
+    'StageProfile': 'profiling',
+    'profile': 'profiling',
+    'show_versions': 'version_report',
+    'suggest_chunks': 'io',
+}
+
+__all__ = sorted(
+    {'WRFDataArrayAccessor', 'WRFDatasetAccessor', 'config', '__version__'}
+    | _submodules
+    | set(_lazy_attributes)
+)
+
+
+def _get_version() -> str:
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version(__name__)
+    except PackageNotFoundError:  # pragma: no cover
+        return 'unknown'  # pragma: no cover
+
+
+def __getattr__(name):
+    if name in _submodules or name in _other_submodules:
+        value = importlib.import_module(f'.{name}', __name__)
+    elif name in _lazy_attributes:
+        value = getattr(importlib.import_module(f'.{_lazy_attributes[name]}', __name__), name)
+    elif name == '__version__':
+        value = _get_version()
+    else:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    # Cache the attribute, so that __getattr__ is only called once per name
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
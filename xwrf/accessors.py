@@ -1,18 +1,22 @@
 from __future__ import annotations  # noqa: F401
 
+import os
+from collections import defaultdict
+from typing import Any, Hashable, Iterable, Iterator, Mapping, MutableMapping, Sequence
+
 import xarray as xr
 
-from .destagger import _destag_variable, _rename_staggered_coordinate
-from .postprocess import (
-    _assign_coord_to_dim_of_different_name,
-    _calc_base_diagnostics,
-    _collapse_time_dim,
-    _decode_times,
-    _include_projection_coordinates,
-    _make_units_pint_friendly,
-    _modify_attrs_to_cf,
-    _rename_dims,
+from .destagger import (
+    _destag_coordinate,
+    _destag_variable,
+    _destag_variables,
+    _rename_staggered_coordinate,
 )
+from .interp import _interp_level
+from .rotation import _earth_relative
+
+# Modules depending on pyproj or the configuration are imported by the methods using them, so
+# that registering the accessors on import of xwrf stays cheap
 
 
 class WRFAccessor:
@@ -33,6 +37,7 @@ class WRFDataArrayAccessor(WRFAccessor):
         stagger_dim: str | None = None,
         unstaggered_dim_name: str | None = None,
         exclude_staggered_auxiliary_coords: bool = False,
+        dataset: xr.Dataset | None = None,
     ) -> xr.DataArray:
         """
         Destagger a single WRF xarray.DataArray
@@ -51,6 +56,12 @@ class WRFDataArrayAccessor(WRFAccessor):
             data. If False, auxiliary coordinates are destaggered in the same fashion as the data
             (average of cell boundary values), which may introduce error in comparison to the
             analogous non-staggered coordinates from the original WRF data. Defaults to False.
+        dataset : xarray.Dataset, optional
+            Dataset this DataArray was taken from (or any dataset on the same grid and subset).
+            Its unstaggered coordinates (such as XLAT and XLONG for XLAT_U and XLONG_U, or x for
+            x_stag) are attached to the output as they are, without computation. Staggered
+            coordinates without such a counterpart are destaggered once per domain (grid
+            signature), and reused by later calls on DataArrays of datasets on the same grid.
 
         Returns
         -------
@@ -63,14 +74,29 @@ class WRFDataArrayAccessor(WRFAccessor):
         (exclude_staggered_auxiliary_coords=False), these are approximations made from the
         staggered coordinate values and may not be sufficiently accurate for all grid projections
         and/or use cases. For full accuracy, auxiliary coordinates should be re-computed from
-        dimension coordinates or obtained from the original dataset.
+        dimension coordinates or obtained from the original dataset, as done when passing the
+        dataset.
+
+        Examples
+        --------
+        >>> destaggered = {name: ds[name].xwrf.destagger(dataset=ds) for name in ('U', 'V')}
         """
         new_variable = _destag_variable(
             self.xarray_obj.variable, stagger_dim=stagger_dim, unstag_dim_name=unstaggered_dim_name
         )
 
+        if dataset is not None:
+            from .grid import _grid_signature
+
+            signature = _grid_signature(dataset)
+            old_dim, new_dim = next(
+                (old, new)
+                for old, new in zip(self.xarray_obj.dims, new_variable.dims)
+                if old != new
+            )
+
         # Need to recalculate staggered coordinates, as they don't already exist independently
-        # in a DataArray context
+        # in a DataArray context (unless taken from the dataset)
         new_coords = {}
         for coord_name, coord_data in self.xarray_obj.coords.items():
             if set(coord_data.dims).difference(set(new_variable.dims)):
@@ -78,17 +104,45 @@ class WRFDataArrayAccessor(WRFAccessor):
                 new_name = _rename_staggered_coordinate(
                     coord_name, stagger_dim=stagger_dim, unstag_dim_name=unstaggered_dim_name
                 )
-                if not exclude_staggered_auxiliary_coords or new_name in new_variable.dims:
+                if exclude_staggered_auxiliary_coords and new_name not in new_variable.dims:
                     # Skip if excluding and this isn't a dimension coordinate of output
+                    continue
+                if dataset is None:
                     new_coords[new_name] = _destag_variable(
                         coord_data.variable,
                         stagger_dim=stagger_dim,
                         unstag_dim_name=unstaggered_dim_name,
                     )
+                    continue
+                dims = tuple(new_dim if dim == old_dim else dim for dim in coord_data.dims)
+                reference = dataset.variables.get(new_name)
+                if (
+                    reference is not None
+                    and reference.dims == dims
+                    and reference.shape == tuple(new_variable.sizes[dim] for dim in dims)
+                ):
+                    # Exact unstaggered coordinate of the dataset
+                    new_coords[new_name] = reference
+                elif (
+                    coord_data.variable is dataset.variables.get(coord_name)
+                    and 'Time' not in coord_data.dims
+                ):
+                    # Static coordinate of the dataset (those of moving nests change over time)
+                    new_coords[new_name] = _destag_coordinate(
+                        (signature, coord_name, old_dim, new_dim),
+                        coord_data.variable,
+                        old_dim,
+                        new_dim,
+                    )
+                else:
+                    new_coords[new_name] = _destag_variable(
+                        coord_data.variable, stagger_dim=old_dim, unstag_dim_name=new_dim
+                    )
             else:
                 new_coords[coord_name] = coord_data.variable
 
-        return xr.DataArray(new_variable, coords=new_coords)
+        # Assigned rather than passed to the constructor, which copies coordinate data
+        return xr.DataArray(new_variable).assign_coords(new_coords)
 
 
 @xr.register_dataset_accessor('xwrf')
@@ -100,6 +154,8 @@ class WRFDatasetAccessor(WRFAccessor):
         decode_times: bool = True,
         calculate_diagnostic_variables: bool = True,
         drop_diagnostic_variable_components: bool = True,
+        check_static_domain: bool = False,
+        moving_nest: bool = False,
     ) -> xr.Dataset:
         """
         Postprocess the dataset. This method will perform the following operations:
@@ -112,6 +168,10 @@ class WRFDatasetAccessor(WRFAccessor):
         - Include projection coordinates.
         - Collapse time dimension.
 
+        These steps are planned once for all datasets with the same schema (see
+        :py:class:`xwrf.PostprocessPlan`), and made while building a shallow copy of the dataset,
+        which is left untouched.
+
         Parameters
         ----------
         decode_times : bool, optional
@@ -122,33 +182,93 @@ class WRFDatasetAccessor(WRFAccessor):
             as split components or dependent upon special adjustments. Also calculates earth-relative
             wind fields, as winds by default are grid-relative. Defaults to True. If the
             underlying fields on which any of these calculated fields depends is missing, that
-            calculated variable is skipped. These will be eagerly evalulated, unless your data has
-            been chunked with Dask, in which case these fields will also be Dask arrays.
+            calculated variable is skipped. These are lazily evaluated: only the slices of their
+            components matching the accessed slice are read and combined, when accessed. If your
+            data has been chunked with Dask, these fields will also be Dask arrays.
         drop_diagnostic_variable_components : bool, optional
             Determine whether to drop the underlying fields used to calculate the diagnostic
             variables. Defaults to True. Never drops grid-relative wind fields.
+        check_static_domain : bool, optional
+            Before collapsing the time dimension of the latitude and longitude coordinates, check
+            at a few sample points that they do not change over time (as with moving nests). If
+            they do, they keep their time dimension and a warning is emitted. Defaults to False.
+        moving_nest : bool, optional
+            Postprocess the output of a moving nest. The latitude and longitude coordinates keep
+            their time dimension, and the projection coordinates of the nest at each time (located
+            from its lower left latitude and longitude, on the grid of the global attributes) are
+            given as ``x_nest``, ``y_nest``, ``x_stag_nest`` and ``y_stag_nest`` coordinates
+            along ``Time``, instead of the ``x`` and ``y`` dimension coordinates. The coordinates
+            of each distinct nest position are only computed once. Defaults to False.
 
         Returns
         -------
         xarray.Dataset
             The postprocessed dataset.
         """
-        ds = (
-            self.xarray_obj.pipe(_modify_attrs_to_cf)
-            .pipe(_make_units_pint_friendly)
-            .pipe(_collapse_time_dim)
-            .pipe(_assign_coord_to_dim_of_different_name)
+        from .plan import PostprocessPlan
+
+        plan = PostprocessPlan.from_dataset(
+            self.xarray_obj,
+            decode_times=decode_times,
+            calculate_diagnostic_variables=calculate_diagnostic_variables,
+            drop_diagnostic_variable_components=drop_diagnostic_variable_components,
+            check_static_domain=check_static_domain,
+            moving_nest=moving_nest,
         )
-        if decode_times:
-            ds = ds.pipe(_decode_times)
-        if calculate_diagnostic_variables:
-            ds = ds.pipe(_calc_base_diagnostics, drop=drop_diagnostic_variable_components)
+        return plan._apply(self.xarray_obj)
 
-        ds = ds.pipe(_include_projection_coordinates)
+    def iter_timesteps(
+        self,
+        batch: int = 1,
+        prefetch: int = 2,
+        destagger: bool = False,
+        decode_times: bool = True,
+        calculate_diagnostic_variables: bool = True,
+        drop_diagnostic_variable_components: bool = True,
+    ) -> Iterator[xr.Dataset]:
+        """
+        Iterate over postprocessed and loaded batches of timesteps of the (raw) dataset
+
+        Only a few batches are in memory at any time, so that memory use does not grow with the
+        number of times in the dataset. The postprocessing steps which do not depend on the data
+        (grid, CRS, attribute changes) are planned once for all batches, and variables without a
+        ``Time`` dimension (such as the collapsed latitude and longitude) are only loaded with
+        the first batch. These are shared by all batches, so should not be modified in place.
+
+        Parameters
+        ----------
+        batch : int, optional
+            Number of timesteps per batch. Defaults to 1.
+        prefetch : int, optional
+            Number of batches read ahead on a background thread while the current one is being
+            processed. Defaults to 2. If 0, batches are read when requested.
+        destagger : bool, optional
+            Destagger the data variables of each batch. Defaults to False.
+        decode_times, calculate_diagnostic_variables, drop_diagnostic_variable_components : bool
+            Postprocessing options, see :py:meth:`xarray.Dataset.xwrf.postprocess`.
+
+        Yields
+        ------
+        xarray.Dataset
+            The postprocessed batches, in time order and loaded into memory.
+        """
+        from .io import _iter_timesteps
 
-        return ds.pipe(_rename_dims)
+        return _iter_timesteps(
+            self.xarray_obj,
+            batch=batch,
+            prefetch=prefetch,
+            destagger=destagger,
+            decode_times=decode_times,
+            calculate_diagnostic_variables=calculate_diagnostic_variables,
+            drop_diagnostic_variable_components=drop_diagnostic_variable_components,
+        )
 
-    def destagger(self, staggered_to_unstaggered_dims: dict[str, str] | None = None) -> xr.Dataset:
+    def destagger(
+        self,
+        staggered_to_unstaggered_dims: dict[str, str] | None = None,
+        variables: Hashable | Iterable[Hashable] | None = None,
+    ) -> xr.Dataset:
         """
         Destagger all data variables in a WRF xarray.Dataset
 
@@ -156,6 +276,9 @@ class WRFDatasetAccessor(WRFAccessor):
         ----------
         staggered_to_unstaggered_dims : dict, optional
             Mapping of target staggered dimensions to corresponding unstaggered dimensions
+        variables : hashable or iterable of hashable, optional
+            Name(s) of the data variables to destagger. All other data variables are left
+            untouched. Defaults to all data variables.
 
         Returns
         -------
@@ -172,24 +295,311 @@ class WRFDatasetAccessor(WRFAccessor):
             if staggered_to_unstaggered_dims is None
             else set(staggered_to_unstaggered_dims)
         )
-        new_data_vars = {}
-        for var_name, var_data in self.xarray_obj.data_vars.items():
+        if variables is None:
+            variables = self.xarray_obj.data_vars
+        elif isinstance(variables, str):
+            variables = [variables]
+        if missing := set(variables).difference(self.xarray_obj.data_vars):
+            raise KeyError(f'Variables {missing} are not data variables of the dataset')
+
+        # Group variables by their staggered dim
+        groups = defaultdict(dict)
+        for var_name in variables:
+            var_data = self.xarray_obj[var_name].variable
             if this_staggered_dims := set(var_data.dims).intersection(staggered_dims):
                 # Found a staggered dim
                 # TODO: should we raise an error if somehow end up with more than just one
                 # staggered dim, or just pick one from the set like below?
-                this_staggered_dim = this_staggered_dims.pop()
-                new_data_vars[var_name] = _destag_variable(
-                    var_data.variable,
-                    stagger_dim=this_staggered_dim,
+                groups[this_staggered_dims.pop()][var_name] = var_data
+
+        new_data_vars = {
+            var_name: var_data.variable for var_name, var_data in self.xarray_obj.data_vars.items()
+        }
+        for stagger_dim, group in groups.items():
+            new_data_vars.update(
+                _destag_variables(
+                    group,
+                    stagger_dim=stagger_dim,
                     unstag_dim_name=(
                         None
                         if staggered_to_unstaggered_dims is None
-                        else staggered_to_unstaggered_dims[this_staggered_dim]
+                        else staggered_to_unstaggered_dims[stagger_dim]
                     ),
                 )
-            else:
-                # No staggered dims
-                new_data_vars[var_name] = var_data.variable
+            )
 
         return xr.Dataset(new_data_vars, self.xarray_obj.coords, self.xarray_obj.attrs)
+
+    def deaccumulate(
+        self,
+        variables: Hashable | Iterable[Hashable] | None = None,
+        to: str = 'interval',
+        previous: xr.Dataset | None = None,
+        reset_tolerance: float = 1e-4,
+    ) -> xr.Dataset:
+        """
+        Convert fields accumulated since the start of the run into interval totals or rates
+
+        Each time step is the difference with the previous one, in a single pass along ``Time``:
+        Dask arrays keep their chunks, and each chunk only reads the last time of the preceding
+        chunk, so that long (e.g. multi-file) datasets are converted chunk by chunk. Emptied
+        buckets are added back from the bucket counters (such as ``I_RAINNC``) and the
+        ``BUCKET_MM`` or ``BUCKET_J`` attributes, and restarts of the accumulation (e.g.
+        between runs) are detected as decreases, after which the accumulated value is the
+        interval total.
+
+        Parameters
+        ----------
+        variables : hashable or iterable of hashable, optional
+            Name(s) of the accumulated variables. Defaults to those of the
+            ``accumulated_variables`` option of :py:data:`xwrf.config` in the dataset (such as
+            ``RAINNC``, ``RAINC``, ``ACHFX`` and ``ACLHF``).
+        to : {'interval', 'rate'}, optional
+            Convert to totals over the interval ending at each time (the default), or to mean
+            rates over these intervals (per second, using the actual time differences).
+        previous : xarray.Dataset, optional
+            Dataset preceding this one in time (such as the previous file, or batch of
+            :py:meth:`xarray.Dataset.xwrf.iter_timesteps`), whose last time is carried over to
+            convert the first time. Otherwise, the first time is NaN.
+        reset_tolerance : float, optional
+            Decreases of the accumulated values smaller than this fraction of the values are
+            round-off (and give zero) rather than restarts. Defaults to 1e-4.
+
+        Returns
+        -------
+        xarray.Dataset
+            The dataset, with the converted variables in place of the accumulated ones.
+        """
+        from .accumulation import _deaccumulate
+
+        return _deaccumulate(
+            self.xarray_obj,
+            variables=variables,
+            to=to,
+            previous=previous,
+            reset_tolerance=reset_tolerance,
+        )
+
+    def interp_level(
+        self,
+        target: Hashable | Iterable[Hashable] | None,
+        levels: Sequence[float],
+        coord: Hashable = 'air_pressure',
+        method: str | None = None,
+    ) -> xr.Dataset:
+        """
+        Interpolate data variables vertically to levels of a vertical coordinate variable
+
+        Each column of the coordinate is searched (by bisection, in all columns at once) for the
+        interval containing every level, and the resulting interpolation weights are reused for
+        all variables. Dask arrays are processed chunk by chunk (with whole columns in each chunk).
+
+        Parameters
+        ----------
+        target : hashable or iterable of hashable
+            Name(s) of the data variables to interpolate. If None, all data variables on the
+            vertical dimension of coord (or, if coord is vertically staggered, on the corresponding
+            unstaggered dimension) are interpolated.
+        levels : sequence of float
+            Levels to interpolate to, in the units of coord.
+        coord : hashable, optional
+            Name of the vertical coordinate variable, such as ``'air_pressure'`` (the default) or
+            ``'geopotential_height'``. Its columns must be monotonic. Staggered coordinates are
+            destaggered for variables on unstaggered levels.
+        method : {'linear', 'log'}, optional
+            Interpolate linearly in the coordinate or its logarithm. Defaults to ``'log'`` for
+            ``'air_pressure'`` and ``'linear'`` otherwise.
+
+        Returns
+        -------
+        xarray.Dataset
+            The interpolated variables, with the vertical dimension replaced by a coord dimension
+            with the levels as coordinate. Levels outside of a column are NaN.
+        """
+        return _interp_level(self.xarray_obj, target, levels, coord=coord, method=method)
+
+    def regrid(
+        self,
+        target_grid: xr.Dataset | xr.DataArray | Mapping[Hashable, Iterable[float]],
+        method: str = 'bilinear',
+        variables: Hashable | Iterable[Hashable] | None = None,
+        cache: bool = True,
+    ) -> xr.Dataset:
+        """
+        Regrid data variables of the postprocessed dataset to a regular latitude-longitude grid
+
+        Target points are located on the projection grid (given by the ``x`` and ``y``
+        coordinates and the ``wrf_projection`` CRS), giving a few sparse weights per target
+        point. These weights are computed once per grid, method and staggering, kept in a cache
+        on disk (see ``regrid_weights_cache_dir`` in :py:data:`xwrf.config`), and applied to all
+        variables. Dask arrays are regridded chunk by chunk (with whole horizontal slices in
+        each chunk).
+
+        Parameters
+        ----------
+        target_grid : xarray.Dataset, xarray.DataArray or mapping
+            Target grid, with one-dimensional ``lat`` and ``lon`` (or ``latitude`` and
+            ``longitude``) coordinates in degrees.
+        method : {'bilinear', 'conservative', 'nearest'}, optional
+            Interpolation method. Defaults to ``'bilinear'``. Conservative regridding averages
+            the source cells overlapping each target cell, weighted by the areas of their
+            overlaps (in the projection).
+        variables : hashable or iterable of hashable, optional
+            Name(s) of the data variables to regrid. Defaults to all numeric data variables on
+            the (staggered or unstaggered) horizontal grid.
+        cache : bool, optional
+            Read and write the weights from the disk cache. Defaults to True. Weights which
+            cannot be written (e.g., to a read-only cache directory) are used without caching,
+            with a warning.
+
+        Returns
+        -------
+        xarray.Dataset
+            The regridded variables, on ``lat`` and ``lon`` dimensions. Target points outside of
+            the WRF domain are NaN.
+        """
+        from .regrid import _regrid
+
+        return _regrid(
+            self.xarray_obj, target_grid, method=method, variables=variables, cache=cache
+        )
+
+    def sel_points(
+        self,
+        lat: float | Iterable[float] | xr.DataArray,
+        lon: float | Iterable[float] | xr.DataArray,
+        method: str = 'nearest',
+        variables: Hashable | Iterable[Hashable] | None = None,
+    ) -> xr.Dataset:
+        """
+        Extract the postprocessed dataset at points given by their latitude and longitude
+
+        Points are projected once to the projection coordinates (with a cached transformer to
+        the ``wrf_projection`` CRS), and their positions on the regular ``x`` and ``y`` grids
+        follow directly. Each horizontal grid (staggered or not) is then indexed with a single
+        vectorized indexing call.
+
+        Parameters
+        ----------
+        lat, lon : float, array-like or xarray.DataArray
+            Latitudes and longitudes of the points, in degrees. Arrays are extracted along a
+            ``points`` dimension, DataArrays along their own dimension(s), and scalars (a single
+            point) without a points dimension.
+        method : {'nearest', 'bilinear'}, optional
+            Take the nearest grid point (the default), or interpolate bilinearly between the four
+            surrounding grid points.
+        variables : hashable or iterable of hashable, optional
+            Name(s) of the variables to extract. Defaults to all variables.
+
+        Returns
+        -------
+        xarray.Dataset
+            The dataset with the horizontal dimensions replaced by the dimension(s) of the points,
+            and ``lat`` and ``lon`` coordinates. Points outside of the WRF domain are NaN.
+        """
+        from .points import _sel_points
+
+        return _sel_points(self.xarray_obj, lat, lon, method=method, variables=variables)
+
+    def rotate_to_earth(
+        self, u: Hashable | xr.DataArray, v: Hashable | xr.DataArray
+    ) -> tuple[xr.DataArray, xr.DataArray]:
+        """
+        Rotate a grid-relative vector pair to earth-relative components
+
+        Uses the map rotation (``COSALPHA`` and ``SINALPHA``) of the dataset. Staggered components
+        are destaggered along the way, and both components are computed together (block by block
+        for Dask arrays).
+
+        Parameters
+        ----------
+        u, v : hashable or xarray.DataArray
+            Grid-relative x and y components, given as names of data variables of the dataset or
+            as DataArrays on its horizontal grid (e.g., interpolated to other vertical levels).
+
+        Returns
+        -------
+        tuple of xarray.DataArray
+            The eastward and northward components.
+        """
+        u, v = (
+            self.xarray_obj[component] if not isinstance(component, xr.DataArray) else component
+            for component in (u, v)
+        )
+        east, north = _earth_relative(
+            u.variable,
+            v.variable,
+            self.xarray_obj['COSALPHA'].variable,
+            self.xarray_obj['SINALPHA'].variable,
+        )
+        coords = {
+            name: coord
+            for name, coord in {
+                **u.coords,
+                **v.coords,
+                **self.xarray_obj['COSALPHA'].coords,
+            }.items()
+            if set(coord.dims).issubset(east.dims)
+        }
+        attrs = {key: u.attrs[key] for key in ('units', 'grid_mapping') if key in u.attrs}
+        return (
+            xr.DataArray(east, coords=coords, attrs=attrs),
+            xr.DataArray(north, coords=coords, attrs=attrs),
+        )
+
+    def to_zarr(
+        self,
+        store: MutableMapping | str | os.PathLike,
+        chunk_target: int | str = '100MB',
+        access: str = 'map',
+        compressor: Any = None,
+        consolidated: bool = True,
+        **kwargs,
+    ):
+        """
+        Write the (postprocessed) WRF dataset to a Zarr store
+
+        Prepares the dataset for Zarr before writing it with :py:meth:`xarray.Dataset.to_zarr`:
+
+        - Chunk shapes are chosen per variable to hold about chunk_target bytes, suited to the
+          access pattern. If Dask is available, variables are chunked accordingly, so that they
+          are written chunk by chunk (and lazy diagnostics only computed chunk by chunk).
+        - The ``wrf_projection`` CRS object is replaced by an integer variable with its CF
+          grid mapping attributes.
+        - Encodings which are specific to netCDF, or stale (such as chunk sizes of staggered
+          variables carried over by destaggering), are dropped.
+        - Consolidated metadata is written.
+
+        Parameters
+        ----------
+        store : MutableMapping, str or path-like
+            Store or path to write to.
+        chunk_target : int or str, optional
+            Target size of the chunks, in bytes or as a string such as ``'100MB'`` (the
+            default).
+        access : {'map', 'timeseries'}, optional
+            Access pattern to optimize reads for: whole horizontal fields (``'map'``, the default),
+            or long time series at few points (``'timeseries'``).
+        compressor : optional
+            Compression codec (such as ``numcodecs.Blosc()`` for Zarr format 2, or
+            ``zarr.codecs.BloscCodec()`` for Zarr format 3). Defaults to the Zarr default.
+        consolidated : bool, optional
+            Write consolidated metadata. Defaults to True.
+        **kwargs : dict, optional
+            Additional keyword arguments passed through to :py:meth:`xarray.Dataset.to_zarr`.
+
+        Returns
+        -------
+        The result of :py:meth:`xarray.Dataset.to_zarr`.
+        """
+        from .io import _to_zarr
+
+        return _to_zarr(
+            self.xarray_obj,
+            store,
+            chunk_target=chunk_target,
+            access=access,
+            compressor=compressor,
+            consolidated=consolidated,
+            **kwargs,
+        )
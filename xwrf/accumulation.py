@@ -0,0 +1,118 @@
+"""Provide the conversion of WRF fields accumulated over the run into interval totals or rates."""
+
+from __future__ import annotations  # noqa: F401
+
+import re
+from typing import Hashable, Iterable
+
+import numpy as np
+import xarray as xr
+
+from .config import config
+from .postprocess import _decoded_time_values
+
+# Standard names of accumulated fields (a typo of WRF in some of them is tolerated)
+_integral_pattern = re.compile(r'integral_of_(.+)_wr[ft]_time')
+
+
+def _time_values(ds: xr.Dataset) -> np.ndarray:
+    """Get the times of a raw or postprocessed dataset as datetime64 values."""
+    if 'Time' in ds.coords and np.issubdtype(ds['Time'].dtype, np.datetime64):
+        return ds['Time'].values
+    return np.asarray(_decoded_time_values(ds), dtype='datetime64[ns]')
+
+
+def _bucket_size(ds: xr.Dataset, name: Hashable) -> float | None:
+    """Get the bucket size of an accumulated variable with a bucket counter (``I_<name>``)."""
+    if f'I_{name}' not in ds.variables:
+        return None
+    # Energy accumulations (in J m-2) use BUCKET_J, and precipitation BUCKET_MM
+    attr = 'BUCKET_J' if 'J' in str(ds[name].attrs.get('units', '')) else 'BUCKET_MM'
+    if attr not in ds.attrs:
+        raise ValueError(
+            f'{name} has a bucket counter I_{name}, but the dataset has no {attr} attribute '
+            '(the bucket size)'
+        )
+    size = float(np.ravel(ds.attrs[attr])[0])
+    # WRF disables buckets with non-positive sizes
+    return size if size > 0 else None
+
+
+def _accumulated_total(ds: xr.Dataset, name: Hashable) -> xr.DataArray:
+    """Get an accumulated variable, adding the emptied buckets (in double precision)."""
+    total = ds[name].astype(np.float64)
+    bucket = _bucket_size(ds, name)
+    if bucket is not None:
+        total = total + ds[f'I_{name}'] * bucket
+    return total
+
+
+def _deaccumulated_attrs(attrs: dict, to: str) -> dict:
+    attrs = dict(attrs)
+    match = _integral_pattern.fullmatch(str(attrs.get('standard_name', '')))
+    if to == 'rate':
+        if match is not None:
+            attrs['standard_name'] = match.group(1)
+        else:
+            attrs.pop('standard_name', None)
+        if 'units' in attrs:
+            attrs['units'] = f'{attrs["units"]} s-1'
+        attrs['cell_methods'] = 'Time: mean'
+    else:
+        attrs['cell_methods'] = 'Time: sum'
+    return attrs
+
+
+def _deaccumulate(
+    ds: xr.Dataset,
+    variables: Hashable | Iterable[Hashable] | None = None,
+    to: str = 'interval',
+    previous: xr.Dataset | None = None,
+    reset_tolerance: float = 1e-4,
+) -> xr.Dataset:
+    """Convert accumulated variables of ds, see ``Dataset.xwrf.deaccumulate``."""
+    if to not in ('interval', 'rate'):
+        raise ValueError(f"to must be 'interval' or 'rate', not {to!r}")
+    if 'Time' not in ds.dims:
+        raise ValueError('The dataset has no Time dimension to deaccumulate along')
+    if variables is None:
+        variables = [name for name in config.get('accumulated_variables') if name in ds.data_vars]
+    elif isinstance(variables, str):
+        variables = [variables]
+    if missing := set(variables).difference(ds.data_vars):
+        raise KeyError(f'Variables {missing} are not data variables of the dataset')
+
+    # Intervals between times (in seconds), the first one ending the previous dataset if given
+    times = _time_values(ds)
+    seconds = np.diff(times) / np.timedelta64(1, 's')
+    first_seconds = np.nan
+    if previous is not None:
+        first_seconds = (times[0] - _time_values(previous)[-1]) / np.timedelta64(1, 's')
+    dt = xr.DataArray(np.concatenate([[first_seconds], seconds]), dims='Time')
+    first = xr.DataArray(np.arange(ds.sizes['Time']) == 0, dims='Time')
+
+    deaccumulated = {}
+    for name in variables:
+        datavar = ds[name]
+        if 'Time' not in datavar.dims:
+            raise ValueError(f'{name} {datavar.dims} has no Time dimension')
+        total = _accumulated_total(ds, name)
+        # Shifting keeps the chunks of Dask arrays, so that each chunk only needs the last time
+        # of the preceding one (and the result is computed chunk by chunk along Time)
+        before = total.shift(Time=1)
+        if previous is not None:
+            # Carry over the last time of the previous dataset (e.g., file or batch)
+            last = _accumulated_total(previous, name).isel(Time=-1, drop=True)
+            before = before.where(~first, last.variable)
+        interval = total - before
+        # Accumulations start over after restarts (or emptied buckets without a counter), seen
+        # as decreases beyond round-off, and then hold the total since the restart
+        reset = interval < -reset_tolerance * abs(before)
+        interval = interval.where(~(interval < 0), 0).where(~reset, total)
+        if to == 'rate':
+            # Repeated times (e.g., overlapping restart output) have no rate
+            interval = interval / dt.where(dt > 0)
+        if datavar.dtype.kind == 'f':
+            interval = interval.astype(datavar.dtype)
+        deaccumulated[name] = interval.assign_attrs(_deaccumulated_attrs(datavar.attrs, to))
+    return ds.assign(deaccumulated)
@@ -0,0 +1,95 @@
+"""Provide an xarray backend that postprocesses WRF output at open time."""
+
+from __future__ import annotations  # noqa: F401
+
+import os
+from typing import Iterable
+
+import xarray as xr
+from xarray.backends import BackendEntrypoint
+
+
+class WRFBackendEntrypoint(BackendEntrypoint):
+    """
+    Backend for opening WRF output with ``xarray.open_dataset(..., engine='xwrf')``.
+
+    The file is opened lazily through an underlying netCDF store (``netcdf4`` or ``h5netcdf``)
+    and postprocessed in the same pass, so that renaming, CF attribute mapping, unit
+    harmonization, time decoding and projection coordinates only touch metadata. Diagnostic
+    variables are lazily indexed and only read their components when accessed.
+    """
+
+    description = 'Open WRF output and postprocess it with xWRF'
+    url = 'https://xwrf.readthedocs.io'
+
+    def open_dataset(
+        self,
+        filename_or_obj: str | os.PathLike,
+        *,
+        drop_variables: str | Iterable[str] | None = None,
+        mask_and_scale: bool = True,
+        decode_times: bool = True,
+        concat_characters: bool = True,
+        decode_coords: bool = True,
+        use_cftime: bool | None = None,
+        decode_timedelta: bool | None = None,
+        store_engine: str = 'netcdf4',
+        calculate_diagnostic_variables: bool = True,
+        drop_diagnostic_variable_components: bool = True,
+    ) -> xr.Dataset:
+        """
+        Open and postprocess a WRF dataset.
+
+        Parameters
+        ----------
+        filename_or_obj : str or path-like
+            Path to the WRF file.
+        drop_variables : str or iterable of str, optional
+            Variables to exclude from the dataset.
+        mask_and_scale, concat_characters, decode_coords, use_cftime, decode_timedelta
+            Passed through to the underlying store, see :py:func:`xarray.open_dataset`.
+        decode_times : bool, optional
+            Decode CF times in the underlying store as well as the WRF ``Times`` variable.
+            Defaults to True.
+        store_engine : str, optional
+            Name of the backend used to read the file. Defaults to ``'netcdf4'``.
+        calculate_diagnostic_variables : bool, optional
+            Calculate the diagnostic variables, see :py:meth:`xarray.Dataset.xwrf.postprocess`.
+            Defaults to True.
+        drop_diagnostic_variable_components : bool, optional
+            Drop the components of the diagnostic variables. Defaults to True.
+
+        Returns
+        -------
+        xarray.Dataset
+            The postprocessed dataset.
+        """
+        # Imported here, as xarray imports backends whenever it lists the available engines
+        from .plan import PostprocessPlan
+
+        if store_engine == 'xwrf':
+            raise ValueError('store_engine must be the name of a netCDF backend, not "xwrf".')
+        ds = xr.open_dataset(
+            filename_or_obj,
+            engine=store_engine,
+            chunks=None,
+            drop_variables=drop_variables,
+            mask_and_scale=mask_and_scale,
+            decode_times=decode_times,
+            concat_characters=concat_characters,
+            decode_coords=decode_coords,
+            use_cftime=use_cftime,
+            decode_timedelta=decode_timedelta,
+        )
+        # Plans are cached by schema, so files of the same run only build it once
+        plan = PostprocessPlan.from_dataset(
+            ds,
+            decode_times=decode_times,
+            calculate_diagnostic_variables=calculate_diagnostic_variables,
+            drop_diagnostic_variable_components=drop_diagnostic_variable_components,
+        )
+        return plan._apply(ds)
+
+    def guess_can_open(self, filename_or_obj) -> bool:
+        # Opening with xWRF is always opt-in, as it changes the contents of the dataset
+        return False
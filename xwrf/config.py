@@ -1,16 +1,122 @@
+"""Provide the xwrf configuration, loaded on first use."""
+
+import functools
+import hashlib
+import json
 import os
 
-import yaml
-from donfig import Config
+_config_files = {
+    None: os.path.join(os.path.dirname(__file__), 'config.yaml'),
+    'unit_harmonization_map': os.path.join(
+        os.path.dirname(__file__), 'unit_harmonization_map.yaml'
+    ),
+}
+fn = _config_files[None]
+
+
+def _user_cache_dir(*parts: str) -> str:
+    """Get a directory within the xwrf directory of the user cache directory."""
+    cache_home = os.environ.get('XDG_CACHE_HOME', os.path.join('~', '.cache'))
+    return os.path.expanduser(os.path.join(cache_home, 'xwrf', *parts))
+
+
+def _parse_defaults(sources: dict) -> dict:
+    import yaml
+
+    # The LibYAML parser (if available) is an order of magnitude faster than the Python one
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    defaults = {}
+    for key, source in sources.items():
+        parsed = yaml.load(source, Loader=loader)
+        if key is None:
+            defaults.update(parsed)
+        else:
+            defaults[key] = parsed
+    return defaults
+
+
+def _load_defaults() -> dict:
+    """
+    Get the default configuration from the YAML files.
+
+    If the ``XWRF_DEFAULTS_CACHE`` environment variable is set (to ``1``, ``true`` or ``yes``),
+    the parsed defaults are kept (as JSON, which is much faster to load) in the user cache
+    directory, keyed by the hash of the YAML files, if that directory is writable. Otherwise,
+    nothing is written.
+    """
+    sources = {}
+    for key, path in _config_files.items():
+        with open(path, 'rb') as f:
+            sources[key] = f.read()
+    if os.environ.get('XWRF_DEFAULTS_CACHE', '').lower() not in ('1', 'true', 'yes'):
+        return _parse_defaults(sources)
+    digest = hashlib.sha256(b'\0'.join(sources.values())).hexdigest()[:16]
+    cache_path = os.path.join(_user_cache_dir('defaults'), f'{digest}.json')
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    defaults = _parse_defaults(sources)
+    try:
+        representable = json.loads(json.dumps(defaults)) == defaults
+    except TypeError:
+        representable = False
+    if not representable:
+        # e.g. non-string keys or dates, so the defaults are parsed every time
+        return defaults
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f'{cache_path}.tmp.{os.getpid()}'
+        with open(tmp_path, 'w') as f:
+            json.dump(defaults, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # e.g. read-only home directories
+        pass
+    return defaults
+
+
+@functools.lru_cache(maxsize=None)
+def _load_config():
+    from donfig import Config
+
+    config = Config('xwrf', defaults=[_load_defaults()])
+    # Copy the defaults to the user configuration directory (if writable) for reference
+    config.ensure_file(fn, comment=False)
+    return config
+
+
+class _LazyConfig:
+    """
+    Proxy of the xwrf :py:class:`donfig.Config`, which is only created (and its defaults
+    parsed) when first used, rather than when importing xwrf.
+    """
+
+    def __getattr__(self, name):
+        return getattr(_load_config(), name)
+
+    def __getitem__(self, key):
+        return _load_config()[key]
+
+    def __contains__(self, key) -> bool:
+        return key in _load_config()
+
+    def __iter__(self):
+        return iter(_load_config().config)
+
+    def __repr__(self) -> str:
+        return repr(_load_config())
+
 
-fn = os.path.join(os.path.dirname(__file__), 'config.yaml')
+config = _LazyConfig()
 
-with open(fn) as f:
-    defaults = yaml.safe_load(f)
 
-unit_harm_fn = os.path.join(os.path.dirname(__file__), 'unit_harmonization_map.yaml')
-with open(unit_harm_fn) as f:
-    defaults['unit_harmonization_map'] = yaml.safe_load(f)
+def __getattr__(name):
+    # The Config class (documented with the configuration) is only imported when needed
+    if name == 'Config':
+        from donfig import Config
 
-config = Config('xwrf', defaults=[defaults])
-config.ensure_file(fn, comment=False)
+        return Config
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
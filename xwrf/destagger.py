@@ -1,5 +1,14 @@
+import collections
+import functools
+
+import numpy as np
 import xarray as xr
 
+# Destaggered auxiliary coordinates of whole domains, by grid signature and coordinate (see
+# _destag_coordinate), the least recently used beyond _coordinate_cache_size being evicted
+_coordinate_cache = collections.OrderedDict()
+_coordinate_cache_size = 64
+
 
 def _drop_attrs(attrs_dict, attrs_to_drop):
     try:
@@ -8,6 +17,44 @@ def _drop_attrs(attrs_dict, attrs_to_drop):
         return None
 
 
+def _destag_block(block, axis):
+    """Average neighbouring values along axis, allocating only the output array for NumPy."""
+    left = block[(slice(None),) * axis + (slice(None, -1),)]
+    right = block[(slice(None),) * axis + (slice(1, None),)]
+    if isinstance(block, np.ndarray):
+        out = np.add(left, right, dtype=np.result_type(block.dtype, 0.5))
+        out *= 0.5
+        return out
+    return (left + right) * 0.5
+
+
+def _destag_dask(data, axis):
+    """Destagger a dask array block-by-block, using a one-element halo from the next block.
+
+    The output has the same chunks as the input along axis, less one element in the last chunk, so
+    that a staggered dimension chunked consistently with its unstaggered counterpart yields
+    output chunks aligned with the unstaggered dimension.
+    """
+    import dask.array as da
+
+    chunks = data.chunks[axis]
+    if len(chunks) > 1 and chunks[-1] == 1:
+        # A trailing single-element chunk would destagger to an empty chunk, so merge it
+        data = data.rechunk({axis: chunks[:-2] + (chunks[-2] + 1,)})
+        chunks = data.chunks[axis]
+    depth = dict.fromkeys(range(data.ndim), 0)
+    depth[axis] = (0, 1)
+    return da.map_overlap(
+        functools.partial(_destag_block, axis=axis),
+        data,
+        depth=depth,
+        boundary='none',
+        trim=False,
+        chunks=data.chunks[:axis] + (chunks[:-1] + (chunks[-1] - 1,),) + data.chunks[axis + 1 :],
+        dtype=np.result_type(data.dtype, 0.5),
+    )
+
+
 def _destag_variable(datavar, stagger_dim=None, unstag_dim_name=None):
     """
     Destaggering function for a single wrf xarray.Variable
@@ -60,26 +107,90 @@ def _destag_variable(datavar, stagger_dim=None, unstag_dim_name=None):
         stagger_dim = stagger_dim[0]
     # Otherwise, we have a valid user provided stagger dimension
 
-    # Destagger by mean of offset slices representing each side with respect to the stagger_dim
-    stagger_dim_size = datavar.sizes[stagger_dim]
-    left_or_bottom_cells = datavar.isel({stagger_dim: slice(0, stagger_dim_size - 1)})
-    right_or_top_cells = datavar.isel({stagger_dim: slice(1, stagger_dim_size)})
-    center_mean = (left_or_bottom_cells + right_or_top_cells) * 0.5
-
     # Determine new dimension name; if not given, use part of original name before "_stag"
     if unstag_dim_name is None:
         unstag_dim_name = stagger_dim.split('_stag')[0]
 
+    return _destag_along(datavar, stagger_dim, unstag_dim_name)
+
+
+def _destag_variables(datavars, stagger_dim, unstag_dim_name=None):
+    """
+    Destagger several xarray.Variables sharing the same staggered dimension
+
+    The dimension names are resolved and validated once for all variables; each variable is
+    then destaggered on its own.
+
+    Parameters
+    ----------
+    datavars : mapping of hashable to xarray.Variable
+        Data variables to be destaggered, all including stagger_dim
+    stagger_dim : str
+        Name of dimension to unstagger
+    unstag_dim_name : str, optional
+        String to which to rename the dimension after destaggering. By default the text in front
+        of "_stag" from the "stagger_dim" field.
+
+    Returns
+    -------
+    dict
+        Mapping of the same keys to the destaggered variables with renamed dimension
+    """
+    if unstag_dim_name is None:
+        unstag_dim_name = stagger_dim.split('_stag')[0]
+    for name, datavar in datavars.items():
+        if stagger_dim not in datavar.dims:
+            raise ValueError(f'{stagger_dim} not in {datavar.dims} of {name}')
+    return {
+        name: _destag_along(datavar, stagger_dim, unstag_dim_name)
+        for name, datavar in datavars.items()
+    }
+
+
+def _destag_along(datavar, stagger_dim, unstag_dim_name):
+    """Destagger a Variable along a known stagger_dim, without further validation."""
+    # Destagger by mean of offset slices representing each side with respect to the stagger_dim,
+    # block-by-block for dask arrays so that chunks stay aligned
+    axis = datavar.get_axis_num(stagger_dim)
+    if datavar.chunks is not None:
+        center_mean = _destag_dask(datavar.data, axis)
+    else:
+        center_mean = _destag_block(datavar.data, axis)
+
     # Return a Variable with renamed dimensions, updated data and attrs, and original encoding
     return xr.Variable(
-        dims=tuple(str(unstag_dim_name) if dim == stagger_dim else dim for dim in center_mean.dims),
-        data=center_mean.data,
+        dims=tuple(str(unstag_dim_name) if dim == stagger_dim else dim for dim in datavar.dims),
+        data=center_mean,
         attrs=_drop_attrs(datavar.attrs, ('stagger', 'c_grid_axis_shift')),
         encoding=datavar.encoding,
         fastpath=True,
     )
 
 
+def _destag_coordinate(key, coord, stagger_dim, unstag_dim_name):
+    """
+    Destagger a coordinate Variable at most once per key (e.g., the grid signature of its dataset
+    and its name) and position, the loaded values being shared between calls and hence read-only.
+
+    Subsets of the coordinate with the same shape (but other positions on the grid) are told
+    apart by the values at their corners, so that only these are read to look up the cache.
+    """
+    if coord.size == 0:
+        return _destag_along(coord, stagger_dim, unstag_dim_name)
+    corners = coord.isel({dim: [0, -1] for dim in coord.dims}).values
+    key = (key, coord.shape, corners.dtype.str, corners.tobytes())
+    if key in _coordinate_cache:
+        _coordinate_cache.move_to_end(key)
+    else:
+        destaggered = _destag_along(coord, stagger_dim, unstag_dim_name).load()
+        destaggered.data.flags.writeable = False
+        _coordinate_cache[key] = destaggered
+        if len(_coordinate_cache) > _coordinate_cache_size:
+            _coordinate_cache.popitem(last=False)
+    # Shallow copies keep changes to attributes from leaking into the cache
+    return _coordinate_cache[key].copy(deep=False)
+
+
 def _rename_staggered_coordinate(name, stagger_dim=None, unstag_dim_name=None):
     if name == stagger_dim and unstag_dim_name is not None:
         return unstag_dim_name
@@ -6,35 +6,123 @@ rights reserved.
 
 from __future__ import annotations  # noqa: F401
 
+import functools
 from typing import Hashable, Mapping
 
 import numpy as np
 import pyproj
 import xarray as xr
 
-# Default CRS (lon/lat on WGS84, which is EPSG:4326)
-wgs84 = pyproj.CRS(4326)
+from .config import config
+from .destagger import _coordinate_cache
+
+
+@functools.lru_cache(maxsize=None)
+def _wgs84() -> pyproj.CRS:
+    """Get the default CRS (lon/lat on WGS84, which is EPSG:4326), created on first use."""
+    return pyproj.CRS(4326)
+
+
+def __getattr__(name):
+    # Keep wgs84 available as a module attribute, without creating the CRS on import
+    if name == 'wgs84':
+        return _wgs84()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+@functools.lru_cache(maxsize=16)
+def _lonlat_transformer(crs: pyproj.CRS) -> pyproj.Transformer:
+    """Get the (cached) transformer from longitude and latitude to the projection coordinates."""
+    return pyproj.Transformer.from_crs(4326, crs, always_xy=True)
+
+
+# Dimensions of the WRF grid, with the direction of their grid spacing attribute
+_grid_dims = {
+    'south_north': 'DY',
+    'west_east': 'DX',
+    'south_north_stag': 'DY',
+    'west_east_stag': 'DX',
+}
+# Global attributes which, along with the horizontal grid size, define a WRF grid
+grid_attrs = (
+    'MAP_PROJ',
+    'TRUELAT1',
+    'TRUELAT2',
+    'STAND_LON',
+    'MOAD_CEN_LAT',
+    'CEN_LAT',
+    'CEN_LON',
+    'DX',
+    'DY',
+)
+
+
+def _hashable_attr(value):
+    """Convert an attribute value (scalar or array-like) to a hashable (dtype, value) pair."""
+    # Keep NumPy scalar types, so that the CRS is constructed from the exact attribute values, and
+    # their dtype, as equal values of different precision (e.g., float32 and float64) hash equal
+    values = np.ravel(value)
+    return values.dtype.str, values[0] if values.size == 1 else tuple(values)
+
+
+def _attr_value(hashable):
+    """Get the attribute value back from its hashable form (see ``_hashable_attr``)."""
+    return None if hashable is None else hashable[1]
+
+
+def _grid_signature(ds: xr.Dataset) -> tuple:
+    """Get a hashable signature of the projection attributes and grid size of a dataset.
+
+    Dimensions are looked up by their raw WRF names, or their names after postprocessing (see the
+    ``rename_dim_map`` option), so that postprocessed datasets have the signature of their raw
+    dataset. Attributes and dimensions which are missing from the dataset are given as None.
+    """
+    attrs = tuple(
+        _hashable_attr(ds.attrs[attr]) if attr in ds.attrs else None for attr in grid_attrs
+    )
+    return attrs + (_dim_size(ds, 'west_east'), _dim_size(ds, 'south_north'))
+
+
+def _dim_size(ds: xr.Dataset, dim: str) -> int | None:
+    """Get the size of a raw WRF dimension, which may have been renamed by postprocessing."""
+    if dim in ds.sizes:
+        return ds.sizes[dim]
+    return ds.sizes.get(config.get(f'rename_dim_map.{dim}', None))
 
 
 def _wrf_grid_from_dataset(ds: xr.Dataset) -> Mapping[Hashable, pyproj.CRS | np.ndarray]:
-    """Get the WRF projection and dimension coordinates out of the file."""
+    """Get the WRF projection and dimension coordinates out of the file.
+
+    Grids are memoized by their signature (see ``grid_cache_info``), so the returned dimension
+    coordinate arrays are shared between datasets on the same grid and hence read-only.
+    """
+    return dict(_wrf_grid_from_signature(_grid_signature(ds)))
 
-    # Use standards from a typical WRF file
-    cen_lon = ds.CEN_LON
-    cen_lat = ds.CEN_LAT
-    dx = ds.DX
-    dy = ds.DY
-    proj_id = ds.MAP_PROJ
+
+@functools.lru_cache(maxsize=64)
+def _wrf_grid_from_signature(signature: tuple) -> Mapping[Hashable, pyproj.CRS | np.ndarray]:
+    """Construct the WRF projection and dimension coordinates from a grid signature."""
+    missing = [
+        name
+        for name, value in zip(grid_attrs + ('west_east', 'south_north'), signature)
+        if value is None and name != 'TRUELAT2'
+    ]
+    if missing:
+        raise KeyError(f'Missing grid attributes or dimensions: {missing}')
+    proj_id, truelat1, truelat2, stand_lon, moad_cen_lat, cen_lat, cen_lon, dx, dy = (
+        _attr_value(value) for value in signature[: len(grid_attrs)]
+    )
+    nx, ny = signature[len(grid_attrs) :]
 
     pargs = {
         'x_0': 0,
         'y_0': 0,
         'a': 6370000,
         'b': 6370000,
-        'lat_1': ds.TRUELAT1,
-        'lat_2': getattr(ds, 'TRUELAT2', ds.TRUELAT1),
-        'lat_0': ds.MOAD_CEN_LAT,
-        'lon_0': ds.STAND_LON,
+        'lat_1': truelat1,
+        'lat_2': truelat1 if truelat2 is None else truelat2,
+        'lat_0': moad_cen_lat,
+        'lon_0': stand_lon,
         'center_lon': cen_lon,
     }
 
@@ -69,18 +157,91 @@ def _wrf_grid_from_dataset(ds: xr.Dataset) -> Mapping[Hashable, pyproj.CRS | np.
         crs = pyproj.CRS(pargs)
 
         # Get grid specifications
-        trf = pyproj.Transformer.from_crs(wgs84, crs, always_xy=True)
+        trf = pyproj.Transformer.from_crs(_wgs84(), crs, always_xy=True)
         e, n = trf.transform(cen_lon, cen_lat)
 
-    nx = np.float64(ds.sizes['west_east'])
-    ny = np.float64(ds.sizes['south_north'])
+    nx = np.float64(nx)
+    ny = np.float64(ny)
     x0 = -(nx - 1) / 2.0 * dx + e  # DL corner
     y0 = -(ny - 1) / 2.0 * dy + n  # DL corner
 
-    return {
+    grid = {
         'crs': crs,
         'south_north': y0 + np.arange(ny) * dy,
         'west_east': x0 + np.arange(nx) * dx,
         'south_north_stag': y0 + (np.arange(ny + 1) - 0.5) * dy,
         'west_east_stag': x0 + (np.arange(nx + 1) - 0.5) * dx,
     }
+    # Coordinate arrays are shared by all users of the cache, so protect them from modification
+    for value in grid.values():
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False
+    return grid
+
+
+def _nest_offsets(signature: tuple, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """
+    Get the offsets (in whole grid cells along south_north and west_east) from the grid of a
+    signature of the grids with their lower left mass point at lat and lon (e.g. the positions of
+    a moving nest over time).
+    """
+    grid = _wrf_grid_from_signature(signature)
+    if grid['crs'] is None:
+        # Idealized runs have no geographic coordinates to locate the domain with
+        return np.zeros(np.shape(lat) + (2,), dtype=int)
+    dx, dy = (_attr_value(signature[grid_attrs.index(attr)]) for attr in ('DX', 'DY'))
+    x, y = _lonlat_transformer(grid['crs']).transform(lon, lat)
+    return np.stack(
+        [
+            np.rint((y - grid['south_north'][0]) / dy),
+            np.rint((x - grid['west_east'][0]) / dx),
+        ],
+        axis=-1,
+    ).astype(int)
+
+
+@functools.lru_cache(maxsize=256)
+def _shifted_grid(signature: tuple, offset: tuple[int, int]) -> Mapping[str, np.ndarray]:
+    """Get the (cached, read-only) dimension coordinates of a grid shifted by whole grid cells."""
+    grid = _wrf_grid_from_signature(signature)
+    shift = dict(zip(('DY', 'DX'), offset))
+    shifted = {
+        dim: grid[dim] + shift[attr] * _attr_value(signature[grid_attrs.index(attr)])
+        for dim, attr in _grid_dims.items()
+    }
+    for value in shifted.values():
+        value.flags.writeable = False
+    return shifted
+
+
+def _moving_grid(signature: tuple, lat: np.ndarray, lon: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Get the time-dependent dimension coordinates of a moving nest on the grid of a signature,
+    given the latitude and longitude of its lower left mass point at each time.
+
+    The coordinates of each distinct nest position are computed (and cached) once, so that
+    positions repeated within or across datasets cost nothing.
+    """
+    offsets, inverse = np.unique(
+        _nest_offsets(signature, lat, lon).reshape(-1, 2), axis=0, return_inverse=True
+    )
+    grids = [_shifted_grid(signature, (int(dj), int(di))) for dj, di in offsets]
+    return {dim: np.stack([grid[dim] for grid in grids])[inverse.ravel()] for dim in _grid_dims}
+
+
+def grid_cache_info() -> functools._CacheInfo:
+    """Get the hits, misses and size of the cache of WRF grids.
+
+    Returns
+    -------
+    functools._CacheInfo
+        Named tuple of ``hits``, ``misses``, ``maxsize`` and ``currsize``.
+    """
+    return _wrf_grid_from_signature.cache_info()
+
+
+def clear_grid_cache() -> None:
+    """Clear the cache of WRF grids (and its statistics), and of destaggered coordinates."""
+    _wrf_grid_from_signature.cache_clear()
+    _coordinate_cache.clear()
+    _shifted_grid.cache_clear()
@@ -0,0 +1,287 @@
+"""Provide nested WRF domains, with the mapping between the grids of nests and their parents."""
+
+from __future__ import annotations  # noqa: F401
+
+import os
+import re
+from typing import Any, Hashable, Iterable, Mapping
+
+import numpy as np
+import pyproj
+import xarray as xr
+
+from .grid import _grid_signature, _wrf_grid_from_signature
+from .io import _expand_paths, open_mfdataset
+
+# Domain number in WRF file names, e.g. wrfout_d02_2099-10-01_00:00:00 or geo_em.d02.nc
+_domain_pattern = re.compile(r'[_.]d(\d\d)[_.]')
+# Horizontal dimensions (postprocessed and raw names) and the parent start attribute along them
+_nest_dims = {
+    'y': ('south_north', 'J_PARENT_START', False),
+    'x': ('west_east', 'I_PARENT_START', False),
+    'y_stag': ('south_north_stag', 'J_PARENT_START', True),
+    'x_stag': ('west_east_stag', 'I_PARENT_START', True),
+}
+
+
+def _read_metadata(
+    path: str, engine: str
+) -> tuple[dict[Hashable, Any], dict[Hashable, int], tuple]:
+    """Read the global attributes, dimension sizes and grid signature of a file (not its data)."""
+    with xr.open_dataset(path, engine=engine, chunks=None, decode_times=False) as ds:
+        return dict(ds.attrs), dict(ds.sizes), _grid_signature(ds)
+
+
+def _nest_index_map(attrs: Mapping[Hashable, Any], sizes: Mapping[Hashable, int]) -> xr.Dataset:
+    """
+    Get the positions in the parent grid of the points of a nest, from its parent grid ratio and
+    (one-based) parent start, at which the lower left corners of the nest and parent cells meet.
+    """
+    ratio = int(attrs['PARENT_GRID_RATIO'])
+    index_map = xr.Dataset()
+    for dim, (wrf_dim, start_attr, staggered) in _nest_dims.items():
+        if wrf_dim not in sizes:
+            continue
+        k = np.arange(sizes[wrf_dim])
+        start = int(attrs[start_attr]) - 1
+        # Mass points are in the middle of cells, staggered points on their edges
+        position = start + (k if staggered else k + 0.5 - ratio / 2) / ratio
+        index_map[f'parent_{dim}_index'] = (dim, start + k // ratio)
+        index_map[f'parent_{dim}_position'] = (dim, position)
+    index_map.attrs['parent_grid_ratio'] = ratio
+    return index_map
+
+
+class DomainHierarchy:
+    """
+    Nested WRF domains, opened lazily, with precomputed index maps between nests and parents.
+
+    The position of each nest in its parent grid is given by its ``PARENT_GRID_RATIO``,
+    ``I_PARENT_START`` and ``J_PARENT_START`` attributes, from which the parent cell (and the
+    fractional parent grid position) of every nest point is precomputed. Selecting the parent
+    cells under a nest, or averaging a nest onto them, is then a single indexing (or reshaping)
+    operation rather than a search on latitudes and longitudes. For moving nests, the position of
+    the first file of the nest is used.
+
+    Parameters
+    ----------
+    paths : str, path-like or iterable of path-like
+        Glob string (e.g. ``"wrfout_d0*"``) or list of the wrfout (or geo_em) files of all
+        domains. Files are grouped by domain using the ``dNN`` part of their names or, failing
+        that, their ``GRID_ID`` attribute.
+    engine : str, optional
+        Name of the backend engine used to read the files. Defaults to ``'netcdf4'``.
+    **kwargs : dict, optional
+        Additional keyword arguments passed to :py:func:`xwrf.open_mfdataset` when opening a
+        domain (such as ``chunks``).
+
+    Attributes
+    ----------
+    files : dict of int to list of str
+        Files of each domain, by domain number.
+    parents : dict of int to int or None
+        Parent domain of each domain, None for the outermost domain (or if the parent domain is
+        not part of the hierarchy).
+
+    Examples
+    --------
+    >>> domains = xwrf.DomainHierarchy('wrfout_d0*')
+    >>> under_nest = domains.parent_cells(3)
+    >>> nest_on_parent = domains.block_average(3)
+    """
+
+    def __init__(
+        self,
+        paths: str | os.PathLike | Iterable[str | os.PathLike],
+        *,
+        engine: str = 'netcdf4',
+        **kwargs,
+    ):
+        self._open_kwargs = dict(engine=engine, **kwargs)
+        files = {}
+        for path in _expand_paths(paths):
+            match = _domain_pattern.search(os.path.basename(path))
+            if match is not None:
+                domain = int(match.group(1))
+            else:
+                domain = int(_read_metadata(path, engine)[0]['GRID_ID'])
+            files.setdefault(domain, []).append(path)
+        self.files = dict(sorted(files.items()))
+
+        # Only the metadata of the first file of each domain is read until a domain is opened
+        self._attrs, self._sizes, self._signatures = {}, {}, {}
+        for domain, domain_files in self.files.items():
+            metadata = _read_metadata(domain_files[0], engine)
+            self._attrs[domain], self._sizes[domain], self._signatures[domain] = metadata
+        self.parents = {}
+        self._index_maps = {}
+        for domain, attrs in self._attrs.items():
+            parent = int(attrs.get('PARENT_ID', 0))
+            if parent == domain or parent not in self.files:
+                self.parents[domain] = None
+                continue
+            self.parents[domain] = parent
+            self._index_maps[domain] = _nest_index_map(attrs, self._sizes[domain])
+        self._datasets = {}
+
+    def __repr__(self) -> str:
+        domains = ', '.join(
+            f'd{domain:02d}' + ('' if parent is None else f' (in d{parent:02d})')
+            for domain, parent in self.parents.items()
+        )
+        return f'<DomainHierarchy: {domains}>'
+
+    def _parent(self, domain: int) -> int:
+        if domain not in self.files:
+            raise KeyError(f'Domain {domain} is not part of the hierarchy')
+        if self.parents[domain] is None:
+            raise ValueError(f'Domain {domain} has no parent in the hierarchy')
+        return self.parents[domain]
+
+    def dataset(self, domain: int) -> xr.Dataset:
+        """
+        Get the postprocessed dataset of a domain, opened (lazily) on first use.
+
+        Parameters
+        ----------
+        domain : int
+            Domain number.
+
+        Returns
+        -------
+        xarray.Dataset
+            The domain's files, opened with :py:func:`xwrf.open_mfdataset`.
+        """
+        if domain not in self.files:
+            raise KeyError(f'Domain {domain} is not part of the hierarchy')
+        if domain not in self._datasets:
+            self._datasets[domain] = open_mfdataset(self.files[domain], **self._open_kwargs)
+        return self._datasets[domain]
+
+    def grid(self, domain: int) -> Mapping[Hashable, pyproj.CRS | np.ndarray]:
+        """
+        Get the (cached) CRS and projection coordinates of a domain, from its metadata only.
+
+        Parameters
+        ----------
+        domain : int
+            Domain number.
+
+        Returns
+        -------
+        dict
+            The CRS (``'crs'``, None for idealized runs) and read-only dimension coordinates (by
+            raw WRF dimension name).
+        """
+        if domain not in self.files:
+            raise KeyError(f'Domain {domain} is not part of the hierarchy')
+        return _wrf_grid_from_signature(self._signatures[domain])
+
+    def index_map(self, domain: int) -> xr.Dataset:
+        """
+        Get the positions in the parent grid of the points of a nest.
+
+        Parameters
+        ----------
+        domain : int
+            Domain number of the nest.
+
+        Returns
+        -------
+        xarray.Dataset
+            For each (staggered or unstaggered) horizontal dimension of the nest, the zero-based
+            index of the parent cell (or, for staggered dimensions, of the parent point at or
+            before) each point is in (``parent_x_index``, ...) and its fractional index in the
+            parent grid (``parent_x_position``, ...), along the postprocessed dimension names.
+        """
+        self._parent(domain)
+        return self._index_maps[domain]
+
+    def _parent_slices(self, domain: int) -> dict[Hashable, slice]:
+        """Get the slices of the parent grid under a nest, by dimension name (raw and renamed)."""
+        index_map = self.index_map(domain)
+        ratio = index_map.attrs['parent_grid_ratio']
+        slices = {}
+        for dim, (wrf_dim, _, staggered) in _nest_dims.items():
+            if f'parent_{dim}_index' not in index_map:
+                continue
+            index = index_map[f'parent_{dim}_index'].values
+            stop = index[0] + (index.size - 1 if staggered else index.size) // ratio
+            slices[dim] = slices[wrf_dim] = slice(index[0], stop + 1 if staggered else stop)
+        return slices
+
+    def parent_cells(self, domain: int, ds: xr.Dataset | None = None) -> xr.Dataset:
+        """
+        Select the parent cells under a nest.
+
+        Parameters
+        ----------
+        domain : int
+            Domain number of the nest.
+        ds : xarray.Dataset, optional
+            Dataset (raw or postprocessed) on the grid of the parent. Defaults to the dataset of
+            the parent domain.
+
+        Returns
+        -------
+        xarray.Dataset
+            The part of the parent dataset covered by the nest (with the staggered points on its
+            edges).
+        """
+        if ds is None:
+            ds = self.dataset(self._parent(domain))
+        slices = self._parent_slices(domain)
+        return ds.isel({dim: value for dim, value in slices.items() if dim in ds.dims})
+
+    def block_average(self, domain: int, ds: xr.Dataset | None = None) -> xr.Dataset:
+        """
+        Average a nest onto the parent cells under it.
+
+        Values on the mass points of each parent cell are the mean of the ``ratio x ratio`` nest
+        cells in it. Values on staggered points are averaged over the nest points on the
+        matching parent cell edge (as WRF does when feeding nests back to their parents).
+
+        Parameters
+        ----------
+        domain : int
+            Domain number of the nest.
+        ds : xarray.Dataset, optional
+            Dataset (raw or postprocessed) on the grid of the nest. Defaults to the dataset of
+            the nest domain.
+
+        Returns
+        -------
+        xarray.Dataset
+            The nest on the grid of :py:meth:`DomainHierarchy.parent_cells`, with the projection
+            coordinates of the parent.
+        """
+        if ds is None:
+            ds = self.dataset(domain)
+        ratio = self.index_map(domain).attrs['parent_grid_ratio']
+        slices = self._parent_slices(domain)
+        staggered = [
+            name
+            for dim, (wrf_dim, _, stag) in _nest_dims.items()
+            if stag
+            for name in (dim, wrf_dim)
+        ]
+        unstaggered = [
+            name
+            for dim, (wrf_dim, _, stag) in _nest_dims.items()
+            if not stag
+            for name in (dim, wrf_dim)
+        ]
+        # Staggered points on parent cell edges are every ratio-th nest point, and nest cells
+        # are averaged (by reshaping) in blocks of ratio along unstaggered dimensions
+        result = ds.isel({dim: slice(None, None, ratio) for dim in staggered if dim in ds.dims})
+        result = result.coarsen(
+            {dim: ratio for dim in unstaggered if dim in result.dims}, boundary='trim'
+        ).mean()
+
+        grid = self.grid(self._parent(domain))
+        coords = {}
+        for dim, (wrf_dim, _, _) in _nest_dims.items():
+            for name in (dim, wrf_dim):
+                if name in result.indexes:
+                    coords[name] = (name, grid[wrf_dim][slices[name]], result[name].attrs)
+        return result.assign_coords(coords)
@@ -0,0 +1,186 @@
+"""Provide vertical interpolation of WRF fields to pressure or height levels."""
+
+from __future__ import annotations  # noqa: F401
+
+from typing import Hashable, Iterable, Sequence
+
+import numpy as np
+import xarray as xr
+
+from .destagger import _destag_variable
+
+# Vertical dimensions of raw and postprocessed WRF datasets
+_vertical_dims = ('bottom_top', 'bottom_top_stag', 'z', 'z_stag')
+
+
+def _level_weights(coord, levels, log=False):
+    """
+    Find, in every column, the coordinate interval containing each level and its weight.
+
+    Parameters
+    ----------
+    coord : numpy.ndarray
+        Vertical coordinate, with the (monotonic) columns along the last axis.
+    levels : numpy.ndarray
+        Target levels, in the same units as coord.
+    log : bool, optional
+        Compute the weights in the logarithm of the coordinate (e.g., for pressure).
+
+    Returns
+    -------
+    index, weight : numpy.ndarray
+        Index of the lower bound of the interval and weight of the upper bound, with the levels
+        along the last axis. Weights are NaN for levels outside of the column.
+    """
+    coord = np.log(coord) if log else np.asarray(coord, dtype=np.float64)
+    levels = np.log(levels) if log else np.asarray(levels, dtype=np.float64)
+    # Flip the sign of decreasing columns (e.g., pressure), so that all columns are increasing
+    sign = np.where(coord[..., :1] > coord[..., -1:], -1.0, 1.0)
+    coord = coord * sign
+    target = levels * sign
+
+    # Binary search in all columns and for all levels at once, narrowing [lower, upper] until
+    # it is a single interval (in ceil(log2(size - 1)) steps)
+    size = coord.shape[-1]
+    lower = np.zeros(target.shape, dtype=np.intp)
+    upper = np.full(target.shape, size - 1, dtype=np.intp)
+    for _ in range(max(size - 2, 0).bit_length()):
+        middle = (lower + upper) // 2
+        below = np.take_along_axis(coord, middle, axis=-1) <= target
+        lower = np.where(below, middle, lower)
+        upper = np.where(below, upper, middle)
+
+    lower_value = np.take_along_axis(coord, lower, axis=-1)
+    upper_value = np.take_along_axis(coord, upper, axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weight = (target - lower_value) / (upper_value - lower_value)
+    weight[~((weight >= 0) & (weight <= 1))] = np.nan
+    return lower, weight
+
+
+def _interp_with_weights(values, index, weight):
+    """Interpolate the columns (along the last axis) of values with precomputed weights."""
+    lower = np.take_along_axis(values, index, axis=-1)
+    upper = np.take_along_axis(values, index + 1, axis=-1)
+    result = lower + weight * (upper - lower)
+    if np.issubdtype(values.dtype, np.floating):
+        return result.astype(values.dtype, copy=False)
+    return result
+
+
+def _vertical_dim(datavar: xr.DataArray) -> Hashable:
+    dims = [dim for dim in _vertical_dims if dim in datavar.dims]
+    if len(dims) != 1:
+        raise ValueError(f'Expected a single vertical dimension, found {dims} in {datavar.dims}')
+    return dims[0]
+
+
+def _single_vertical_chunk(datavar: xr.DataArray, dim: Hashable) -> xr.DataArray:
+    # Columns are interpolated as a whole, so dask arrays are only chunked horizontally
+    return datavar if datavar.chunks is None else datavar.chunk({dim: -1})
+
+
+def _interp_level(
+    ds: xr.Dataset,
+    target: Hashable | Iterable[Hashable] | None,
+    levels: Sequence[float],
+    coord: Hashable = 'air_pressure',
+    method: str | None = None,
+) -> xr.Dataset:
+    """Interpolate data variables of ds to levels of the coord variable."""
+    if method is None:
+        method = 'log' if coord == 'air_pressure' else 'linear'
+    if method not in ('linear', 'log'):
+        raise ValueError(f"method must be 'linear' or 'log', not {method!r}")
+    if coord not in ds:
+        raise KeyError(f'Vertical coordinate {coord} is not in the dataset')
+    levels = np.atleast_1d(np.asarray(levels, dtype=np.float64))
+
+    # The coordinate applies to variables on its vertical dimension, and (after destaggering) on
+    # the corresponding unstaggered dimension
+    coord_var = ds[coord]
+    coord_dim = _vertical_dim(coord_var)
+    coords_by_dim = {coord_dim: coord_var}
+    if coord_dim.endswith('_stag'):
+        unstag_dim = coord_dim.split('_stag')[0]
+        coords_by_dim[unstag_dim] = xr.DataArray(
+            _destag_variable(coord_var.variable, coord_dim, unstag_dim),
+            coords={
+                name: value
+                for name, value in coord_var.coords.items()
+                if coord_dim not in value.dims
+            },
+        )
+
+    def on_coord_grid(datavar):
+        # Variables must be on a vertical dimension of the coordinate, and on its horizontal grid
+        dims = set(coords_by_dim).intersection(datavar.dims)
+        return len(dims) == 1 and set(coords_by_dim[dims.pop()].dims).issubset(datavar.dims)
+
+    if target is None:
+        target = [
+            name
+            for name, datavar in ds.data_vars.items()
+            if name != coord and on_coord_grid(datavar)
+        ]
+    elif isinstance(target, str):
+        target = [target]
+    if missing := set(target).difference(ds.data_vars):
+        raise KeyError(f'Variables {missing} are not data variables of the dataset')
+
+    level_coord = xr.Variable(
+        coord,
+        levels,
+        attrs={k: v for k, v in coord_var.attrs.items() if k in ('units', 'standard_name')},
+    )
+    weights = {}
+    data_vars = {}
+    for name in target:
+        datavar = ds[name]
+        if not on_coord_grid(datavar):
+            raise ValueError(
+                f'{name} {datavar.dims} is not on the grid of {coord} {coord_var.dims}, '
+                'destagger it first'
+            )
+        dim = _vertical_dim(datavar)
+        if coords_by_dim[dim].sizes[dim] < 2:
+            raise ValueError(
+                f'{coord} has a single level along {dim}, at least two are needed to interpolate'
+            )
+        if dim not in weights:
+            # Weights are computed once per vertical dimension, and reused for all variables
+            weights[dim] = xr.apply_ufunc(
+                _level_weights,
+                _single_vertical_chunk(coords_by_dim[dim], dim),
+                kwargs={'levels': levels, 'log': method == 'log'},
+                input_core_dims=[[dim]],
+                output_core_dims=[[coord], [coord]],
+                dask='parallelized',
+                output_dtypes=[np.intp, np.float64],
+                dask_gufunc_kwargs={'output_sizes': {coord: levels.size}},
+            )
+        index, weight = weights[dim]
+        data_vars[name] = xr.apply_ufunc(
+            _interp_with_weights,
+            _single_vertical_chunk(datavar, dim),
+            index,
+            weight,
+            input_core_dims=[[dim], [coord], [coord]],
+            output_core_dims=[[coord]],
+            dask='parallelized',
+            output_dtypes=[
+                datavar.dtype if np.issubdtype(datavar.dtype, np.floating) else np.float64
+            ],
+            keep_attrs=True,
+        ).transpose(*[coord if d == dim else d for d in datavar.dims], ...)
+
+    result = xr.Dataset(data_vars, attrs=ds.attrs)
+    result.coords[coord] = level_coord
+    # Keep the (horizontal and time) coordinates of the dataset which do not vary vertically
+    return result.assign_coords(
+        {
+            name: value
+            for name, value in ds.coords.items()
+            if not set(value.dims).intersection(_vertical_dims) and name != coord
+        }
+    )
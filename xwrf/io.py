@@ -0,0 +1,796 @@
+"""Provide helpers for opening (and postprocessing) WRF datasets, and for writing them."""
+
+from __future__ import annotations  # noqa: F401
+
+import contextlib
+import contextvars
+import glob
+import json
+import math
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Hashable, Iterable, Iterator, Mapping, MutableMapping, NamedTuple
+
+import numpy as np
+import pyproj
+import xarray as xr
+
+from .config import config
+from .grid import _grid_signature, _hashable_attr, grid_attrs
+from .interp import _vertical_dims
+from .plan import PostprocessPlan, _dataset_schema
+
+# Horizontal dimensions of raw and postprocessed WRF datasets
+_horizontal_dims = (
+    'south_north',
+    'west_east',
+    'south_north_stag',
+    'west_east_stag',
+    'y',
+    'x',
+    'y_stag',
+    'x_stag',
+)
+# Encodings which remain valid for a variable written to Zarr (all others are netCDF specific or
+# may be stale, e.g. chunk sizes copied from a staggered variable when destaggering)
+_zarr_encodings = ('_FillValue', 'dtype', 'scale_factor', 'add_offset', 'units', 'calendar')
+# The netCDF-C and HDF5 libraries are not thread-safe (and xarray only locks data reads, not the
+# metadata reads when opening a file), so files are opened with the netcdf4 engine one at a time
+_netcdf4_lock = threading.Lock()
+_byte_units = {
+    '': 1,
+    'b': 1,
+    'kb': 10**3,
+    'mb': 10**6,
+    'gb': 10**9,
+    'kib': 2**10,
+    'mib': 2**20,
+    'gib': 2**30,
+}
+
+
+def _expand_paths(paths: str | os.PathLike | Iterable[str | os.PathLike]) -> list[str]:
+    """Expand a glob string or a sequence of paths into a list of paths."""
+    if isinstance(paths, (str, os.PathLike)):
+        paths = os.fspath(paths)
+        expanded = sorted(glob.glob(paths)) if glob.has_magic(paths) else [paths]
+    else:
+        expanded = [os.fspath(path) for path in paths]
+    if not expanded:
+        raise OSError(f'no files to open matching {paths}')
+    return expanded
+
+
+def open_mfdataset(
+    paths: str | os.PathLike | Iterable[str | os.PathLike],
+    *,
+    chunks: int | dict | str | None = None,
+    engine: str = 'netcdf4',
+    parallel: bool = True,
+    max_workers: int | None = None,
+    decode_times: bool = True,
+    calculate_diagnostic_variables: bool = True,
+    drop_diagnostic_variable_components: bool = True,
+    moving_nest: bool = False,
+    **kwargs,
+) -> xr.Dataset:
+    """
+    Open and postprocess multiple WRF files as a single dataset concatenated along ``Time``.
+
+    Each file is postprocessed on its own (in a thread pool if ``parallel``) before combining, using
+    the :py:class:`PostprocessPlan` built once from the first file. All other files must share its
+    projection attributes and grid size. Combining does not compare coordinates or non-time
+    variables, which are taken from the first file.
+
+    Parameters
+    ----------
+    paths : str, path-like or iterable of path-like
+        Glob string (e.g. ``"wrfout_d01_*"``) or explicit list of files to open, in time order.
+    chunks : int, dict or str, optional
+        Chunk sizes passed to :py:func:`xarray.open_dataset` for each file. ``'xwrf-auto'``
+        uses the chunks suggested by :py:func:`suggest_chunks` for the first file (with the
+        ``auto_chunks`` options of :py:data:`xwrf.config`). Defaults to the preferred (on-disk)
+        chunks of the backend, as with ``chunks={}``.
+    engine : str, optional
+        Name of the backend engine used to read the files. Defaults to ``'netcdf4'``.
+    parallel : bool, optional
+        Open and postprocess the files concurrently. Defaults to True. With the ``netcdf4``
+        engine, only postprocessing is concurrent, as the netCDF library is not thread-safe.
+    max_workers : int, optional
+        Maximum number of threads used if ``parallel``. Defaults to the
+        :py:class:`concurrent.futures.ThreadPoolExecutor` default.
+    decode_times, calculate_diagnostic_variables, drop_diagnostic_variable_components : bool
+        Postprocessing options, see :py:meth:`xarray.Dataset.xwrf.postprocess`.
+    moving_nest : bool, optional
+        Postprocess the output of a moving nest, see :py:meth:`xarray.Dataset.xwrf.postprocess`.
+        The nest center attributes (``CEN_LAT`` and ``CEN_LON``) may then differ between files,
+        and the nest is located on the grid of the first file at all times. Defaults to False.
+    **kwargs : dict, optional
+        Additional keyword arguments passed through to :py:func:`xarray.open_dataset`.
+
+    Returns
+    -------
+    xarray.Dataset
+        The postprocessed, combined dataset.
+    """
+    paths = _expand_paths(paths)
+    open_kwargs = dict(engine=engine, chunks={} if chunks is None else chunks, **kwargs)
+
+    if chunks == 'xwrf-auto':
+        first = xr.open_dataset(paths[0], **{**open_kwargs, 'chunks': None})
+        open_kwargs['chunks'] = _auto_chunks(first)
+        first = first.chunk(open_kwargs['chunks'])
+    else:
+        first = xr.open_dataset(paths[0], **open_kwargs)
+    signature = _grid_signature(first)
+    options = dict(
+        decode_times=decode_times,
+        calculate_diagnostic_variables=calculate_diagnostic_variables,
+        drop_diagnostic_variable_components=drop_diagnostic_variable_components,
+        moving_nest=moving_nest,
+    )
+    # The center of a moving nest changes between files, so all files are located on the grid of
+    # the first file (which also lets them share its plan)
+    nest_center = {
+        attr: first.attrs[attr]
+        for attr in ('CEN_LAT', 'CEN_LON')
+        if moving_nest and attr in first.attrs
+    }
+    # Files of the same run share their schema, so the postprocessing plan (and with it, the grid
+    # and CRS) is only built once from the first file
+    plan = PostprocessPlan.from_dataset(first, **options)
+
+    def _open_and_postprocess(path: str) -> xr.Dataset:
+        lock = _netcdf4_lock if engine == 'netcdf4' else contextlib.nullcontext()
+        with lock:
+            ds = xr.open_dataset(path, **open_kwargs)
+        ds = ds.assign_attrs(nest_center)
+        if _grid_signature(ds) != signature:
+            ds.close()
+            raise ValueError(
+                f'Grid of {path} does not match the grid of {paths[0]}. Only files from the '
+                'same domain can be combined.'
+            )
+        # The schema is only computed once per file, to pick the plan
+        schema = _dataset_schema(ds)
+        this_plan = (
+            plan if schema == plan.schema else PostprocessPlan._from_schema(schema, **options)
+        )
+        return this_plan._apply(ds)
+
+    datasets = [plan._apply(first)]
+    errors = []
+    if parallel and len(paths) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Each file runs in a copy of the current context (e.g. to profile it)
+            futures = [
+                executor.submit(contextvars.copy_context().run, _open_and_postprocess, path)
+                for path in paths[1:]
+            ]
+        for future in futures:
+            if future.exception() is None:
+                datasets.append(future.result())
+            else:
+                errors.append(future.exception())
+    else:
+        for path in paths[1:]:
+            try:
+                datasets.append(_open_and_postprocess(path))
+            except Exception as exc:
+                errors.append(exc)
+                break
+    if errors:
+        for ds in datasets:
+            ds.close()
+        raise errors[0]
+
+    combined = xr.combine_nested(
+        datasets,
+        concat_dim='Time',
+        data_vars='minimal',
+        coords='minimal',
+        compat='override',
+        join='override',
+        combine_attrs='override',
+    )
+
+    def _close():
+        for ds in datasets:
+            ds.close()
+
+    combined.set_close(_close)
+    return combined
+
+
+def _translate_file(
+    path: str, storage_options: Mapping[str, Any], inline_threshold: int
+) -> dict[str, Any]:
+    """Scan the chunk layout of a netCDF file into (version 0) Zarr references."""
+    import fsspec
+
+    with fsspec.open(path, 'rb', **storage_options) as f:
+        classic = f.read(3) == b'CDF'
+    if classic:
+        from kerchunk.netCDF3 import NetCDF3ToZarr
+
+        translated = NetCDF3ToZarr(
+            path, storage_options=dict(storage_options), inline_threshold=inline_threshold
+        ).translate()
+    else:
+        from kerchunk.hdf import SingleHdf5ToZarr
+
+        with fsspec.open(path, 'rb', **storage_options) as f:
+            translated = SingleHdf5ToZarr(f, path, inline_threshold=inline_threshold).translate()
+    return translated.get('refs', translated)
+
+
+def _load_reference(value: str | bytes | dict) -> dict:
+    return value if isinstance(value, dict) else json.loads(value)
+
+
+def _reference_arrays(refs: Mapping[str, Any]) -> dict[str, tuple[dict, dict]]:
+    """Get the Zarr metadata and attributes of all arrays in references."""
+    return {
+        key[: -len('/.zarray')]: (
+            _load_reference(value),
+            _load_reference(refs.get(key[: -len('.zarray')] + '.zattrs', '{}')),
+        )
+        for key, value in refs.items()
+        if key.endswith('/.zarray')
+    }
+
+
+def _reference_grid_signature(refs: Mapping[str, Any]) -> tuple:
+    """Get the grid signature (see ``_grid_signature``) of the dataset described by references."""
+    attrs = _load_reference(refs.get('.zattrs', '{}'))
+    sizes = {}
+    for meta, array_attrs in _reference_arrays(refs).values():
+        sizes.update(zip(array_attrs.get('_ARRAY_DIMENSIONS', ()), meta['shape']))
+    return tuple(_hashable_attr(attrs[attr]) if attr in attrs else None for attr in grid_attrs) + (
+        sizes.get('west_east'),
+        sizes.get('south_north'),
+    )
+
+
+def _combine_references(
+    references: list[Mapping[str, Any]],
+    paths: list[str],
+    dim: str = 'Time',
+    drop_variables: Iterable[str] = (),
+) -> dict[str, Any]:
+    """
+    Concatenate the Zarr references of several files along dim.
+
+    Chunk keys of variables on dim are shifted by the number of chunks in the preceding files,
+    which requires that these files fill whole chunks along dim. Variables without dim, and the
+    attributes, are taken from the first file.
+    """
+    drop_variables = set(drop_variables)
+    arrays = [_reference_arrays(refs) for refs in references]
+    signature = _reference_grid_signature(references[0])
+    concatenated = {
+        name: meta['chunks'][attrs['_ARRAY_DIMENSIONS'].index(dim)]
+        for name, (meta, attrs) in arrays[0].items()
+        if dim in attrs.get('_ARRAY_DIMENSIONS', ()) and name not in drop_variables
+    }
+
+    combined = {}
+    for key, value in references[0].items():
+        name = key.partition('/')[0]
+        if name not in drop_variables and name not in concatenated:
+            combined[key] = value
+    offsets = dict.fromkeys(concatenated, 0)
+    for refs, file_arrays, path in zip(references, arrays, paths):
+        if _reference_grid_signature(refs) != signature:
+            raise ValueError(
+                f'Grid of {path} does not match the grid of {paths[0]}. Only files from the '
+                'same domain can be combined.'
+            )
+        for name, chunk in concatenated.items():
+            if name not in file_arrays:
+                raise ValueError(f'{name} is missing from {path}')
+            meta, attrs = file_arrays[name]
+            first_meta, first_attrs = arrays[0][name]
+            axis = attrs['_ARRAY_DIMENSIONS'].index(dim)
+            if offsets[name] % chunk or meta['chunks'] != first_meta['chunks']:
+                raise ValueError(
+                    f'Chunks of {name} in {path} do not line up with the preceding files along '
+                    f'{dim}, so its references cannot be concatenated.'
+                )
+            if attrs.get('units') != first_attrs.get('units'):
+                raise ValueError(
+                    f'Units of {name} differ between {paths[0]} ({first_attrs.get("units")}) '
+                    f'and {path} ({attrs.get("units")}). Pass drop_variables=[{name!r}] to '
+                    'leave it out.'
+                )
+            separator = meta.get('dimension_separator', '.')
+            shift = offsets[name] // chunk
+            for key, value in refs.items():
+                var_name, _, chunk_key = key.partition('/')
+                if var_name != name or chunk_key.startswith('.'):
+                    continue
+                indices = chunk_key.split(separator)
+                indices[axis] = str(int(indices[axis]) + shift)
+                combined[f'{name}/{separator.join(indices)}'] = value
+            offsets[name] += meta['shape'][axis]
+
+    for name, size in offsets.items():
+        meta, attrs = arrays[0][name]
+        axis = attrs['_ARRAY_DIMENSIONS'].index(dim)
+        meta = dict(meta, shape=meta['shape'][:axis] + [size] + meta['shape'][axis + 1 :])
+        combined[f'{name}/.zarray'] = json.dumps(meta)
+        combined[f'{name}/.zattrs'] = json.dumps(attrs)
+    return {'version': 1, 'refs': combined}
+
+
+def build_reference_index(
+    paths: str | os.PathLike | Iterable[str | os.PathLike],
+    out: str | os.PathLike | None = 'refs.json',
+    *,
+    parallel: bool = True,
+    max_workers: int | None = None,
+    drop_variables: Iterable[str] = (),
+    inline_threshold: int = 500,
+    storage_options: Mapping[str, Any] | None = None,
+) -> dict[str, Any]:
+    """
+    Index the chunks of multiple WRF files into a single set of references concatenated along
+    ``Time``.
+
+    The chunk layout (byte ranges) of every file is scanned once with `kerchunk
+    <https://fsspec.github.io/kerchunk/>`_, for netCDF4/HDF5 as well as classic netCDF files.
+    The combined references can then be opened with :py:func:`open_reference` without reading
+    the metadata of each file again. As in :py:func:`open_mfdataset`, all files must share
+    the projection attributes and grid size of the first file, and variables without a ``Time``
+    dimension and attributes are taken from the first file.
+
+    Parameters
+    ----------
+    paths : str, path-like or iterable of path-like
+        Glob string (e.g. ``"wrfout_d01_*"``) or explicit list of files to index, in time order.
+        Local paths are stored as absolute paths.
+    out : str or path-like, optional
+        JSON file to write the references to. Defaults to ``'refs.json'``. If None, the
+        references are only returned.
+    parallel : bool, optional
+        Scan the files concurrently. Defaults to True.
+    max_workers : int, optional
+        Maximum number of threads used if ``parallel``.
+    drop_variables : iterable of str, optional
+        Variables to leave out, e.g. ``['XTIME']`` if its units differ between files.
+    inline_threshold : int, optional
+        Chunks smaller than this number of bytes (such as those of ``Times``) are stored in the
+        references themselves. Defaults to 500.
+    storage_options : dict, optional
+        Options passed to :py:func:`fsspec.open` for reading the files.
+
+    Returns
+    -------
+    dict
+        The combined references (in version 1 of the kerchunk format).
+    """
+    try:
+        import kerchunk  # noqa: F401
+    except ImportError as e:
+        raise ImportError(
+            'build_reference_index depends on kerchunk to scan the chunks of the files.'
+            ' To proceed please install kerchunk using:'
+            ' `python -m pip install kerchunk` or `conda install -c conda-forge kerchunk`.'
+        ) from e
+
+    paths = [path if '://' in path else os.path.abspath(path) for path in _expand_paths(paths)]
+    storage_options = dict(storage_options or {})
+    if parallel and len(paths) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            references = list(
+                executor.map(
+                    lambda path: _translate_file(path, storage_options, inline_threshold), paths
+                )
+            )
+    else:
+        references = [_translate_file(path, storage_options, inline_threshold) for path in paths]
+
+    combined = _combine_references(references, paths, drop_variables=drop_variables)
+    if out is not None:
+        with open(out, 'w') as f:
+            json.dump(combined, f)
+    return combined
+
+
+def open_reference(
+    refs: str | os.PathLike | Mapping[str, Any],
+    *,
+    chunks: int | dict | str | None = None,
+    decode_times: bool = True,
+    calculate_diagnostic_variables: bool = True,
+    drop_diagnostic_variable_components: bool = True,
+    storage_options: Mapping[str, Any] | None = None,
+    **kwargs,
+) -> xr.Dataset:
+    """
+    Open and postprocess WRF files indexed by :py:func:`build_reference_index`.
+
+    Only the references are read when opening, and data is read lazily (directly from the
+    original files) when computing.
+
+    Parameters
+    ----------
+    refs : str, path-like or dict
+        JSON file written by :py:func:`build_reference_index`, or the references it returned.
+    chunks : int, dict or str, optional
+        Chunk sizes passed to :py:func:`xarray.open_dataset`. ``'xwrf-auto'`` uses the chunks
+        suggested by :py:func:`suggest_chunks` (with the ``auto_chunks`` options of
+        :py:data:`xwrf.config`). Defaults to the chunks of the files.
+    decode_times, calculate_diagnostic_variables, drop_diagnostic_variable_components : bool
+        Postprocessing options, see :py:meth:`xarray.Dataset.xwrf.postprocess`.
+    storage_options : dict, optional
+        Options for reading the original files (e.g. credentials for remote storage).
+    **kwargs : dict, optional
+        Additional keyword arguments passed through to :py:func:`xarray.open_dataset`.
+
+    Returns
+    -------
+    xarray.Dataset
+        The postprocessed dataset.
+    """
+    import fsspec
+
+    if isinstance(refs, (str, os.PathLike)):
+        refs = os.fspath(refs)
+    fs = fsspec.filesystem(
+        'reference', fo=refs, remote_options=dict(storage_options or {}), skip_instance_cache=True
+    )
+    ds = xr.open_dataset(
+        fs.get_mapper(''),
+        engine='zarr',
+        consolidated=False,
+        chunks=None if chunks == 'xwrf-auto' else {} if chunks is None else chunks,
+        **kwargs,
+    )
+    if chunks == 'xwrf-auto':
+        ds = ds.chunk(_auto_chunks(ds))
+    plan = PostprocessPlan.from_dataset(
+        ds,
+        decode_times=decode_times,
+        calculate_diagnostic_variables=calculate_diagnostic_variables,
+        drop_diagnostic_variable_components=drop_diagnostic_variable_components,
+    )
+    return plan._apply(ds)
+
+
+def _iter_timesteps(
+    ds: xr.Dataset,
+    batch: int = 1,
+    prefetch: int = 2,
+    destagger: bool = False,
+    **options,
+) -> Iterator[xr.Dataset]:
+    """Postprocess and load ds batch by batch along Time, see ``Dataset.xwrf.iter_timesteps``."""
+    if batch < 1:
+        raise ValueError(f'batch must be a positive integer, not {batch}')
+    if prefetch < 0:
+        raise ValueError(f'prefetch must be a non-negative integer, not {prefetch}')
+    if 'Time' not in ds.dims:
+        raise ValueError('The dataset has no Time dimension to iterate over')
+
+    # The plan (and with it the grid, CRS and attribute updates) is shared by all batches
+    plan = PostprocessPlan.from_dataset(ds, **options)
+    static_coords, static_data_vars = {}, {}
+
+    def _load(start: int) -> xr.Dataset:
+        # Batches of ds share its schema, so it is not checked again
+        result = plan._apply(ds.isel(Time=slice(start, start + batch)))
+        if destagger:
+            result = result.xwrf.destagger()
+        if static_coords or static_data_vars:
+            # Time-independent variables (e.g. collapsed coordinates) are only loaded once
+            result = result.assign_coords(static_coords).assign(static_data_vars)
+            return result.load()
+        result = result.load()
+        for name, var in result.variables.items():
+            if 'Time' not in var.dims and name not in result.indexes:
+                static = static_coords if name in result.coords else static_data_vars
+                static[name] = var
+        return result
+
+    return _prefetched(_load, range(0, ds.sizes['Time'], batch), prefetch)
+
+
+def _prefetched(load: Callable, args: Iterable, prefetch: int) -> Iterator:
+    """Yield load(arg) for all args, loading in order on a background thread, prefetch ahead."""
+    if prefetch == 0:
+        for arg in args:
+            yield load(arg)
+        return
+    executor = ThreadPoolExecutor(max_workers=1)
+    pending = deque()
+    try:
+        for arg in args:
+            pending.append(executor.submit(contextvars.copy_context().run, load, arg))
+            if len(pending) > prefetch:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Stop reading ahead if the iteration is abandoned
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _parse_bytes(value: int | str) -> int:
+    """Parse a number of bytes given as an integer or a string such as ``'100MB'``."""
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    match = re.fullmatch(r'\s*([\d.]+)\s*([a-zA-Z]*)\s*', value)
+    if match is None or match.group(2).lower() not in _byte_units:
+        raise ValueError(f'Invalid number of bytes: {value!r}')
+    return int(float(match.group(1)) * _byte_units[match.group(2).lower()])
+
+
+def _access_chunks(
+    sizes: Mapping[Hashable, int], itemsize: int, target: int, access: str = 'map'
+) -> dict[Hashable, int]:
+    """
+    Get chunk sizes close to a target number of bytes for a given access pattern.
+
+    For ``'map'`` access, chunks span whole horizontal slices (tiled if these exceed the
+    target), and then grow along vertical and other dimensions. For ``'timeseries'`` access,
+    chunks span the whole time (and other non-spatial) dimensions, then vertical dimensions, and
+    are then tiled horizontally. Staggered dimensions get the same chunk sizes as their
+    unstaggered counterparts (and their extra point if not tiled).
+    """
+    if access not in ('map', 'timeseries'):
+        raise ValueError(f"access must be 'map' or 'timeseries', not {access!r}")
+    # Chunk staggered dimensions like their unstaggered counterpart
+    unstaggered = {
+        dim: size - 1 if str(dim).endswith('_stag') else size for dim, size in sizes.items()
+    }
+    horizontal = [dim for dim in sizes if dim in _horizontal_dims]
+    vertical = [dim for dim in sizes if dim in _vertical_dims]
+    other = [dim for dim in sizes if dim not in horizontal and dim not in vertical]
+    groups = [horizontal, vertical, other] if access == 'map' else [other, vertical, horizontal]
+
+    chunks = dict.fromkeys(sizes, 1)
+    budget = max(target // itemsize, 1)
+    for group in groups:
+        group_size = math.prod(unstaggered[dim] for dim in group)
+        if group_size <= budget:
+            chunks.update({dim: sizes[dim] for dim in group})
+            budget //= max(group_size, 1)
+            continue
+        # Split the group evenly (e.g., in square horizontal tiles), smallest dimensions first
+        for i, dim in enumerate(sorted(group, key=unstaggered.get)):
+            chunk = max(1, min(unstaggered[dim], int(budget ** (1 / (len(group) - i)))))
+            chunks[dim] = sizes[dim] if chunk == unstaggered[dim] else chunk
+            budget //= chunk
+        break
+    return chunks
+
+
+class ChunkSuggestion(NamedTuple):
+    """Chunk sizes suggested by :py:func:`suggest_chunks`, and what they result in."""
+
+    chunks: dict[Hashable, int | tuple[int, ...]]
+    tasks: int
+    chunk_bytes: int
+
+
+def _stagger_pairs(sizes: Mapping[Hashable, int]) -> dict[Hashable, Hashable]:
+    """Map the staggered dimensions with an unstaggered counterpart (one shorter) to it."""
+    return {
+        dim: dim[: -len('_stag')]
+        for dim, size in sizes.items()
+        if isinstance(dim, str)
+        and dim.endswith('_stag')
+        and sizes.get(dim[: -len('_stag')]) == size - 1
+    }
+
+
+def _native_chunks(ds: xr.Dataset, pairs: Mapping[Hashable, Hashable]) -> dict[Hashable, int]:
+    """
+    Get the chunk sizes which are multiples of the native (on-disk) chunks of all variables along
+    each unstaggered dimension.
+    """
+    native = {}
+    for var in ds.variables.values():
+        preferred = var.encoding.get('preferred_chunks') or {}
+        if not preferred and var.encoding.get('chunks'):
+            preferred = dict(zip(var.dims, var.encoding['chunks']))
+        for dim, chunk in preferred.items():
+            size = ds.sizes[dim]
+            if dim in pairs:
+                # A staggered dimension stored whole means its counterpart can be read whole
+                dim, chunk = pairs[dim], chunk if chunk < size else size - 1
+            native[dim] = min(math.lcm(native.get(dim, 1), chunk), ds.sizes[dim])
+    return native
+
+
+def _stagger_chunks(chunk: int, size: int) -> tuple[tuple[int, ...], tuple[int, ...]]:
+    """Split a dimension and its staggered counterpart (one longer) at the same boundaries."""
+    chunks = (chunk,) * (size // chunk) + ((size % chunk,) if size % chunk else ())
+    return chunks, chunks[:-1] + (chunks[-1] + 1,)
+
+
+def suggest_chunks(
+    ds_or_path: xr.Dataset | str | os.PathLike,
+    memory_target: int | str = '128MB',
+    access: str = 'map',
+    *,
+    engine: str = 'netcdf4',
+) -> ChunkSuggestion:
+    """
+    Suggest Dask chunk sizes for reading a (raw or postprocessed) WRF dataset.
+
+    Chunks are sized for the largest variable, close to the memory target and shaped for the
+    access pattern (see ``access``). They are rounded to multiples of the native chunks of the
+    files, so that each of these is read (and decompressed) only once. Staggered dimensions are
+    split at the same boundaries as their unstaggered counterparts, the extra point going to the
+    last chunk, so that destaggering, wind rotation and diagnostics need no rechunking.
+
+    Parameters
+    ----------
+    ds_or_path : xarray.Dataset, str or path-like
+        Dataset, or file (glob strings match the first file) to read the dimensions and native
+        chunks of.
+    memory_target : int or str, optional
+        Target size of the chunks of the largest variable, in bytes or as a string such as
+        ``'128MB'``. Defaults to ``'128MB'``.
+    access : {'map', 'timeseries'}, optional
+        Expected access pattern. ``'map'`` (the default) keeps horizontal slices whole, while
+        ``'timeseries'`` keeps the time series of each grid point in a single chunk.
+    engine : str, optional
+        Name of the backend engine used to read a file. Defaults to ``'netcdf4'``.
+
+    Returns
+    -------
+    ChunkSuggestion
+        The chunks (for the ``chunks`` argument of :py:func:`xarray.open_dataset` or
+        :py:meth:`xarray.Dataset.chunk`), the number of chunks of all variables (i.e. of Dask
+        tasks to load the dataset), and the size of the largest chunk in bytes.
+
+    Examples
+    --------
+    >>> suggestion = xwrf.suggest_chunks('wrfout_d01_2099-10-01_00:00:00', access='timeseries')
+    >>> ds = xr.open_dataset('wrfout_d01_2099-10-01_00:00:00', chunks=suggestion.chunks)
+    """
+    target = _parse_bytes(memory_target)
+    if not isinstance(ds_or_path, xr.Dataset):
+        with xr.open_dataset(_expand_paths(ds_or_path)[0], engine=engine, chunks=None) as ds:
+            return suggest_chunks(ds, target, access)
+    ds = ds_or_path
+    sizes = dict(ds.sizes)
+    pairs = _stagger_pairs(sizes)
+    native = _native_chunks(ds, pairs)
+
+    # Chunks are sized for the largest variable, on its unstaggered dimensions
+    largest = max(
+        (var for var in ds.data_vars.values() if var.ndim),
+        key=lambda var: var.size * var.dtype.itemsize,
+        default=None,
+    )
+    unstaggered = {}
+    if largest is not None:
+        unstaggered = {pairs.get(dim, dim): sizes[pairs.get(dim, dim)] for dim in largest.dims}
+        unstaggered = _access_chunks(unstaggered, largest.dtype.itemsize, target, access)
+
+    chunks = {}
+    for dim, size in sizes.items():
+        if dim in pairs:
+            continue
+        chunk = unstaggered.get(dim, size)
+        if dim in native:
+            # Round down to a multiple of the native chunks, reading at least one of these
+            chunk = max(chunk // native[dim] * native[dim], native[dim])
+        if chunk >= size:
+            chunks[dim] = size
+        elif dim in pairs.values():
+            stag_dim = next(stag_dim for stag_dim, name in pairs.items() if name == dim)
+            chunks[dim], chunks[stag_dim] = _stagger_chunks(chunk, size)
+        else:
+            chunks[dim] = chunk
+    for stag_dim, dim in pairs.items():
+        chunks.setdefault(stag_dim, sizes[stag_dim])
+
+    tasks = chunk_bytes = 0
+    for name, var in ds.variables.items():
+        if name in ds.indexes or not var.ndim:
+            continue
+        counts = [
+            len(chunks[dim]) if isinstance(chunks[dim], tuple) else -(-sizes[dim] // chunks[dim])
+            for dim in var.dims
+        ]
+        largest_chunk = [
+            max(chunks[dim]) if isinstance(chunks[dim], tuple) else chunks[dim] for dim in var.dims
+        ]
+        tasks += math.prod(counts)
+        chunk_bytes = max(chunk_bytes, math.prod(largest_chunk) * var.dtype.itemsize)
+    return ChunkSuggestion(
+        chunks={dim: chunks[dim] for dim in sizes}, tasks=tasks, chunk_bytes=chunk_bytes
+    )
+
+
+def _auto_chunks(ds: xr.Dataset) -> dict[Hashable, int | tuple[int, ...]]:
+    """Get the chunks of ``chunks='xwrf-auto'``, using the ``auto_chunks`` configuration."""
+    suggestion = suggest_chunks(
+        ds,
+        config.get('auto_chunks.memory_target', '128MB'),
+        config.get('auto_chunks.access', 'map'),
+    )
+    return suggestion.chunks
+
+
+def _prepare_zarr_dataset(
+    ds: xr.Dataset,
+    chunk_target: int | str = '100MB',
+    access: str = 'map',
+    compressor_encoding: Mapping[str, Any] | None = None,
+) -> xr.Dataset:
+    """Get a copy of ds with serializable CRS, Zarr encodings and (if dask is used) chunks."""
+    target = _parse_bytes(chunk_target)
+    try:
+        import dask  # noqa: F401
+    except ImportError:
+        has_dask = False
+    else:
+        has_dask = True
+
+    variables = {}
+    for name, var in ds.variables.items():
+        var = var.copy(deep=False)
+        if var.dtype == object and var.ndim == 0 and isinstance(var.values.item(), pyproj.CRS):
+            # The CRS object cannot be serialized, but its CF attributes describe it in full
+            var = xr.Variable((), np.int32(0), attrs=var.attrs or var.values.item().to_cf())
+        encoding = {key: value for key, value in var.encoding.items() if key in _zarr_encodings}
+        if 'dtype' in encoding and not {'scale_factor', 'add_offset', 'units'}.intersection(
+            encoding
+        ):
+            if np.dtype(encoding['dtype']) != var.dtype:
+                # e.g. integer data destaggered to floats, or netCDF character arrays
+                del encoding['dtype']
+        if var.ndim:
+            chunks = _access_chunks(var.sizes, var.dtype.itemsize, target, access)
+            encoding['chunks'] = tuple(chunks[dim] for dim in var.dims)
+            if has_dask and not isinstance(var, xr.IndexVariable):
+                # Write chunk by chunk, with dask chunks matching the Zarr chunks
+                var = var.chunk(chunks)
+            if compressor_encoding is not None:
+                encoding.update(compressor_encoding)
+        var.encoding = encoding
+        variables[name] = var
+    result = xr.Dataset(attrs=ds.attrs)
+    result = result.assign_coords({name: variables[name] for name in ds.coords})
+    return result.assign({name: variables[name] for name in ds.data_vars})
+
+
+def _compressor_encoding(compressor: Any, zarr_format: int | None = None) -> dict[str, Any]:
+    """Get the encoding setting compressor, for the Zarr format being written."""
+    import zarr
+
+    if zarr_format is None:
+        zarr_format = 3 if int(zarr.__version__.split('.')[0]) >= 3 else 2
+    if zarr_format == 2:
+        return {'compressor': compressor}
+    return {'compressors': compressor if isinstance(compressor, (list, tuple)) else (compressor,)}
+
+
+def _to_zarr(
+    ds: xr.Dataset,
+    store: MutableMapping | str | os.PathLike,
+    chunk_target: int | str = '100MB',
+    access: str = 'map',
+    compressor: Any = None,
+    consolidated: bool = True,
+    **kwargs,
+):
+    """Write a (postprocessed) WRF dataset to Zarr, see ``Dataset.xwrf.to_zarr``."""
+    compressor_encoding = (
+        None
+        if compressor is None
+        else _compressor_encoding(compressor, zarr_format=kwargs.get('zarr_format'))
+    )
+    prepared = _prepare_zarr_dataset(
+        ds, chunk_target=chunk_target, access=access, compressor_encoding=compressor_encoding
+    )
+    return prepared.to_zarr(store, consolidated=consolidated, **kwargs)
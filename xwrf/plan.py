@@ -0,0 +1,287 @@
+"""Provide reusable postprocessing plans for WRF datasets sharing a schema."""
+
+from __future__ import annotations  # noqa: F401
+
+import functools
+import json
+import warnings
+from typing import Hashable
+
+import xarray as xr
+
+from .config import config
+from .grid import _attr_value, _grid_signature, _hashable_attr, _wrf_grid_from_signature
+from .postprocess import (
+    _calc_base_diagnostics,
+    _decoded_time_values,
+    _hybrid_opt_condition,
+    _is_moving_domain,
+    _moving_nest_coords,
+    _time_dependent_coords,
+    _wrf_units_map,
+)
+from .profiling import _profiled
+
+# Configuration options read when building a plan, whose values are part of the key of cached plans
+# (so that plans follow changes of the configuration, as postprocess does)
+_plan_config_keys = (
+    'cf_attribute_map',
+    'conditional_cf_attribute_map',
+    'unit_harmonization_map',
+    'latitude_coords',
+    'longitude_coords',
+    'vertical_coords',
+    'assign_coord_to_dim_map',
+    'rename_dim_map',
+    'horizontal_dims',
+)
+
+
+def _dataset_schema(ds: xr.Dataset) -> tuple:
+    """Get the hashable schema (metadata relevant to postprocessing) of a dataset."""
+    variables = tuple(
+        (
+            name,
+            var.dims,
+            var.dtype.str,
+            None if 'units' not in var.attrs else _hashable_attr(var.attrs['units']),
+            name in ds.coords,
+        )
+        for name, var in ds.variables.items()
+    )
+    hybrid_opt = (
+        _attr_value(_hashable_attr(ds.attrs['HYBRID_OPT'])) if 'HYBRID_OPT' in ds.attrs else 0
+    )
+    return variables, _grid_signature(ds), hybrid_opt
+
+
+def _config_key() -> str:
+    """Get a hashable snapshot of the configuration options read when building a plan."""
+    return json.dumps(
+        [config.get(key, None) for key in _plan_config_keys], sort_keys=True, default=str
+    )
+
+
+class PostprocessPlan:
+    """
+    Postprocessing steps precomputed from the configuration and the schema of a dataset.
+
+    A plan is built once from the metadata of a dataset (variable names, dimensions, units and
+    projection attributes), and can then be applied to any dataset with the same schema (such as
+    other output files of the same run). It makes all attribute, renaming and coordinate changes
+    while building a single shallow copy of the dataset.
+    :py:meth:`xarray.Dataset.xwrf.postprocess` applies the (cached) plan of the dataset.
+
+    Parameters
+    ----------
+    schema : tuple
+        Schema of the datasets the plan applies to. Use :py:meth:`PostprocessPlan.from_dataset`
+        to build a plan (or get a cached one) for a given dataset.
+    decode_times, calculate_diagnostic_variables, drop_diagnostic_variable_components, check_static_domain, moving_nest : bool, optional
+        Postprocessing options, see :py:meth:`xarray.Dataset.xwrf.postprocess`.
+    """
+
+    def __init__(
+        self,
+        schema: tuple,
+        decode_times: bool = True,
+        calculate_diagnostic_variables: bool = True,
+        drop_diagnostic_variable_components: bool = True,
+        check_static_domain: bool = False,
+        moving_nest: bool = False,
+    ):
+        self.schema = schema
+        self.decode_times = decode_times
+        self.calculate_diagnostic_variables = calculate_diagnostic_variables
+        self.drop_diagnostic_variable_components = drop_diagnostic_variable_components
+        self.check_static_domain = check_static_domain
+        self.moving_nest = moving_nest
+
+        variables, grid_signature, hybrid_opt = schema
+        data_vars = {name for name, _, _, _, is_coord in variables if not is_coord}
+        dims = {name: var_dims for name, var_dims, _, _, _ in variables}
+
+        # Attribute updates, following _modify_attrs_to_cf and then _make_units_pint_friendly
+        cf_attribute_map = config.get('cf_attribute_map')
+        conditional_cf_attribute_map = config.get(
+            f'conditional_cf_attribute_map.{_hybrid_opt_condition(hybrid_opt)}'
+        )
+        wrf_units_map = _wrf_units_map()
+        self._attr_updates = {}
+        self._drop_units = set()
+        for name, _, _, units, _ in variables:
+            if name not in data_vars:
+                continue
+            updates = {
+                **cf_attribute_map.get(name, {}),
+                **conditional_cf_attribute_map.get(name, {}),
+            }
+            units = updates.get('units', units)
+            if units in wrf_units_map:
+                if wrf_units_map[units] == 'invalid':
+                    updates.pop('units', None)
+                    self._drop_units.add(name)
+                else:
+                    updates['units'] = wrf_units_map[units]
+            if updates:
+                self._attr_updates[name] = updates
+
+        # Coordinates, following _collapse_time_dim and _assign_coord_to_dim_of_different_name
+        lat_lon_coords, vertical_coords = _time_dependent_coords()
+        self._coords = {name for name, _, _, _, is_coord in variables if is_coord}.union(
+            lat_lon_coords.union(vertical_coords).intersection(dims)
+        )
+        self._lat_lon_collapse = {name for name in lat_lon_coords if len(dims.get(name, ())) == 3}
+        self._vertical_collapse = {name for name in vertical_coords if len(dims.get(name, ())) == 2}
+        self._coord_to_dim = {
+            varname: dim
+            for varname, dim in config.get('assign_coord_to_dim_map').items()
+            if varname in dims
+        }
+
+        # Dimension renaming, following _rename_dims
+        all_dims = {dim for var_dims in dims.values() for dim in var_dims}
+        self._rename = {k: v for k, v in config.get('rename_dim_map').items() if k in all_dims}
+
+        # Projection coordinates, following _include_projection_coordinates
+        try:
+            self._grid = _wrf_grid_from_signature(grid_signature)
+        except KeyError:
+            self._grid = None
+        self._horizontal_dims = set(config.get('horizontal_dims')).intersection(all_dims)
+
+    @classmethod
+    def from_dataset(cls, ds: xr.Dataset, **options) -> PostprocessPlan:
+        """
+        Get the (cached) plan for postprocessing datasets with the same schema as ds (and the
+        current configuration).
+
+        Parameters
+        ----------
+        ds : xarray.Dataset
+            Raw WRF dataset. Only its metadata is used.
+        **options : bool, optional
+            Postprocessing options, see :py:meth:`xarray.Dataset.xwrf.postprocess`.
+
+        Returns
+        -------
+        PostprocessPlan
+            Plan for datasets with the same schema as ds.
+        """
+        return cls._from_schema(_dataset_schema(ds), **options)
+
+    @classmethod
+    def _from_schema(cls, schema: tuple, **options) -> PostprocessPlan:
+        return _cached_plan(schema, tuple(sorted(options.items())), _config_key())
+
+    def matches(self, ds: xr.Dataset) -> bool:
+        """Check if the plan applies to a dataset, i.e., if it has the same schema."""
+        return _dataset_schema(ds) == self.schema
+
+    def _renamed(self, name: Hashable) -> Hashable:
+        return self._rename.get(name, name)
+
+    def apply(self, ds: xr.Dataset) -> xr.Dataset:
+        """
+        Postprocess a dataset with the same schema as the plan.
+
+        Parameters
+        ----------
+        ds : xarray.Dataset
+            Raw WRF dataset. It is not modified.
+
+        Returns
+        -------
+        xarray.Dataset
+            The postprocessed dataset.
+        """
+        if not self.matches(ds):
+            raise ValueError('The schema of the dataset does not match the plan.')
+        return self._apply(ds)
+
+    def _apply(self, ds: xr.Dataset) -> xr.Dataset:
+        """Postprocess a dataset already known to have the schema of the plan."""
+        result = ds.pipe(_profiled, self._restructure)
+        if self.calculate_diagnostic_variables:
+            result = result.pipe(
+                _profiled, _calc_base_diagnostics, drop=self.drop_diagnostic_variable_components
+            )
+        return result.pipe(_profiled, self._include_projection_coordinates)
+
+    def _restructure(self, ds: xr.Dataset) -> xr.Dataset:
+        """Make all attribute, renaming, coordinate and time changes in a single shallow copy."""
+        collapse = self._vertical_collapse
+        # The horizontal coordinates of moving nests keep their time dimension
+        static = not self.moving_nest
+        if static and self.check_static_domain and _is_moving_domain(ds):
+            warnings.warn(
+                'Horizontal coordinates change over time (moving nest), so their time dimension '
+                'is not collapsed.'
+            )
+            static = False
+        if static:
+            collapse = collapse.union(self._lat_lon_collapse)
+
+        data_vars, coords = {}, {}
+        for name, var in ds.variables.items():
+            # Indexing the Variable (rather than its data) keeps lazily loaded data lazy
+            new_var = var[0] if name in collapse else var.to_base_variable()
+            new_var.attrs = {**var.attrs, **self._attr_updates.get(name, {})}
+            if name in self._drop_units:
+                new_var.attrs.pop('units', None)
+            new_var.dims = tuple(self._renamed(dim) for dim in new_var.dims)
+            if name in self._coord_to_dim:
+                coords[self._renamed(self._coord_to_dim[name])] = new_var
+            elif name in self._coords:
+                coords[self._renamed(name)] = new_var
+            else:
+                data_vars[self._renamed(name)] = new_var
+        if self.decode_times:
+            coords['Time'] = xr.Variable(
+                'Time',
+                _decoded_time_values(ds),
+                attrs={'long_name': 'Time', 'standard_name': 'time'},
+            )
+        result = xr.Dataset(data_vars, coords, ds.attrs)
+        result.set_close(ds.close)
+        return result
+
+    def _include_projection_coordinates(self, result: xr.Dataset) -> xr.Dataset:
+        """Add the (cached) projection coordinates (or moving nest coordinates) and CRS."""
+        if self._grid is None:
+            warnings.warn(
+                'Unable to create coordinate values and CRS due to insufficient dimensions or '
+                'projection metadata.'
+            )
+            return result
+        horizontal_dims = {self._renamed(dim): dim for dim in self._horizontal_dims}
+        moving_coords = None
+        if self.moving_nest:
+            moving_coords = _moving_nest_coords(result, self.schema[1])
+            if moving_coords is None:
+                warnings.warn(
+                    'Unable to locate the moving nest without XLAT and XLONG, so its projection '
+                    'coordinates are those of its position in the global attributes.'
+                )
+        if moving_coords is not None:
+            result = result.assign_coords(moving_coords)
+        else:
+            for dim, wrf_dim in horizontal_dims.items():
+                result[dim] = (
+                    dim,
+                    self._grid[wrf_dim],
+                    config.get(f'cf_attribute_map.{wrf_dim}'),
+                )
+        if self._grid['crs'] is not None:
+            result['wrf_projection'] = (tuple(), self._grid['crs'], self._grid['crs'].to_cf())
+            for varname in result.data_vars:
+                if any(dim in result[varname].dims for dim in horizontal_dims):
+                    result[varname].attrs['grid_mapping'] = 'wrf_projection'
+
+        return result
+
+
+@functools.lru_cache(maxsize=32)
+def _cached_plan(schema: tuple, options: tuple, config_key: str) -> PostprocessPlan:
+    # config_key only keys the cache, as the plan reads the configuration itself
+    return PostprocessPlan(schema, **dict(options))
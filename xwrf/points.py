@@ -0,0 +1,129 @@
+"""Provide the extraction of WRF fields at points given by their latitude and longitude."""
+
+from __future__ import annotations  # noqa: F401
+
+from typing import Hashable, Iterable
+
+import numpy as np
+import xarray as xr
+
+from .grid import _lonlat_transformer
+
+_y_dims = ('y', 'y_stag')
+_x_dims = ('x', 'x_stag')
+
+
+def _regular_index(coord: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Get the (fractional) position of values along a regular coordinate, NaN if outside."""
+    if coord.size == 1:
+        return np.where(values == coord[0], 0.0, np.nan)
+    position = (values - coord[0]) / (coord[1] - coord[0])
+    return np.where((position >= 0) & (position <= coord.size - 1), position, np.nan)
+
+
+def _points_array(values: float | Iterable[float] | xr.DataArray) -> xr.DataArray:
+    """Get latitudes or longitudes as a DataArray, along ``points`` (or 0-d for scalars)."""
+    if isinstance(values, xr.DataArray):
+        return values
+    values = np.asarray(values)
+    return xr.DataArray(values, dims=() if values.ndim == 0 else 'points')
+
+
+def _point_indexers(
+    fy: xr.DataArray, fx: xr.DataArray, y_dim: Hashable, x_dim: Hashable, ny: int, nx: int
+) -> tuple[dict[Hashable, xr.DataArray], xr.DataArray]:
+    """
+    Get the vectorized indexers of the corners of the grid cells containing points, and their
+    bilinear weights (NaN for points outside of the grid), along a new corner dimension.
+    """
+    iy = np.minimum(fy.fillna(0).astype(np.intp), max(ny - 2, 0))
+    ix = np.minimum(fx.fillna(0).astype(np.intp), max(nx - 2, 0))
+    ty, tx = fy - iy, fx - ix
+    corner = xr.DataArray([0, 1, 2, 3], dims='corner')
+    dy, dx = corner // 2, corner % 2
+    weight = xr.where(dy, ty, 1 - ty) * xr.where(dx, tx, 1 - tx)
+    return {y_dim: iy + dy, x_dim: ix + dx}, weight
+
+
+def _sel_points(
+    ds: xr.Dataset,
+    lat: float | Iterable[float] | xr.DataArray,
+    lon: float | Iterable[float] | xr.DataArray,
+    method: str = 'nearest',
+    variables: Hashable | Iterable[Hashable] | None = None,
+) -> xr.Dataset:
+    """Extract variables of a postprocessed dataset at points, see ``Dataset.xwrf.sel_points``."""
+    if method not in ('nearest', 'bilinear'):
+        raise ValueError(f"method must be 'nearest' or 'bilinear', not {method!r}")
+    if 'wrf_projection' not in ds:
+        raise ValueError(
+            'The dataset has no wrf_projection, select points in postprocessed datasets (and '
+            'check that their projection is supported)'
+        )
+    if any(dim in ds.dims and dim not in ds.indexes for dim in ('x', 'y', 'x_stag', 'y_stag')):
+        raise ValueError(
+            'The dataset has no x and y coordinates, as those of moving nests change over time '
+            '(to select points at a single time, assign its x_nest and y_nest coordinates to x '
+            'and y)'
+        )
+    lat, lon = xr.broadcast(_points_array(lat), _points_array(lon))
+    if variables is not None:
+        variables = [variables] if isinstance(variables, str) else list(variables)
+        ds = ds[variables + (['wrf_projection'] if 'wrf_projection' not in variables else [])]
+
+    # Points are projected once, and then located analytically on the regular projection grid
+    x, y = _lonlat_transformer(ds['wrf_projection'].item()).transform(lon.values, lat.values)
+    positions = {
+        dim: lat.copy(data=_regular_index(ds[dim].values, y if dim in _y_dims else x))
+        for dim in _y_dims + _x_dims
+        if dim in ds.dims
+    }
+
+    # Variables (and coordinates) are grouped by horizontal grid, and each group is indexed with
+    # a single vectorized indexing call
+    groups = {}
+    for name, datavar in ds.variables.items():
+        dims = tuple(dim for dim in _y_dims + _x_dims if dim in datavar.dims)
+        if name in positions:
+            continue
+        if len(dims) == 2:
+            groups.setdefault(dims, []).append(name)
+        elif dims:
+            raise ValueError(f'{name} {datavar.dims} is not on a two-dimensional horizontal grid')
+
+    all_vars = ds.reset_coords()
+    selected = [all_vars.drop_vars([name for names in groups.values() for name in names])]
+    for (y_dim, x_dim), names in groups.items():
+        fy, fx = positions[y_dim], positions[x_dim]
+        if method == 'nearest':
+            indexers = {
+                y_dim: np.rint(fy.fillna(0)).astype(np.intp),
+                x_dim: np.rint(fx.fillna(0)).astype(np.intp),
+            }
+            points = all_vars[names].isel(indexers).where(fy.notnull() & fx.notnull())
+        else:
+            indexers, weight = _point_indexers(
+                fy, fx, y_dim, x_dim, ds.sizes[y_dim], ds.sizes[x_dim]
+            )
+
+            def interpolate(datavar):
+                # Keep single precision data in single precision
+                w = weight.astype(datavar.dtype) if datavar.dtype.kind == 'f' else weight
+                return (datavar * w).sum('corner', skipna=False, keep_attrs=True)
+
+            points = all_vars[names].isel(indexers).map(interpolate, keep_attrs=True)
+        for datavar in points.data_vars.values():
+            datavar.attrs.pop('grid_mapping', None)
+        selected.append(points)
+
+    result = xr.merge(
+        [points.drop_vars(list(positions), errors='ignore') for points in selected],
+        compat='override',
+        join='exact',
+        combine_attrs='override',
+    )
+    result = result.set_coords([name for name in ds.coords if name in result])
+    result = result[[name for name in ds.data_vars if name in result.data_vars]]
+    result.coords['lat'] = lat.assign_attrs(standard_name='latitude', units='degrees_north')
+    result.coords['lon'] = lon.assign_attrs(standard_name='longitude', units='degrees_east')
+    return result
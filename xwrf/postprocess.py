@@ -1,28 +1,233 @@
 from __future__ import annotations  # noqa: F401
 
+import functools
 import warnings
+from typing import Callable
 
+import numpy as np
 import pandas as pd
 import xarray as xr
+from xarray.backends import BackendArray
+from xarray.core import indexing
 
 from .config import config
-from .destagger import _destag_variable
-from .grid import _wrf_grid_from_dataset
+from .grid import _grid_dims, _grid_signature, _moving_grid, _wrf_grid_from_dataset
+from .rotation import _earth_relative
+
+
+class _LazyDiagnosticArray(BackendArray):
+    """Array-like deferring the evaluation of a diagnostic until its values are requested.
+
+    Only the requested slice of each component variable is read (and combined) on access, so
+    that diagnostics cost nothing until they are used. Components may be staggered along
+    dimensions given in ``stagger`` (mapping staggered to unstaggered dimension names), in which
+    case the enclosing range of both the unstaggered and staggered points is read, and the
+    requested points are selected from the result.
+    """
+
+    def __init__(
+        self,
+        func: Callable[..., xr.Variable],
+        components: tuple[xr.Variable, ...],
+        dims: tuple[str, ...],
+        shape: tuple[int, ...],
+        dtype: np.dtype,
+        stagger: dict[str, str] | None = None,
+    ):
+        self.func = func
+        self.components = components
+        self.dims = dims
+        self.shape = shape
+        self.dtype = np.dtype(dtype)
+        self.stagger = stagger or {}
+
+    def __getitem__(self, key):
+        return indexing.explicit_indexing_adapter(
+            key, self.shape, indexing.IndexingSupport.OUTER, self._getitem
+        )
+
+    def _getitem(self, key: tuple) -> np.ndarray:
+        indexers = dict(zip(self.dims, key))
+        read, select = dict(indexers), {}
+        for stag_dim, dim in self.stagger.items():
+            positions = np.arange(self.shape[self.dims.index(dim)])[indexers[dim]]
+            start = positions.min() if positions.size else 0
+            stop = positions.max() + 1 if positions.size else 0
+            read[dim], read[stag_dim] = slice(start, stop), slice(start, stop + 1)
+            select[dim] = positions - start
+        result = self.func(
+            *(
+                component.isel({dim: read[dim] for dim in component.dims}).load()
+                for component in self.components
+            )
+        )
+        if select:
+            result = result.isel(select)
+        # Dimensions indexed with an integer are dropped from the output
+        out_sizes = {
+            dim: len(range(self.shape[i])[indexer]) if isinstance(indexer, slice) else len(indexer)
+            for i, (dim, indexer) in enumerate(indexers.items())
+            if not isinstance(indexer, (int, np.integer))
+        }
+        return (
+            result.set_dims(out_sizes).transpose(*out_sizes).values.astype(self.dtype, copy=False)
+        )
+
+
+def _lazy_diagnostic(
+    func: Callable[..., xr.Variable],
+    *components: xr.Variable,
+    stagger: dict[str, str] | None = None,
+) -> xr.Variable:
+    """Wrap ``func(*components)`` into a lazily indexed Variable.
+
+    ``stagger`` maps the staggered dimensions of components to the unstaggered dimensions of
+    the output (which func destaggers).
+    """
+    stagger = stagger or {}
+    sizes = {}
+    for component in components:
+        for dim, size in component.sizes.items():
+            if dim in stagger:
+                sizes.setdefault(stagger[dim], size - 1)
+            else:
+                sizes.setdefault(dim, size)
+    # Cheaply determine the output dtype by evaluating on tiny stand-ins
+    dtype = func(
+        *(
+            xr.Variable(c.dims, np.zeros(tuple(2 if d in stagger else 1 for d in c.dims), c.dtype))
+            for c in components
+        )
+    ).dtype
+    return xr.Variable(
+        tuple(sizes),
+        indexing.LazilyIndexedArray(
+            _LazyDiagnosticArray(
+                func, components, tuple(sizes), tuple(sizes.values()), dtype, stagger
+            )
+        ),
+    )
+
+
+def _apply_diagnostic(
+    func: Callable[..., xr.Variable],
+    *components: xr.Variable,
+    stagger: dict[str, str] | None = None,
+) -> xr.Variable:
+    """Evaluate a diagnostic lazily if any of its components is lazily indexed (as read from a
+    file), as dask arrays if any of them uses dask, or right away if all are in memory.
+    """
+    if _evaluate_now(components):
+        return func(*components)
+    return _lazy_diagnostic(func, *components, stagger=stagger)
+
+
+def _apply_vector_diagnostic(
+    func: Callable[..., tuple[xr.Variable, xr.Variable]],
+    *components: xr.Variable,
+    stagger: dict[str, str] | None = None,
+) -> tuple[xr.Variable, xr.Variable]:
+    """Evaluate a diagnostic vector (pair of variables) like ``_apply_diagnostic``.
+
+    With dask, both variables come out of the same tasks. With lazily indexed components, each
+    variable is lazily indexed on its own (evaluating func for the accessed slice only).
+    """
+    if _evaluate_now(components):
+        return func(*components)
+    return tuple(
+        _lazy_diagnostic(
+            functools.partial(_vector_component, func, i), *components, stagger=stagger
+        )
+        for i in range(2)
+    )
+
+
+def _evaluate_now(components: tuple[xr.Variable, ...]) -> bool:
+    """Whether a diagnostic of components needs no lazy indexing (dask or in-memory data)."""
+    return any(component.chunks is not None for component in components) or all(
+        component._in_memory for component in components
+    )
+
+
+def _vector_component(func, i, *components):
+    return func(*components)[i]
+
+
+# Character positions of the digits and separators in fixed-width WRF times
+_wrf_time_digits = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]
+_wrf_time_separators = [4, 7, 10, 13, 16]
+
+
+def _parse_wrf_times(times: np.ndarray) -> np.ndarray | None:
+    """Parse fixed-width WRF times straight from their bytes using integer arithmetic.
+
+    Supports times formatted as ``YYYY-MM-DD_hh:mm:ss`` or ``YYYY-MM-DDThh:mm:ss``. Returns None if
+    any of the times is not in one of these formats (or not representable in nanoseconds).
+    """
+    times = np.asarray(times)
+    if times.dtype == 'U19':
+        times = np.char.encode(times, 'ascii')
+    if times.dtype != 'S19':
+        return None
+    if times.size == 0:
+        return np.empty(times.shape, dtype='datetime64[ns]')
+    chars = np.ascontiguousarray(times).view(np.uint8).reshape(times.shape + (19,))
+
+    # Detect the date/time separator once, from the first time
+    separator = chars.reshape(-1, 19)[0, 10:11].tobytes()
+    if separator not in (b'_', b'T') or np.any(
+        chars[..., _wrf_time_separators] != np.frombuffer(b'--' + separator + b'::', dtype=np.uint8)
+    ):
+        return None
+    digits = chars[..., _wrf_time_digits].astype(np.int64) - ord('0')
+    if np.any((digits < 0) | (digits > 9)):
+        return None
+
+    year = digits[..., :4] @ np.array([1000, 100, 10, 1])
+    month, day, hour, minute, second = np.moveaxis(
+        digits[..., 4:].reshape(times.shape + (5, 2)) @ np.array([10, 1]), -1, 0
+    )
+    if (
+        np.any((year < 1678) | (year > 2261))
+        or np.any((month < 1) | (month > 12))
+        or np.any(day < 1)
+        or np.any((hour > 23) | (minute > 59) | (second > 59))
+    ):
+        return None
+    months = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    days = months.astype('datetime64[D]') + (day - 1)
+    if np.any(days.astype('datetime64[M]') != months):
+        # Day beyond the end of the month
+        return None
+    seconds = (hour * 3600 + minute * 60 + second).astype('timedelta64[s]')
+    return days.astype('datetime64[ns]') + seconds
 
 
 def _decode_times(ds: xr.Dataset) -> xr.Dataset:
     """
     Decode the time variable to datetime64.
     """
+    ds = ds.assign_coords({'Time': _decoded_time_values(ds)})
+    ds.Time.attrs = {'long_name': 'Time', 'standard_name': 'time'}
+    return ds
+
+
+def _decoded_time_values(ds: xr.Dataset) -> np.ndarray | pd.DatetimeIndex:
+    """Get the decoded values of the time coordinate from Times (or XTIME)."""
     if 'Times' in ds:
-        try:
-            _time = pd.to_datetime(
-                ds.Times.data.astype('str'), errors='raise', format='%Y-%m-%d_%H:%M:%S'
-            )
-        except ValueError:
-            _time = pd.to_datetime(
-                ds.Times.data.astype('str'), errors='raise', format='%Y-%m-%dT%H:%M:%S'
-            )
+        # Time becomes an indexed dimension coordinate, so the (tiny) Times array is loaded
+        times = ds.Times.values
+        _time = _parse_wrf_times(times)
+        if _time is None:
+            # Not all fixed-width WRF times, so let pandas handle (or reject) them
+            try:
+                _time = pd.to_datetime(
+                    times.astype('str'), errors='raise', format='%Y-%m-%d_%H:%M:%S'
+                )
+            except ValueError:
+                _time = pd.to_datetime(
+                    times.astype('str'), errors='raise', format='%Y-%m-%dT%H:%M:%S'
+                )
     elif 'XTIME' in ds:
         if ds.XTIME.dtype == 'datetime64[ns]':
             _time = ds.XTIME.data
@@ -32,19 +237,33 @@ def _decode_times(ds: xr.Dataset) -> xr.Dataset:
             )
     else:
         raise ValueError('No time variable found in the dataset.')
-    ds = ds.assign_coords({'Time': _time})
-    ds.Time.attrs = {'long_name': 'Time', 'standard_name': 'time'}
-    return ds
+    return _time
+
+
+def _wrf_units_map() -> dict[str, str]:
+    """Map awkward WRF units to pint-friendly ones (or 'invalid')."""
+    # We have to invert the mapping from "new_unit -> wrf_units" to "wrf_unit -> new_unit"
+    return {
+        v: k for (k, val_list) in config.get('unit_harmonization_map').items() for v in val_list
+    }
+
+
+def _hybrid_opt_condition(hybrid_opt: int) -> str:
+    """Get the key of the conditional CF attributes applying to a vertical coordinate type."""
+    return 'HYBRID_OPT==0' if hybrid_opt == 0 else 'HYBRID_OPT!=0'
+
+
+def _time_dependent_coords() -> tuple[set[str], set[str]]:
+    """Get the names of the latitude/longitude and vertical coordinates with a time dimension."""
+    lat_lon_coords = set(config.get('latitude_coords') + config.get('longitude_coords'))
+    return lat_lon_coords, set(config.get('vertical_coords'))
 
 
 def _make_units_pint_friendly(ds: xr.Dataset) -> xr.Dataset:
     """
     Harmonizes awkward WRF units into pint-friendly ones
     """
-    # We have to invert the mapping from "new_unit -> wrf_units" to "wrf_unit -> new_unit"
-    wrf_units_map = {
-        v: k for (k, val_list) in config.get('unit_harmonization_map').items() for v in val_list
-    }
+    wrf_units_map = _wrf_units_map()
     for variable in ds.data_vars:
         if ds[variable].attrs.get('units') in wrf_units_map:
             harmonized_unit = wrf_units_map[ds[variable].attrs['units']]
@@ -63,7 +282,7 @@ def _modify_attrs_to_cf(ds: xr.Dataset) -> xr.Dataset:
         ds[variable].attrs.update(config.get(f'cf_attribute_map.{variable}'))
 
     # Conditional updates (right now just vertical coordinate type)
-    hybrid_opt_condition = 'HYBRID_OPT==0' if getattr(ds, 'HYBRID_OPT', 0) == 0 else 'HYBRID_OPT!=0'
+    hybrid_opt_condition = _hybrid_opt_condition(getattr(ds, 'HYBRID_OPT', 0))
     vars_to_update = set(
         config.get(f'conditional_cf_attribute_map.{hybrid_opt_condition}').keys()
     ).intersection(set(ds.data_vars))
@@ -75,32 +294,90 @@ def _modify_attrs_to_cf(ds: xr.Dataset) -> xr.Dataset:
     return ds
 
 
-def _collapse_time_dim(ds: xr.Dataset) -> xr.Dataset:
-    # This "time dimension collapsing" assumption is wrong with moving nests
-    # and should be applied to static, nested domains.
-    lat_lon_coords = set(config.get('latitude_coords') + config.get('longitude_coords'))
-    vertical_coords = set(config.get('vertical_coords'))
+def _is_moving_domain(ds: xr.Dataset, coords: tuple[str, ...] = ('XLAT', 'XLONG')) -> bool:
+    """Cheaply check if the horizontal coordinates of a dataset change over time (moving nest).
+
+    Only the corners and center of the domain are compared across all times, so that at most a
+    few values per time are read.
+    """
+    for coord in coords:
+        if coord not in ds.variables or ds[coord].ndim != 3:
+            continue
+        time_dim, y_dim, x_dim = ds[coord].dims
+        ny, nx = ds.sizes[y_dim], ds.sizes[x_dim]
+        samples = (
+            ds[coord]
+            .variable.isel({y_dim: [0, ny // 2, ny - 1], x_dim: [0, nx // 2, nx - 1]})
+            .values
+        )
+        if np.any(samples != samples[:1]):
+            return True
+    return False
+
+
+def _collapse_time_dim(
+    ds: xr.Dataset, check_static: bool = False, moving_nest: bool = False
+) -> xr.Dataset:
+    """Collapse the time dimension of the latitude/longitude and vertical coordinates.
+
+    Only the first time is kept, which is read lazily for lazily loaded datasets. This assumption is
+    wrong with moving nests, whose horizontal coordinates are left untouched if ``moving_nest``.
+    Otherwise, if ``check_static``, a sample of the coordinates is compared across times first and
+    the horizontal coordinates are left untouched (with a warning) if they move.
+    """
+    lat_lon_coords, vertical_coords = _time_dependent_coords()
     coords = set(ds.variables).intersection(lat_lon_coords.union(vertical_coords))
     ds = ds.set_coords(coords)
 
+    if moving_nest:
+        lat_lon_coords = set()
+    elif check_static and _is_moving_domain(ds):
+        warnings.warn(
+            'Horizontal coordinates change over time (moving nest), so their time dimension is '
+            'not collapsed.'
+        )
+        lat_lon_coords = set()
+
+    collapsed = {}
     for coord in ds.coords:
-        data_to_reassign = None
-        if coord in lat_lon_coords and ds[coord].ndim == 3:
-            data_to_reassign = ds[coord].data[0, :, :]
-        elif coord in vertical_coords and ds[coord].ndim == 2:
-            data_to_reassign = ds[coord].data[0, :]
-
-        if data_to_reassign is not None:
-            attrs, encoding = ds[coord].attrs, ds[coord].encoding
-            ds = ds.assign_coords({coord: (ds[coord].dims[1:], data_to_reassign)})
-            ds[coord].attrs = attrs
-            ds[coord].encoding = encoding
+        if (coord in lat_lon_coords and ds[coord].ndim == 3) or (
+            coord in vertical_coords and ds[coord].ndim == 2
+        ):
+            # Indexing the Variable (rather than its data) keeps lazily loaded data lazy, as
+            # well as its attrs and encoding
+            collapsed[coord] = ds[coord].variable[0]
 
-    return ds
+    return ds.assign_coords(collapsed)
 
 
-def _include_projection_coordinates(ds: xr.Dataset) -> xr.Dataset:
-    """Introduce projection dimension coordinate values and CRS."""
+def _moving_nest_coords(ds: xr.Dataset, signature: tuple) -> dict[str, xr.Variable] | None:
+    """
+    Get the time-dependent projection coordinates of a moving nest on the grid of a signature,
+    named after the (renamed) horizontal dimensions with a ``_nest`` suffix.
+
+    The nest is located at each time from the latitude and longitude of its lower left mass
+    point, so that a single value of XLAT and XLONG is read per time. None if these are missing.
+    """
+    if not all(name in ds.variables and ds[name].ndim == 3 for name in ('XLAT', 'XLONG')):
+        return None
+    time_dim = ds['XLAT'].dims[0]
+    lat, lon = (ds[name].variable[:, 0, 0].values for name in ('XLAT', 'XLONG'))
+    grid = _moving_grid(signature, lat, lon)
+    rename_dim_map = config.get('rename_dim_map')
+    coords = {}
+    for wrf_dim in _grid_dims:
+        dim = wrf_dim if wrf_dim in ds.dims else rename_dim_map.get(wrf_dim, wrf_dim)
+        if dim in ds.dims:
+            # Auxiliary (rather than dimension) coordinates, so without the axis attribute
+            attrs = config.get(f'cf_attribute_map.{wrf_dim}').copy()
+            attrs.pop('axis', None)
+            name = f'{rename_dim_map.get(wrf_dim, wrf_dim)}_nest'
+            coords[name] = xr.Variable((time_dim, dim), grid[wrf_dim], attrs)
+    return coords
+
+
+def _include_projection_coordinates(ds: xr.Dataset, moving_nest: bool = False) -> xr.Dataset:
+    """Introduce projection dimension coordinate values (or moving nest coordinates) and CRS."""
     try:
         grid_components = _wrf_grid_from_dataset(ds)
     except KeyError:
@@ -111,9 +388,18 @@ def _include_projection_coordinates(ds: xr.Dataset) -> xr.Dataset:
         return ds
     horizontal_dims = set(config.get('horizontal_dims')).intersection(set(ds.dims))
 
-    # Include dimension coordinates
-    for dim in horizontal_dims:
-        ds[dim] = (dim, grid_components[dim], config.get(f'cf_attribute_map.{dim}'))
+    moving_coords = _moving_nest_coords(ds, _grid_signature(ds)) if moving_nest else None
+    if moving_nest and moving_coords is None:
+        warnings.warn(
+            'Unable to locate the moving nest without XLAT and XLONG, so its projection '
+            'coordinates are those of its position in the global attributes.'
+        )
+    if moving_coords is not None:
+        ds = ds.assign_coords(moving_coords)
+    else:
+        # Include dimension coordinates
+        for dim in horizontal_dims:
+            ds[dim] = (dim, grid_components[dim], config.get(f'cf_attribute_map.{dim}'))
 
     # Include CRS if we don't have idealized coords
     if grid_components['crs'] is not None:
@@ -158,11 +444,13 @@ def _calc_base_diagnostics(ds: xr.Dataset, drop: bool = True) -> xr.Dataset:
 
     Notes
     -----
-    This operation should be called before destaggering.
+    This operation should be called before destaggering. Unless the components are dask arrays,
+    the diagnostics are lazily indexed, and only read and combine the requested slices of their
+    components on access.
     """
     # Potential temperature
     if 'T' in ds.data_vars:
-        ds['air_potential_temperature'] = ds['T'] + 300
+        ds['air_potential_temperature'] = _apply_diagnostic(lambda t: t + 300, ds['T'].variable)
         ds['air_potential_temperature'].attrs = {
             'units': 'K',
             'standard_name': 'air_potential_temperature',
@@ -172,7 +460,9 @@ def _calc_base_diagnostics(ds: xr.Dataset, drop: bool = True) -> xr.Dataset:
 
     # Pressure
     if 'P' in ds.data_vars and 'PB' in ds.data_vars:
-        ds['air_pressure'] = ds['P'] + ds['PB']
+        ds['air_pressure'] = _apply_diagnostic(
+            lambda p, pb: p + pb, ds['P'].variable, ds['PB'].variable
+        )
         ds['air_pressure'].attrs = {
             'units': ds['P'].attrs.get('units', 'Pa'),
             'standard_name': 'air_pressure',
@@ -182,13 +472,17 @@ def _calc_base_diagnostics(ds: xr.Dataset, drop: bool = True) -> xr.Dataset:
 
     # Geopotential and geopotential height
     if 'PH' in ds.data_vars and 'PHB' in ds.data_vars:
-        ds['geopotential'] = ds['PH'] + ds['PHB']
+        ds['geopotential'] = _apply_diagnostic(
+            lambda ph, phb: ph + phb, ds['PH'].variable, ds['PHB'].variable
+        )
         ds['geopotential'].attrs = {
             'units': 'm**2 s**-2',
             'standard_name': 'geopotential',
             'stagger': ds['PH'].attrs.get('stagger', 'Z'),
         }
-        ds['geopotential_height'] = ds['geopotential'] / 9.81
+        ds['geopotential_height'] = _apply_diagnostic(
+            lambda ph, phb: (ph + phb) / 9.81, ds['PH'].variable, ds['PHB'].variable
+        )
         ds['geopotential_height'].attrs = {
             'units': 'm',
             'standard_name': 'geopotential_height',
@@ -199,9 +493,16 @@ def _calc_base_diagnostics(ds: xr.Dataset, drop: bool = True) -> xr.Dataset:
 
     # Earth-relative wind fields (computed according to https://forum.mmm.ucar.edu/threads/how-do-i-convert-model-grid-relative-wind-to-earth-relative-wind-so-that-i-can-compare-model-wind-to-observations.179/)
     if {'U', 'V', 'SINALPHA', 'COSALPHA'}.issubset(ds.data_vars):
-        u_model, v_model = _destag_variable(ds['U'].variable), _destag_variable(ds['V'].variable)
-        ds['wind_east'] = (u_model * ds['COSALPHA'] - v_model * ds['SINALPHA']).variable
-        ds['wind_north'] = (v_model * ds['COSALPHA'] + u_model * ds['SINALPHA']).variable
+        components = [ds[name].variable for name in ('U', 'V', 'COSALPHA', 'SINALPHA')]
+        stagger = {
+            dim: dim.split('_stag')[0]
+            for component in components[:2]
+            for dim in component.dims
+            if dim.endswith('_stag')
+        }
+        ds['wind_east'], ds['wind_north'] = _apply_vector_diagnostic(
+            _earth_relative, *components, stagger=stagger
+        )
         ds['wind_east'].attrs = dict(
             description='earth-relative x-wind component',
             standard_name='eastward_wind',
@@ -217,8 +518,10 @@ def _calc_base_diagnostics(ds: xr.Dataset, drop: bool = True) -> xr.Dataset:
 
     # Earth-relative 10m wind fields (computed according to https://forum.mmm.ucar.edu/threads/how-do-i-convert-model-grid-relative-wind-to-earth-relative-wind-so-that-i-can-compare-model-wind-to-observations.179/)
     if {'U10', 'V10', 'SINALPHA', 'COSALPHA'}.issubset(ds.data_vars):
-        ds['wind_east_10'] = (ds['U10'] * ds['COSALPHA'] - ds['V10'] * ds['SINALPHA']).variable
-        ds['wind_north_10'] = (ds['V10'] * ds['COSALPHA'] + ds['U10'] * ds['SINALPHA']).variable
+        components = [ds[name].variable for name in ('U10', 'V10', 'COSALPHA', 'SINALPHA')]
+        ds['wind_east_10'], ds['wind_north_10'] = _apply_vector_diagnostic(
+            _earth_relative, *components
+        )
         ds['wind_east_10'].attrs = dict(
             description='earth-relative 10m x-wind component',
             units='m s-1',
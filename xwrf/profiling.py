@@ -0,0 +1,175 @@
+"""Provide opt-in timing and memory instrumentation of the postprocessing stages."""
+
+from __future__ import annotations  # noqa: F401
+
+import contextlib
+import contextvars
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Iterator, NamedTuple
+
+import pandas as pd
+import xarray as xr
+
+from .config import config
+
+logger = logging.getLogger(__name__)
+
+# Reports collecting the stages run in the current context (innermost last)
+_active_reports: contextvars.ContextVar[tuple[ProfileReport, ...]] = contextvars.ContextVar(
+    'xwrf_profile_reports', default=()
+)
+
+
+class StageProfile(NamedTuple):
+    """Measurements of a single postprocessing stage."""
+
+    stage: str
+    wall_time: float
+    allocated_bytes: int | None
+    peak_bytes: int | None
+    dask_tasks: int
+
+
+class ProfileReport:
+    """
+    Measurements of the postprocessing stages run within :py:func:`profile`.
+
+    Attributes
+    ----------
+    stages : list of StageProfile
+        Wall time (in seconds), bytes allocated (still allocated after the stage and at the
+        peak of the stage, traced by :py:mod:`tracemalloc`) and net number of Dask tasks added
+        to the dataset by each stage, in the order they were run.
+    """
+
+    def __init__(self, callback: Callable[[StageProfile], Any] | None = None):
+        self.stages: list[StageProfile] = []
+        self.callback = callback
+
+    def record(self, stage: StageProfile):
+        self.stages.append(stage)
+        if self.callback is not None:
+            self.callback(stage)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Get the measurements as a DataFrame, with one row per stage run."""
+        return pd.DataFrame(self.stages, columns=StageProfile._fields)
+
+    def summary(self) -> pd.DataFrame:
+        """Get the measurements summed by stage (with the number of runs of each stage)."""
+        df = self.to_dataframe()
+        summary = df.groupby('stage', sort=False).agg(
+            runs=('stage', 'size'),
+            wall_time=('wall_time', 'sum'),
+            allocated_bytes=('allocated_bytes', 'sum'),
+            peak_bytes=('peak_bytes', 'max'),
+            dask_tasks=('dask_tasks', 'sum'),
+        )
+        return summary.sort_values('wall_time', ascending=False)
+
+    def __repr__(self) -> str:
+        if not self.stages:
+            return '<ProfileReport (no stages)>'
+        return f'<ProfileReport>\n{self.summary().to_string()}'
+
+
+@contextlib.contextmanager
+def profile(callback: Callable[[StageProfile], Any] | None = None) -> Iterator[ProfileReport]:
+    """
+    Measure the postprocessing stages run within the context.
+
+    Tracing memory allocations with :py:mod:`tracemalloc` (started here if not already tracing)
+    slows down Python code, so measurements are best compared with each other rather than with
+    the run time without profiling. Stages can also be logged (at the INFO level of the
+    ``xwrf.profiling`` logger) by setting the ``profile`` option of :py:data:`xwrf.config`, in
+    which case allocations are only measured (rather than None) if :py:mod:`tracemalloc` is
+    tracing.
+
+    Stages run by :py:func:`xwrf.open_mfdataset` (or :py:meth:`xarray.Dataset.xwrf.iter_timesteps`)
+    in other threads are measured too, but without allocations (None), as
+    :py:mod:`tracemalloc` cannot tell apart the allocations of concurrent stages. The callback may
+    then be called from these threads.
+
+    Postprocessing (with a :py:class:`xwrf.PostprocessPlan`) makes all attribute, renaming,
+    coordinate and time changes in a single pass, measured as a single ``_restructure`` stage,
+    followed by the ``_calc_base_diagnostics`` and ``_include_projection_coordinates`` stages.
+
+    Parameters
+    ----------
+    callback : callable, optional
+        Called with the :py:class:`StageProfile` of each stage as soon as it completes (e.g.
+        to forward it to a metrics system).
+
+    Yields
+    ------
+    ProfileReport
+        The report, filled in as the stages complete.
+
+    Examples
+    --------
+    >>> with xwrf.profile() as report:
+    ...     ds.xwrf.postprocess()
+    >>> report.summary()
+    """
+    report = ProfileReport(callback)
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    token = _active_reports.set(_active_reports.get() + (report,))
+    try:
+        yield report
+    finally:
+        _active_reports.reset(token)
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def _dask_task_count(ds: Any) -> int:
+    # Without dask imported, no dataset can hold dask arrays
+    if 'dask' not in sys.modules or not isinstance(ds, (xr.Dataset, xr.DataArray)):
+        return 0
+    import dask
+
+    return len(ds.__dask_graph__()) if dask.is_dask_collection(ds) else 0
+
+
+def _profiled(ds: xr.Dataset, func: Callable[..., xr.Dataset], *args, **kwargs) -> xr.Dataset:
+    """
+    Run a postprocessing stage func(ds, *args, **kwargs), measuring it if profiling.
+
+    Used with :py:meth:`xarray.Dataset.pipe`, as ``ds.pipe(_profiled, func, ...)``.
+    """
+    reports = _active_reports.get()
+    log = config.get('profile', False)
+    if not reports and not log:
+        return func(ds, *args, **kwargs)
+
+    # tracemalloc measures the whole process, so allocations of stages run concurrently (in other
+    # threads than the main one, e.g. by open_mfdataset) cannot be told apart
+    tracing = tracemalloc.is_tracing() and threading.current_thread() is threading.main_thread()
+    if tracing:
+        allocated_before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    tasks_before = _dask_task_count(ds)
+    start = time.perf_counter()
+    result = func(ds, *args, **kwargs)
+    wall_time = time.perf_counter() - start
+    allocated = peak = None
+    if tracing:
+        allocated, peak = (value - allocated_before for value in tracemalloc.get_traced_memory())
+    stage = StageProfile(
+        stage=getattr(func, '__name__', repr(func)),
+        wall_time=wall_time,
+        allocated_bytes=allocated,
+        peak_bytes=peak,
+        dask_tasks=_dask_task_count(result) - tasks_before,
+    )
+    for report in reports:
+        report.record(stage)
+    if log:
+        logger.info('%s', stage)
+    return result
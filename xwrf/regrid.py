@@ -0,0 +1,392 @@
+"""Provide regridding of WRF fields from the projection grid to regular latitude-longitude grids."""
+
+from __future__ import annotations  # noqa: F401
+
+import hashlib
+import os
+import tempfile
+import warnings
+from typing import Hashable, Iterable, Mapping
+
+import numpy as np
+import pyproj
+import xarray as xr
+
+from .config import _user_cache_dir, config
+from .grid import _lonlat_transformer
+
+# Version of the weights format, part of the cache key so that stale cache files are not reused
+_weights_version = 2
+_regrid_methods = ('bilinear', 'conservative', 'nearest')
+
+
+def _target_lat_lon(
+    target_grid: xr.Dataset | xr.DataArray | Mapping[Hashable, Iterable[float]],
+) -> tuple[np.ndarray, np.ndarray]:
+    """Get the one-dimensional latitudes and longitudes of a target grid."""
+    for lat_name, lon_name in (('lat', 'lon'), ('latitude', 'longitude')):
+        if lat_name in target_grid and lon_name in target_grid:
+            lat = np.asarray(target_grid[lat_name], dtype=np.float64)
+            lon = np.asarray(target_grid[lon_name], dtype=np.float64)
+            break
+    else:
+        raise KeyError('The target grid must have lat and lon (or latitude and longitude)')
+    if lat.ndim != 1 or lon.ndim != 1:
+        raise ValueError('The latitudes and longitudes of the target grid must be one-dimensional')
+    return lat, lon
+
+
+def _fractional_index(coord: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Get the (fractional) position of values along a monotonic coordinate, NaN if outside."""
+    positions = np.arange(coord.size, dtype=np.float64)
+    if coord[0] > coord[-1]:
+        coord, positions = coord[::-1], positions[::-1]
+    return np.interp(values, coord, positions, left=np.nan, right=np.nan)
+
+
+def _cell_edges(centers: np.ndarray, bounds: tuple[float, float] | None = None) -> np.ndarray:
+    """Get the edges of cells around (regularly or irregularly spaced) centers."""
+    if centers.size == 1:
+        return np.array([centers[0] - 0.5, centers[0] + 0.5])
+    middle = 0.5 * (centers[1:] + centers[:-1])
+    edges = np.concatenate([[2 * centers[0] - middle[0]], middle, [2 * centers[-1] - middle[-1]]])
+    return edges if bounds is None else np.clip(edges, *bounds)
+
+
+def _quadrant_areas(px: np.ndarray, py: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Get the (signed) areas of polygons within the quadrants ``x <= a`` and ``y <= b``.
+
+    By Green's theorem, the area is the integral of ``(x - a) dy`` along the boundary of the
+    intersection, which vanishes along the sides of the quadrant. Only the polygon edges within
+    the quadrant remain.
+
+    Parameters
+    ----------
+    px, py : numpy.ndarray
+        Vertices of the polygons, of shape (n, m).
+    a, b : numpy.ndarray
+        Corners of the quadrants, of shape (n,).
+    """
+    a, b = a[:, None], b[:, None]
+    dx, dy = np.roll(px, -1, axis=1) - px, np.roll(py, -1, axis=1) - py
+    # Range of the edge parameter (from 0 at a vertex to 1 at the next one) within the quadrant
+    t0, t1 = np.zeros(px.shape), np.ones(px.shape)
+    for start, delta, bound in ((px, dx, a), (py, dy, b)):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossing = (bound - start) / delta
+        t0 = np.where(delta < 0, np.maximum(t0, crossing), t0)
+        t1 = np.where(delta > 0, np.minimum(t1, crossing), t1)
+        t1 = np.where((delta == 0) & (start > bound), t0, t1)
+    length = np.maximum(t1 - t0, 0)
+    return np.sum(dy * length * (px + dx * 0.5 * (t0 + t1) - a), axis=1)
+
+
+def _conservative_weights(
+    x: np.ndarray,
+    y: np.ndarray,
+    crs: pyproj.CRS,
+    lat: np.ndarray,
+    lon: np.ndarray,
+    segments: int = 4,
+    block: int = 2**16,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Compute conservative regridding weights (see ``_regrid_weights``).
+
+    Target cells are polygons of ``segments`` straight segments per side in the source
+    projection, and their overlaps with the source cells are computed ``block`` corners of
+    source cells at a time.
+    """
+    # Source cells, with their edges in increasing order
+    x_edges, y_edges = _cell_edges(x), _cell_edges(y)
+    x_index, y_index = np.arange(x.size), np.arange(y.size)
+    if x_edges[0] > x_edges[-1]:
+        x_edges, x_index = x_edges[::-1], x_index[::-1]
+    if y_edges[0] > y_edges[-1]:
+        y_edges, y_index = y_edges[::-1], y_index[::-1]
+
+    # Target cells as polygons in the source projection, with a few straight segments per side
+    # (the sides of latitude-longitude cells are curved in most projections), and the midpoints
+    # of these segments
+    n = 2 * segments
+    lat_edges = _cell_edges(lat, bounds=(-90.0, 90.0))
+    lon_edges = _cell_edges(lon)
+    fine_lat = np.interp(np.arange(lat.size * n + 1) / n, np.arange(lat.size + 1), lat_edges)
+    fine_lon = np.interp(np.arange(lon.size * n + 1) / n, np.arange(lon.size + 1), lon_edges)
+    transformer = _lonlat_transformer(crs)
+    along_lat = np.stack(transformer.transform(*np.meshgrid(fine_lon, lat_edges)))
+    along_lon = np.stack(transformer.transform(*np.meshgrid(lon_edges, fine_lat)))
+    i, j = (index.ravel()[:, None] for index in np.indices((lat.size, lon.size)))
+    k = np.arange(n)
+    px, py = np.concatenate(
+        [
+            along_lat[:, i, j * n + k],
+            along_lon[:, i * n + k, j + 1],
+            along_lat[:, i + 1, (j + 1) * n - k],
+            along_lon[:, (i + 1) * n - k, j],
+        ],
+        axis=-1,
+    )
+
+    # Segments crossing a discontinuity of the projection (such as the antimeridian of its
+    # central longitude) stray from their midpoints, and their cells are left out
+    px, py, mid_x, mid_y = px[:, ::2], py[:, ::2], px[:, 1::2], py[:, 1::2]
+    next_x, next_y = np.roll(px, -1, axis=1), np.roll(py, -1, axis=1)
+    with np.errstate(invalid='ignore'):
+        chord = np.hypot(next_x - px, next_y - py)
+        deviation = np.hypot(mid_x - 0.5 * (next_x + px), mid_y - 0.5 * (next_y + py))
+        valid = np.all(
+            np.isfinite(px) & np.isfinite(py) & np.isfinite(mid_x) & np.isfinite(mid_y), axis=1
+        ) & np.all(deviation <= 0.25 * chord, axis=1)
+    px, py = np.where(valid[:, None], px, 0), np.where(valid[:, None], py, 0)
+    # Orientation of the polygons, so that areas are positive
+    sign = np.sign(np.sum(px * np.roll(py, -1, axis=1) - np.roll(px, -1, axis=1) * py, axis=1))
+
+    # Source cells within the bounding box of each target cell
+    x_min, y_min = px.min(axis=1), py.min(axis=1)
+    x0 = np.maximum(np.searchsorted(x_edges, x_min, side='right') - 1, 0)
+    y0 = np.maximum(np.searchsorted(y_edges, y_min, side='right') - 1, 0)
+    nx = np.minimum(np.searchsorted(x_edges, px.max(axis=1)), x.size) - x0
+    ny = np.minimum(np.searchsorted(y_edges, py.max(axis=1)), y.size) - y0
+    inside = valid & (nx > 0) & (ny > 0)
+    nx, ny = np.where(inside, nx, 0), np.where(inside, ny, 0)
+
+    # Overlap areas, from the polygon areas within the quadrants at all corners of these cells
+    # (nothing at the lower and left corners, unless the polygon extends beyond the source grid)
+    corners = np.where(inside, (nx + 1) * (ny + 1), 0)
+    target = np.repeat(np.arange(corners.size), corners)
+    local = np.arange(target.size) - np.repeat(np.cumsum(corners) - corners, corners)
+    cx, cy = local % (nx + 1)[target], local // (nx + 1)[target]
+    quadrant = np.zeros(target.size)
+    (needed,) = np.nonzero(
+        ((cx > 0) | (x_edges[0] > x_min)[target]) & ((cy > 0) | (y_edges[0] > y_min)[target])
+    )
+    for start in range(0, needed.size, block):
+        part = needed[start : start + block]
+        t = target[part]
+        quadrant[part] = _quadrant_areas(
+            px[t], py[t], x_edges[x0[t] + cx[part]], y_edges[y0[t] + cy[part]]
+        )
+    cell = (cx < nx[target]) & (cy < ny[target])
+    row = (nx + 1)[target][cell]
+    (first,) = np.nonzero(cell)
+    overlap = sign[target[cell]] * (
+        quadrant[first + row + 1] - quadrant[first + row] - quadrant[first + 1] + quadrant[first]
+    )
+    target = target[cell]
+    source = y_index[y0[target] + cy[cell]] * x.size + x_index[x0[target] + cx[cell]]
+
+    # Sparse weights of the overlapping source cells, padded with zero weights
+    keep = overlap > 0
+    target, source, overlap = target[keep], source[keep], overlap[keep]
+    counts = np.bincount(target, minlength=lat.size * lon.size)
+    position = np.arange(target.size) - np.repeat(np.cumsum(counts) - counts, counts)
+    index = np.zeros((counts.size, max(counts.max(initial=0), 1)), dtype=np.intp)
+    weight = np.zeros(index.shape)
+    index[target, position] = source
+    weight[target, position] = overlap
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weight /= weight.sum(axis=-1, keepdims=True)
+    weight[counts == 0] = np.nan
+    return index, weight
+
+
+def _regrid_weights(
+    x: np.ndarray,
+    y: np.ndarray,
+    crs: pyproj.CRS,
+    lat: np.ndarray,
+    lon: np.ndarray,
+    method: str = 'bilinear',
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the sparse weights of target grid points (or cells) on a source projection grid.
+
+    Parameters
+    ----------
+    x, y : numpy.ndarray
+        Monotonic projection coordinates of the source grid.
+    crs : pyproj.CRS
+        Projection of the source grid.
+    lat, lon : numpy.ndarray
+        Latitudes and longitudes of the target grid.
+    method : {'bilinear', 'conservative', 'nearest'}
+        Interpolation method. Conservative weights are the areas of the overlaps of the target
+        cells with the source cells, relative to the part of the target cells within the
+        source grid. Areas are measured in the source projection, with the curved sides of the
+        target cells approximated by a few straight segments.
+
+    Returns
+    -------
+    index, weight : numpy.ndarray
+        Flat (row-major) source grid indices and weights, of shape (lat.size * lon.size, k) with
+        k nonzero weights per target point. Weights are NaN for points outside of the source
+        grid.
+    """
+    if method == 'conservative':
+        return _conservative_weights(x, y, crs, lat, lon)
+    px, py = _lonlat_transformer(crs).transform(*np.meshgrid(lon, lat))
+    fx, fy = _fractional_index(x, px), _fractional_index(y, py)
+    outside = np.isnan(fx) | np.isnan(fy)
+    fx, fy = np.where(outside, 0, fx), np.where(outside, 0, fy)
+
+    if method == 'bilinear':
+        # Lower left corner of the source cell containing each point, and the offsets within it
+        ix = np.minimum(fx.astype(np.intp), max(x.size - 2, 0))
+        iy = np.minimum(fy.astype(np.intp), max(y.size - 2, 0))
+        tx, ty = (fx - ix).ravel(), (fy - iy).ravel()
+        corner = (iy * x.size + ix).ravel()
+        index = np.stack([corner, corner + 1, corner + x.size, corner + x.size + 1], axis=-1)
+        weight = np.stack([(1 - tx) * (1 - ty), tx * (1 - ty), (1 - tx) * ty, tx * ty], axis=-1)
+        weight[outside.ravel()] = np.nan
+        return index, weight
+
+    index = (np.rint(fy).astype(np.intp) * x.size + np.rint(fx).astype(np.intp)).ravel()
+    weight = np.where(outside.ravel(), np.nan, 1.0)
+    return index[:, None], weight[:, None]
+
+
+def _weights_cache_dir() -> str:
+    cache_dir = config.get('regrid_weights_cache_dir', None)
+    return _user_cache_dir('regrid_weights') if cache_dir is None else os.path.expanduser(cache_dir)
+
+
+def _cached_regrid_weights(
+    x: np.ndarray,
+    y: np.ndarray,
+    crs: pyproj.CRS,
+    lat: np.ndarray,
+    lon: np.ndarray,
+    method: str = 'bilinear',
+    cache: bool = True,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Get regridding weights (see ``_regrid_weights``) from the disk cache, or compute them."""
+    if not cache:
+        return _regrid_weights(x, y, crs, lat, lon, method=method)
+
+    # Weights are keyed by the hash of the source and target grids and of the method
+    key = hashlib.sha256(f'{_weights_version}:{method}:{crs.to_wkt()}'.encode())
+    for coord in (x, y, lat, lon):
+        key.update(np.ascontiguousarray(coord, dtype=np.float64).tobytes())
+        key.update(b':')
+    cache_dir = _weights_cache_dir()
+    path = os.path.join(cache_dir, f'{key.hexdigest()}.npz')
+    try:
+        with np.load(path) as weights:
+            return weights['index'], weights['weight']
+    except (OSError, KeyError, ValueError):
+        pass
+
+    index, weight = _regrid_weights(x, y, crs, lat, lon, method=method)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temporary file first, so that concurrent readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.npz')
+    except OSError as exc:
+        # The cache is only an optimization, e.g. for read-only or invalid cache directories
+        warnings.warn(f'Unable to cache regridding weights in {cache_dir}: {exc}')
+        return index, weight
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, index=index, weight=weight)
+        os.replace(tmp_path, path)
+    except OSError as exc:
+        os.remove(tmp_path)
+        warnings.warn(f'Unable to cache regridding weights in {cache_dir}: {exc}')
+    return index, weight
+
+
+def _apply_weights(values, index, weight, shape):
+    """Regrid the last two axes of values to shape, with the sparse weights of each target point."""
+    flat = values.reshape(values.shape[:-2] + (-1,))
+    if np.issubdtype(values.dtype, np.floating):
+        weight = weight.astype(values.dtype, copy=False)
+    # One gather per nonzero weight, so that temporaries are the size of the output
+    result = flat[..., index[:, 0]] * weight[:, 0]
+    for j in range(1, index.shape[1]):
+        result += flat[..., index[:, j]] * weight[:, j]
+    return result.reshape(values.shape[:-2] + shape)
+
+
+def _regrid(
+    ds: xr.Dataset,
+    target_grid: xr.Dataset | xr.DataArray | Mapping[Hashable, Iterable[float]],
+    method: str = 'bilinear',
+    variables: Hashable | Iterable[Hashable] | None = None,
+    cache: bool = True,
+) -> xr.Dataset:
+    """Regrid data variables of a postprocessed dataset to a regular latitude-longitude grid."""
+    if method not in _regrid_methods:
+        raise ValueError(f'method must be one of {_regrid_methods}, not {method!r}')
+    if 'wrf_projection' not in ds:
+        raise ValueError(
+            'The dataset has no wrf_projection, regrid postprocessed datasets (and check that '
+            'their projection is supported)'
+        )
+    if any(dim in ds.dims and dim not in ds.indexes for dim in ('x', 'y', 'x_stag', 'y_stag')):
+        raise ValueError(
+            'The dataset has no x and y coordinates, as those of moving nests change over time '
+            '(to regrid a single time, assign its x_nest and y_nest coordinates to x and y)'
+        )
+    crs = ds['wrf_projection'].item()
+    lat, lon = _target_lat_lon(target_grid)
+
+    def horizontal_dims(datavar):
+        y_dims = [dim for dim in ('y', 'y_stag') if dim in datavar.dims]
+        x_dims = [dim for dim in ('x', 'x_stag') if dim in datavar.dims]
+        return (y_dims[0], x_dims[0]) if len(y_dims) == 1 and len(x_dims) == 1 else None
+
+    if variables is None:
+        variables = [
+            name
+            for name, datavar in ds.data_vars.items()
+            if horizontal_dims(datavar) and datavar.dtype.kind in 'iuf'
+        ]
+    elif isinstance(variables, str):
+        variables = [variables]
+    if missing := set(variables).difference(ds.data_vars):
+        raise KeyError(f'Variables {missing} are not data variables of the dataset')
+
+    # Weights are computed once per pair of (staggered or unstaggered) horizontal dimensions
+    weights = {}
+    data_vars = {}
+    for name in variables:
+        datavar = ds[name]
+        dims = horizontal_dims(datavar)
+        if dims is None:
+            raise ValueError(f'{name} {datavar.dims} is not on the horizontal grid')
+        if dims not in weights:
+            y_dim, x_dim = dims
+            weights[dims] = _cached_regrid_weights(
+                ds[x_dim].values, ds[y_dim].values, crs, lat, lon, method=method, cache=cache
+            )
+        if datavar.chunks is not None:
+            # Target points gather from anywhere on the source grid, so chunk only along the
+            # other dimensions
+            datavar = datavar.chunk(dict.fromkeys(dims, -1))
+        index, weight = weights[dims]
+        regridded = xr.apply_ufunc(
+            _apply_weights,
+            datavar,
+            kwargs={'index': index, 'weight': weight, 'shape': (lat.size, lon.size)},
+            input_core_dims=[list(dims)],
+            output_core_dims=[['lat', 'lon']],
+            exclude_dims=set(dims),
+            dask='parallelized',
+            output_dtypes=[
+                datavar.dtype if np.issubdtype(datavar.dtype, np.floating) else np.float64
+            ],
+            dask_gufunc_kwargs={'output_sizes': {'lat': lat.size, 'lon': lon.size}},
+            keep_attrs=True,
+        )
+        regridded.attrs.pop('grid_mapping', None)
+        data_vars[name] = regridded
+
+    result = xr.Dataset(data_vars, attrs=ds.attrs)
+    result.coords['lat'] = ('lat', lat, {'standard_name': 'latitude', 'units': 'degrees_north'})
+    result.coords['lon'] = ('lon', lon, {'standard_name': 'longitude', 'units': 'degrees_east'})
+    # Keep the (time and vertical) coordinates of the dataset which do not vary horizontally
+    return result.assign_coords(
+        {name: value for name, value in ds.coords.items() if set(value.dims) <= set(result.dims)}
+    )
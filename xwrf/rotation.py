@@ -0,0 +1,144 @@
+"""Provide the rotation of grid-relative vector fields (such as winds) to earth-relative ones."""
+
+from __future__ import annotations  # noqa: F401
+
+import numpy as np
+import xarray as xr
+
+from .destagger import _destag_block
+
+
+def _rotate_block(u, v, cosalpha, sinalpha, u_axis=None, v_axis=None):
+    """
+    Destagger and rotate blocks of grid-relative vector components in a single pass.
+
+    Parameters
+    ----------
+    u, v : numpy.ndarray
+        Grid-relative components, staggered along u_axis and v_axis if these are given.
+    cosalpha, sinalpha : numpy.ndarray
+        Local cosine and sine of the map rotation, broadcastable to the destaggered components.
+    u_axis, v_axis : int, optional
+        Staggered axis of u and v.
+
+    Returns
+    -------
+    numpy.ndarray
+        Eastward and northward components, stacked along a new first axis.
+    """
+    if u_axis is not None:
+        u = _destag_block(u, u_axis)
+    if v_axis is not None:
+        v = _destag_block(v, v_axis)
+    shape = np.broadcast_shapes(u.shape, v.shape, cosalpha.shape, sinalpha.shape)
+    out = np.empty((2,) + shape, dtype=np.result_type(u, v, cosalpha, sinalpha))
+    east, north = out
+    np.multiply(u, cosalpha, out=east)
+    np.multiply(v, cosalpha, out=north)
+
+    # Destaggered components are owned here, so reuse them rather than allocating temporaries
+    def owned(data, axis):
+        return axis is not None and data.shape == shape and data.dtype == out.dtype
+
+    buffer = u if owned(u, u_axis) else np.empty(shape, dtype=out.dtype)
+    north += np.multiply(u, sinalpha, out=buffer)
+    buffer = v if owned(v, v_axis) else buffer
+    east -= np.multiply(v, sinalpha, out=buffer)
+    return out
+
+
+def _rotated_dtype(u_dtype, v_dtype, cosalpha_dtype, sinalpha_dtype, u_axis=None, v_axis=None):
+    """Get the dtype of the output of ``_rotate_block`` for inputs of the given dtypes."""
+    # Destaggered components have the dtype of _destag_block output
+    if u_axis is not None:
+        u_dtype = np.result_type(u_dtype, 0.5)
+    if v_axis is not None:
+        v_dtype = np.result_type(v_dtype, 0.5)
+    return np.result_type(u_dtype, v_dtype, cosalpha_dtype, sinalpha_dtype)
+
+
+def _unstaggered_chunks(chunks: tuple[int, ...]) -> tuple[int, ...]:
+    """Chunks of a staggered dimension after destaggering (as in ``_destag_dask``)."""
+    if len(chunks) > 1 and chunks[-1] == 1:
+        chunks = chunks[:-2] + (chunks[-2] + 1,)
+    return chunks[:-1] + (chunks[-1] - 1,)
+
+
+def _rotate_dask(u, v, cosalpha, sinalpha, u_axis=None, v_axis=None):
+    """Destagger and rotate dask arrays with a single task per output chunk (both components)."""
+    import dask.array as da
+
+    u, v, cosalpha, sinalpha = (da.asarray(data) for data in (u, v, cosalpha, sinalpha))
+    # Output chunks follow u, and staggered axes are rechunked to one more element in the last
+    # chunk, so that block i holds the points around output block i (given a one-element halo)
+    chunks = list(u.chunks)
+    if u_axis is not None:
+        chunks[u_axis] = _unstaggered_chunks(u.chunks[u_axis])
+
+    def aligned(data, axis):
+        target = [c if size > 1 else (1,) for c, size in zip(chunks, data.shape)]
+        if axis is not None:
+            target[axis] = chunks[axis][:-1] + (chunks[axis][-1] + 1,)
+        data = data.rechunk(tuple(target))
+        if axis is None:
+            return data
+        depth = dict.fromkeys(range(data.ndim), 0)
+        depth[axis] = (0, 1)
+        return da.overlap.overlap(data, depth=depth, boundary='none')
+
+    return da.map_blocks(
+        _rotate_block,
+        aligned(u, u_axis),
+        aligned(v, v_axis),
+        aligned(cosalpha, None),
+        aligned(sinalpha, None),
+        u_axis=u_axis,
+        v_axis=v_axis,
+        new_axis=0,
+        chunks=((2,),) + tuple(chunks),
+        dtype=_rotated_dtype(u.dtype, v.dtype, cosalpha.dtype, sinalpha.dtype, u_axis, v_axis),
+    )
+
+
+def _staggered_dim(datavar: xr.Variable) -> str | None:
+    dims = [dim for dim in datavar.dims if dim.endswith('_stag')]
+    if len(dims) > 1:
+        raise NotImplementedError(
+            f'Expected at most one staggered dimension. Found multiple staggered dimensions: {dims}'
+        )
+    return dims[0] if dims else None
+
+
+def _earth_relative(
+    u: xr.Variable, v: xr.Variable, cosalpha: xr.Variable, sinalpha: xr.Variable
+) -> tuple[xr.Variable, xr.Variable]:
+    """
+    Rotate a grid-relative vector pair to earth-relative (eastward and northward) components.
+
+    u and v may be staggered (along a dimension ending in "_stag"), in which case they are
+    destaggered as part of the rotation. Both components are computed together, block by block
+    for dask arrays.
+    """
+    u_stag, v_stag = _staggered_dim(u), _staggered_dim(v)
+    dims = tuple(dim.split('_stag')[0] for dim in u.dims)
+    v_dims = tuple(dim.split('_stag')[0] for dim in v.dims)
+    if set(v_dims) != set(dims):
+        raise ValueError(f'Vector components have different dimensions: {u.dims} and {v.dims}')
+    if missing := set(cosalpha.dims).union(sinalpha.dims).difference(dims):
+        raise ValueError(f'Rotation has dimensions {missing} which the vector components lack')
+
+    # Put v in the dimension order of u, and insert length-one axes in the rotation arrays
+    v = v.transpose(*(dim if dim in v.dims else f'{dim}_stag' for dim in dims))
+
+    def expanded(datavar):
+        data = datavar.transpose(*(dim for dim in dims if dim in datavar.dims)).data
+        return data[tuple(slice(None) if dim in datavar.dims else None for dim in dims)]
+
+    u_axis = None if u_stag is None else u.get_axis_num(u_stag)
+    v_axis = None if v_stag is None else v.get_axis_num(v_stag)
+    arrays = (u.data, v.data, expanded(cosalpha), expanded(sinalpha))
+    if any(datavar.chunks is not None for datavar in (u, v, cosalpha, sinalpha)):
+        stacked = _rotate_dask(*arrays, u_axis=u_axis, v_axis=v_axis)
+    else:
+        stacked = _rotate_block(*(np.asarray(data) for data in arrays), u_axis, v_axis)
+    return xr.Variable(dims, stacked[0]), xr.Variable(dims, stacked[1])
@@ -9,8 +9,13 @@ from __future__ import annotations  # noqa: F401
 import os
 import pathlib
 
+import numpy as np
+import pandas as pd
+import pyproj
 import xarray as xr
 
+from .grid import _hashable_attr, _wgs84, _wrf_grid_from_signature, grid_attrs
+
 _default_cache_dir_name = 'xwrf_tutorial_data'
 base_url = 'https://github.com/xarray-contrib/xwrf-data'
 version = 'main'
@@ -126,3 +131,446 @@ def load_dataset(*args, **kwargs) -> xr.Dataset:
     """
     with open_dataset(*args, **kwargs) as ds:
         return ds.load()
+
+
+# Projection attributes of the synthetic datasets, by MAP_PROJ
+_synthetic_projections = {
+    0: {'TRUELAT1': 0.0, 'TRUELAT2': 0.0, 'STAND_LON': 0.0, 'CEN_LAT': 0.0, 'CEN_LON': 0.0},
+    1: {'TRUELAT1': 30.0, 'TRUELAT2': 60.0, 'STAND_LON': -98.0, 'CEN_LAT': 38.0, 'CEN_LON': -98.0},
+    2: {
+        'TRUELAT1': 60.0,
+        'TRUELAT2': 90.0,
+        'STAND_LON': -150.0,
+        'CEN_LAT': 65.0,
+        'CEN_LON': -150.0,
+    },
+    3: {'TRUELAT1': 20.0, 'TRUELAT2': 0.0, 'STAND_LON': -70.0, 'CEN_LAT': 20.0, 'CEN_LON': -70.0},
+}
+_synthetic_map_proj_char = {
+    0: 'Cartesian',
+    1: 'Lambert Conformal',
+    2: 'Polar Stereographic',
+    3: 'Mercator',
+}
+
+
+def synthetic_dataset(
+    kind: str = 'wrfout',
+    nx: int = 30,
+    ny: int = 25,
+    nz: int = 10,
+    nt: int = 2,
+    map_proj: int = 1,
+    *,
+    dx: float = 12000.0,
+    start: str = '2099-10-01',
+    freq: str = '1h',
+    seed: int = 0,
+    chunks: int | str | dict | None = None,
+    path: str | os.PathLike | None = None,
+) -> xr.Dataset:
+    """
+    Generate a synthetic WRF dataset (works offline).
+
+    The dataset mimics the raw output of WRF (``'wrfout'``), geogrid (``'geo_em'``) or metgrid
+    (``'met_em'``): variables are on the staggered Arakawa-C grid with WRF names, dimensions and
+    attributes, the projection is described by the usual global attributes, times are given as
+    characters in ``Times``, and fields follow smooth, physically plausible profiles (terrain,
+    hydrostatic pressure, stable potential temperature, sheared winds, accumulated rain) with some
+    random noise.
+
+    Parameters
+    ----------
+    kind : {'wrfout', 'geo_em', 'met_em'}, optional
+        Type of WRF file to generate. Defaults to ``'wrfout'``.
+    nx, ny : int, optional
+        Size of the (unstaggered) horizontal grid.
+    nz : int, optional
+        Number of (unstaggered) vertical levels, or of metgrid levels for ``'met_em'``.
+    nt : int, optional
+        Number of times. geo_em datasets always have a single time.
+    map_proj : {0, 1, 2, 3}, optional
+        WRF map projection: idealized (0), Lambert conformal (1), polar stereographic (2) or
+        Mercator (3). Defaults to 1.
+    dx : float, optional
+        Horizontal grid spacing (in m).
+    start : str, optional
+        First time of the dataset.
+    freq : str, optional
+        Interval between times, as a pandas frequency.
+    seed : int, optional
+        Seed of the random noise.
+    chunks : int, str or dict, optional
+        If given, fields are generated lazily as dask arrays with these chunks (as in
+        :py:meth:`xarray.Dataset.chunk`), so that datasets larger than memory can be generated.
+        The random noise then differs from the one of the NumPy-backed dataset.
+    path : str or path-like, optional
+        If given, the dataset is written to this netCDF file, which is then opened (with chunks).
+
+    Returns
+    -------
+    xarray.Dataset
+        The synthetic dataset.
+    """
+    if kind not in ('wrfout', 'geo_em', 'met_em'):
+        raise ValueError(f"kind must be one of 'wrfout', 'geo_em' or 'met_em', not {kind!r}")
+    if map_proj not in _synthetic_projections:
+        raise NotImplementedError(f'WRF proj not implemented yet: {map_proj}')
+    if kind == 'geo_em':
+        nt = 1
+
+    proj_attrs = _synthetic_projections[map_proj]
+    attrs = {
+        'MAP_PROJ': np.int32(map_proj),
+        'MAP_PROJ_CHAR': _synthetic_map_proj_char[map_proj],
+        'TRUELAT1': np.float32(proj_attrs['TRUELAT1']),
+        'TRUELAT2': np.float32(proj_attrs['TRUELAT2']),
+        'STAND_LON': np.float32(proj_attrs['STAND_LON']),
+        'MOAD_CEN_LAT': np.float32(proj_attrs['CEN_LAT']),
+        'CEN_LAT': np.float32(proj_attrs['CEN_LAT']),
+        'CEN_LON': np.float32(proj_attrs['CEN_LON']),
+        'POLE_LAT': np.float32(90.0),
+        'POLE_LON': np.float32(0.0),
+        'DX': np.float32(dx),
+        'DY': np.float32(dx),
+    }
+    grid = _wrf_grid_from_signature(
+        tuple(_hashable_attr(attrs[name]) for name in grid_attrs) + (nx, ny)
+    )
+    crs = grid['crs']
+    # Horizontal distances to the domain center, with which the analytic fields are defined
+    center_x = grid['west_east'][(nx - 1) // 2] + (0 if nx % 2 else dx / 2)
+    center_y = grid['south_north'][(ny - 1) // 2] + (0 if ny % 2 else dx / 2)
+    half_width = max(nx, ny) * dx / 2
+
+    rng = np.random.default_rng(seed)
+    if chunks is not None:
+        import dask.array as da
+
+        dask_rng = da.random.default_rng(seed)
+
+    def lazy(array):
+        # Small (horizontal or vertical) building blocks are wrapped in dask arrays, so that
+        # fields broadcast from them are only computed chunk by chunk
+        return array if chunks is None else array.chunk()
+
+    def horizontal(ydim, xdim):
+        y = xr.DataArray(grid[ydim] - center_y, dims=ydim)
+        x = xr.DataArray(grid[xdim] - center_x, dims=xdim)
+        return y, x
+
+    def lat_lon(ydim, xdim):
+        x, y = np.meshgrid(grid[xdim], grid[ydim])
+        if crs is None:
+            lat = attrs['CEN_LAT'] + (y - center_y) / 111200.0
+            lon = attrs['CEN_LON'] + (x - center_x) / (111200.0 * np.cos(np.deg2rad(lat)))
+        else:
+            lon, lat = pyproj.Transformer.from_crs(crs, _wgs84(), always_xy=True).transform(x, y)
+        return (
+            lazy(xr.DataArray(lat.astype('float32'), dims=(ydim, xdim))),
+            lazy(xr.DataArray(lon.astype('float32'), dims=(ydim, xdim))),
+        )
+
+    def rotation(lat, lon):
+        # Angle between grid north and true north, from the grid direction of a northward step
+        if crs is None:
+            return xr.zeros_like(lat), xr.ones_like(lat)
+        transformer = pyproj.Transformer.from_crs(_wgs84(), crs, always_xy=True)
+        lat, lon = lat.values.astype('float64'), lon.values.astype('float64')
+        x0, y0 = transformer.transform(lon, lat)
+        x1, y1 = transformer.transform(lon, np.minimum(lat + 0.01, 90.0))
+        alpha = np.arctan2(x1 - x0, y1 - y0)
+        dims = ('south_north', 'west_east')
+        return (
+            lazy(xr.DataArray(np.sin(alpha).astype('float32'), dims=dims)),
+            lazy(xr.DataArray(np.cos(alpha).astype('float32'), dims=dims)),
+        )
+
+    def terrain(ydim='south_north', xdim='west_east'):
+        y, x = horizontal(ydim, xdim)
+        return lazy(1500.0 * np.exp(-(x**2 + y**2) / (2 * (half_width / 3) ** 2)))
+
+    def noise(dims, scale):
+        sizes = {**sizes_by_dim, 'Time': nt}
+        shape = tuple(sizes[dim] for dim in dims)
+        if chunks is None:
+            data = rng.standard_normal(shape, dtype='float32')
+        else:
+            data = dask_rng.standard_normal(shape, chunks='auto').astype('float32')
+        return scale * xr.DataArray(data, dims=dims)
+
+    def variable(data, dims, units, description, stagger=''):
+        return (
+            dims,
+            data.transpose(*dims).astype(data.dtype if data.dtype.kind == 'i' else 'float32').data,
+            {
+                'FieldType': np.int32(104),
+                'MemoryOrder': 'XYZ' if 'bottom_top' in ''.join(dims) else 'XY ',
+                'description': description,
+                'units': units,
+                'stagger': stagger,
+            },
+        )
+
+    sizes_by_dim = {
+        'south_north': ny,
+        'west_east': nx,
+        'south_north_stag': ny + 1,
+        'west_east_stag': nx + 1,
+        'bottom_top': nz,
+        'bottom_top_stag': nz + 1,
+        'num_metgrid_levels': nz,
+    }
+    times = pd.date_range(start, periods=nt, freq=freq)
+    hours = xr.DataArray(np.asarray((times - times[0]) / pd.Timedelta('1h')), dims='Time')
+    diurnal = np.sin(2 * np.pi * (hours - 9) / 24)
+    start_date = times[0].strftime('%Y-%m-%d_%H:%M:%S')
+
+    mass = ('Time', 'south_north', 'west_east')
+    mass_u = ('Time', 'south_north', 'west_east_stag')
+    mass_v = ('Time', 'south_north_stag', 'west_east')
+    xlat, xlong = lat_lon('south_north', 'west_east')
+    xlat_u, xlong_u = lat_lon('south_north', 'west_east_stag')
+    xlat_v, xlong_v = lat_lon('south_north_stag', 'west_east')
+    sinalpha, cosalpha = rotation(xlat, xlong)
+    hgt = terrain()
+    ones = xr.ones_like(hours)
+    data_vars = {
+        'Times': (('Time',), np.array(times.strftime('%Y-%m-%d_%H:%M:%S'), dtype='S19')),
+    }
+    suffix = '' if kind == 'wrfout' else '_M'
+    for name, values, dims, units, description, stagger in (
+        (f'XLAT{suffix}', xlat, mass, 'degree_north', 'LATITUDE, SOUTH IS NEGATIVE', ''),
+        (f'XLONG{suffix}', xlong, mass, 'degree_east', 'LONGITUDE, WEST IS NEGATIVE', ''),
+        ('XLAT_U', xlat_u, mass_u, 'degree_north', 'LATITUDE, SOUTH IS NEGATIVE', 'X'),
+        ('XLONG_U', xlong_u, mass_u, 'degree_east', 'LONGITUDE, WEST IS NEGATIVE', 'X'),
+        ('XLAT_V', xlat_v, mass_v, 'degree_north', 'LATITUDE, SOUTH IS NEGATIVE', 'Y'),
+        ('XLONG_V', xlong_v, mass_v, 'degree_east', 'LONGITUDE, WEST IS NEGATIVE', 'Y'),
+        ('SINALPHA', sinalpha, mass, '', 'Local sine of map rotation', ''),
+        ('COSALPHA', cosalpha, mass, '', 'Local cosine of map rotation', ''),
+    ):
+        data_vars[name] = variable(values * ones, dims, units, description, stagger)
+
+    if kind == 'wrfout':
+        attrs.update(
+            {
+                'TITLE': ' OUTPUT FROM WRF V4.4 MODEL',
+                'START_DATE': start_date,
+                'SIMULATION_START_DATE': start_date,
+                'WEST-EAST_GRID_DIMENSION': np.int32(nx + 1),
+                'SOUTH-NORTH_GRID_DIMENSION': np.int32(ny + 1),
+                'BOTTOM-TOP_GRID_DIMENSION': np.int32(nz + 1),
+                'GRIDTYPE': 'C',
+                'HYBRID_OPT': np.int32(0),
+                'GRID_ID': np.int32(1),
+                'PARENT_ID': np.int32(0),
+                'I_PARENT_START': np.int32(1),
+                'J_PARENT_START': np.int32(1),
+                'PARENT_GRID_RATIO': np.int32(1),
+                'DT': np.float32(dx / 1000 * 6),
+                'BUCKET_MM': np.float32(100.0),
+                'BUCKET_J': np.float32(-1.0),
+            }
+        )
+        data_vars.update(_synthetic_wrfout_fields(nz, hours, diurnal, hgt, noise, variable))
+        data_vars['XTIME'] = (
+            ('Time',),
+            (60 * hours.values).astype('float32'),
+            {
+                'FieldType': np.int32(104),
+                'MemoryOrder': '0  ',
+                'description': f'minutes since {times[0]:%Y-%m-%d %H:%M:%S}',
+                'units': f'minutes since {times[0]:%Y-%m-%d %H:%M:%S}',
+                'stagger': '',
+            },
+        )
+    else:
+        attrs.update(
+            {
+                'TITLE': f' OUTPUT FROM {"GEOGRID" if kind == "geo_em" else "METGRID"} V4.4',
+                'SIMULATION_START_DATE': start_date,
+                'WEST-EAST_GRID_DIMENSION': np.int32(nx + 1),
+                'SOUTH-NORTH_GRID_DIMENSION': np.int32(ny + 1),
+                'BOTTOM-TOP_GRID_DIMENSION': np.int32(nz if kind == 'met_em' else 0),
+                'GRIDTYPE': 'C',
+                'grid_id': np.int32(1),
+                'parent_id': np.int32(1),
+                'i_parent_start': np.int32(1),
+                'j_parent_start': np.int32(1),
+                'parent_grid_ratio': np.int32(1),
+            }
+        )
+        for name, values, dims, units, description, stagger in (
+            ('CLAT', xlat, mass, 'degrees latitude', 'Computational latitude on mass grid', 'M'),
+            (
+                'CLONG',
+                xlong,
+                mass,
+                'degrees longitude',
+                'Computational longitude on mass grid',
+                'M',
+            ),
+            ('HGT_M', hgt, mass, 'meters MSL', 'Topography height', 'M'),
+            (
+                'HGT_U',
+                terrain(xdim='west_east_stag'),
+                mass_u,
+                'meters MSL',
+                'Topography height',
+                'U',
+            ),
+            (
+                'HGT_V',
+                terrain(ydim='south_north_stag'),
+                mass_v,
+                'meters MSL',
+                'Topography height',
+                'V',
+            ),
+            ('LANDMASK', xr.ones_like(hgt), mass, 'none', 'Landmask : 1=land, 0=water', 'M'),
+            ('F', 2 * 7.292e-5 * np.sin(np.deg2rad(xlat)), mass, '-', 'Coriolis F parameter', 'M'),
+            ('E', 2 * 7.292e-5 * np.cos(np.deg2rad(xlat)), mass, '-', 'Coriolis E parameter', 'M'),
+            ('MAPFAC_M', xr.ones_like(hgt), mass, 'none', 'Mapfactor on mass grid', 'M'),
+        ):
+            data_vars[name] = variable(values * ones, dims, units, description, stagger)
+        greenfrac = 0.5 + 0.3 * np.sin(
+            2 * np.pi * (xr.DataArray(np.arange(12), dims='month') - 3) / 12
+        )
+        data_vars['GREENFRAC'] = variable(
+            greenfrac * xr.ones_like(hgt) * ones,
+            ('Time', 'month', 'south_north', 'west_east'),
+            'fraction',
+            'Monthly green fraction',
+            'M',
+        )
+        if kind == 'met_em':
+            data_vars.update(_synthetic_met_em_fields(nz, diurnal, hgt, noise, variable))
+
+    ds = xr.Dataset(data_vars, attrs=attrs)
+    if chunks is not None:
+        ds = ds.chunk(chunks)
+    if path is None:
+        return ds
+    ds.to_netcdf(path)
+    return xr.open_dataset(path, chunks=chunks)
+
+
+def _synthetic_wrfout_fields(nz, hours, diurnal, hgt, noise, variable):
+    """Build the fields of a synthetic wrfout dataset from the terrain and time dependence."""
+    znw = xr.DataArray((1 - np.linspace(0, 1, nz + 1)) ** 1.3, dims='bottom_top_stag')
+    znu = xr.DataArray(0.5 * (znw.values[1:] + znw.values[:-1]), dims='bottom_top')
+    ptop = 5000.0
+    ones = xr.ones_like(hours)
+    # Hydrostatic base state on terrain-following levels, with heights from the hypsometric
+    # equation for a constant scale height
+    psfc_base = 101325.0 * np.exp(-hgt / 8000.0)
+    pb = ptop + znu * (psfc_base - ptop)
+    z = hgt + 7500.0 * np.log(psfc_base / pb)
+    z_stag = hgt + 7500.0 * np.log(psfc_base / (ptop + znw * (psfc_base - ptop)))
+    theta = 288.0 + 0.004 * z + 3.0 * diurnal * np.exp(-(z - hgt) / 1000.0)
+    wind_speed = 5.0 + 25.0 * (1 - znu)
+    meridional_wind = 2.0 * np.cos(2 * np.pi * hours / 24) * (1 - znu)
+    rain_rate = np.maximum(noise(('Time', 'south_north', 'west_east'), 0.5), 0.0)
+
+    mass = ('Time', 'south_north', 'west_east')
+    mass_3d = ('Time', 'bottom_top', 'south_north', 'west_east')
+    u_3d = ('Time', 'bottom_top', 'south_north', 'west_east_stag')
+    v_3d = ('Time', 'bottom_top', 'south_north_stag', 'west_east')
+    w_3d = ('Time', 'bottom_top_stag', 'south_north', 'west_east')
+    return {
+        'ZNU': variable(znu * ones, ('Time', 'bottom_top'), '', 'eta values on half (mass) levels'),
+        'ZNW': variable(
+            znw * ones, ('Time', 'bottom_top_stag'), '', 'eta values on full (w) levels', 'Z'
+        ),
+        'P_TOP': variable(ptop * ones, ('Time',), 'Pa', 'PRESSURE TOP OF THE MODEL'),
+        'T': variable(
+            theta - 300.0 + noise(mass_3d, 0.3),
+            mass_3d,
+            'K',
+            'perturbation potential temperature theta-t0',
+        ),
+        'P': variable(
+            150.0 * diurnal * znu + noise(mass_3d, 20.0), mass_3d, 'Pa', 'perturbation pressure'
+        ),
+        'PB': variable(pb * ones, mass_3d, 'Pa', 'BASE STATE PRESSURE'),
+        'PH': variable(noise(w_3d, 5.0), w_3d, 'm2 s-2', 'perturbation geopotential', 'Z'),
+        'PHB': variable(9.81 * z_stag * ones, w_3d, 'm2 s-2', 'base-state geopotential', 'Z'),
+        'U': variable(wind_speed * ones + noise(u_3d, 1.0), u_3d, 'm s-1', 'x-wind component', 'X'),
+        'V': variable(meridional_wind + noise(v_3d, 1.0), v_3d, 'm s-1', 'y-wind component', 'Y'),
+        'W': variable(noise(w_3d, 0.05), w_3d, 'm s-1', 'z-wind component', 'Z'),
+        'QVAPOR': variable(
+            0.014 * np.exp(-z / 2500.0) * (1 + noise(mass_3d, 0.05)),
+            mass_3d,
+            'kg kg-1',
+            'Water vapor mixing ratio',
+        ),
+        'PSFC': variable(
+            psfc_base + 150.0 * diurnal + noise(mass, 20.0), mass, 'Pa', 'SFC PRESSURE'
+        ),
+        'T2': variable(
+            288.0 - 0.0065 * hgt + 5.0 * diurnal + noise(mass, 0.5), mass, 'K', 'TEMP at 2 M'
+        ),
+        'Q2': variable(0.014 * np.exp(-hgt / 2500.0) * ones, mass, 'kg kg-1', 'QV at 2 M'),
+        'U10': variable(0.7 * wind_speed[0] * ones + noise(mass, 0.5), mass, 'm s-1', 'U at 10 M'),
+        'V10': variable(
+            0.7 * meridional_wind[..., 0] + noise(mass, 0.5), mass, 'm s-1', 'V at 10 M'
+        ),
+        'HGT': variable(hgt * ones, mass, 'm', 'Terrain Height'),
+        'RAINC': variable(
+            (0.4 * rain_rate).cumsum('Time'),
+            mass,
+            'mm',
+            'ACCUMULATED TOTAL CUMULUS PRECIPITATION',
+        ),
+        'RAINNC': variable(
+            rain_rate.cumsum('Time'), mass, 'mm', 'ACCUMULATED TOTAL GRID SCALE PRECIPITATION'
+        ),
+        'I_RAINNC': variable(
+            (xr.zeros_like(hgt) * ones).astype('int32'), mass, '', 'BUCKET NUMBER FOR RAINNC'
+        ),
+    }
+
+
+def _synthetic_met_em_fields(nz, diurnal, hgt, noise, variable):
+    """Build the fields of a synthetic met_em dataset from the terrain and time dependence."""
+    levels = ('Time', 'num_metgrid_levels', 'south_north', 'west_east')
+    mass = ('Time', 'south_north', 'west_east')
+    # The first metgrid level is the surface, followed by isobaric levels
+    is_surface = xr.DataArray(np.arange(nz) == 0, dims='num_metgrid_levels')
+    plev = xr.DataArray(np.linspace(100000.0, 5000.0, nz), dims='num_metgrid_levels')
+    psfc = 101325.0 * np.exp(-hgt / 8000.0) + 150.0 * diurnal
+    pres = xr.where(is_surface, psfc, plev)
+    ght = xr.where(is_surface, hgt, 7500.0 * np.log(101325.0 / plev))
+    wind_speed = 5.0 + 25.0 * (1 - plev / 100000.0)
+    meridional_wind = 2.0 * diurnal * (1 - plev / 100000.0)
+    u_levels = ('Time', 'num_metgrid_levels', 'south_north', 'west_east_stag')
+    v_levels = ('Time', 'num_metgrid_levels', 'south_north_stag', 'west_east')
+    return {
+        'PRES': variable(pres, levels, 'Pa', 'Pressure', 'M'),
+        'GHT': variable(ght * xr.ones_like(diurnal), levels, 'm', 'Height', 'M'),
+        'TT': variable(
+            np.maximum(288.0 - 0.0065 * ght, 216.65) + 3.0 * diurnal + noise(levels, 0.3),
+            levels,
+            'K',
+            'Temperature',
+            'M',
+        ),
+        'RH': variable(
+            np.clip(70.0 + noise(levels, 10.0), 0.0, 100.0), levels, '%', 'Relative Humidity', 'M'
+        ),
+        'UU': variable(
+            wind_speed * xr.ones_like(diurnal) + noise(u_levels, 1.0), u_levels, 'm s-1', 'U', 'U'
+        ),
+        'VV': variable(meridional_wind + noise(v_levels, 1.0), v_levels, 'm s-1', 'V', 'V'),
+        'PSFC': variable(psfc, mass, 'Pa', 'Surface Pressure', 'M'),
+        'PMSL': variable(
+            101325.0 + 150.0 * diurnal + noise(mass, 50.0), mass, 'Pa', 'Sea-level Pressure', 'M'
+        ),
+        'SKINTEMP': variable(
+            290.0 - 0.0065 * hgt + 8.0 * diurnal + noise(mass, 0.5),
+            mass,
+            'K',
+            'Skin temperature',
+            'M',
+        ),
+    }